@@ -1,15 +1,36 @@
 __version__ = "1.0.0"
 
-from LDO_API.export_LDO import (
-    get_scenario_list,
-    combine_functions_start_export,
-    combine_functions_download_export,
-    download_tif,
-    get_all_metadata,
-    get_layer_names,
-    get_file_url,
-    get_ssm,
-)
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from LDO_API.export_LDO import (
+        get_scenario_list,
+        combine_functions_start_export,
+        combine_functions_download_export,
+        download_tif,
+        get_all_metadata,
+        get_layer_names,
+        get_file_url,
+        get_ssm,
+    )
+    from LDO_API.export_LDO_async import AsyncLDOClient
+    from LDO_API.token_LDO import TokenManager, haal_token_op
+
+# naam -> module, de modules worden pas bij het eerste gebruik geïmporteerd (PEP 562)
+_LAZY = {
+    "get_scenario_list": "LDO_API.export_LDO",
+    "combine_functions_start_export": "LDO_API.export_LDO",
+    "combine_functions_download_export": "LDO_API.export_LDO",
+    "download_tif": "LDO_API.export_LDO",
+    "get_all_metadata": "LDO_API.export_LDO",
+    "get_layer_names": "LDO_API.export_LDO",
+    "get_file_url": "LDO_API.export_LDO",
+    "get_ssm": "LDO_API.export_LDO",
+    "AsyncLDOClient": "LDO_API.export_LDO_async",
+    "TokenManager": "LDO_API.token_LDO",
+    "haal_token_op": "LDO_API.token_LDO",
+}
 
 __all__ = [
     "get_scenario_list",
@@ -20,4 +41,19 @@ __all__ = [
     "get_layer_names",
     "get_file_url",
     "get_ssm",
+    "AsyncLDOClient",
+    "TokenManager",
+    "haal_token_op",
 ]
+
+
+def __getattr__(name: str):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name]), name)
+    globals()[name] = value  # volgende keer direct
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
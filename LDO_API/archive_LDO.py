@@ -0,0 +1,573 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Hulp functies voor het schrijven en bijwerken van de zip archieven met de LDO exports.
+"""
+
+import copy
+import os
+import queue
+import shutil
+import struct
+import threading
+import time
+import zipfile
+from concurrent.futures import Future
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+from LDO_API.export_LDO import CHUNK_SIZE
+from LDO_API.metadata_LDO import (
+    exporteer_metadata_excel,
+    lees_metadata,
+    lees_metadata_ids,
+    maak_metadata_sidecar,
+    metadata_sidecar,
+    voeg_metadata_toe,
+)
+
+# naam van het metadata bestand in het (gesharde) archief
+METADATA_NAME = "merged_excel.xlsx"
+
+
+class ZipStreamWriter:
+    """Schrijft bestanden vanuit meerdere (download) threads naar één zip, via één schrijf thread
+
+    `add` zet een open bestand in een begrensde wachtrij: zit deze vol, dan wacht de aanroepende thread.
+    Zo blijft het geheugengebruik begrensd als downloaden sneller gaat dan schrijven.
+    Met `run` wordt een functie met de open zip op de schrijf thread uitgevoerd, bijvoorbeeld om entries uit een
+    ander archief over te nemen (`kopieer_entry`). Met `add_direct` gaat een (groot) bestand zonder buffer direct
+    in de zip; de andere bestanden wachten zolang.
+    Gebruik als context manager, bij het sluiten wordt een fout van de schrijf thread opnieuw opgegooid.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        path: Path,
+        max_pending: int = 8,
+        compression: int = zipfile.ZIP_STORED,
+    ):
+        self.path = Path(path)
+        self.compression = compression
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._directories = set()
+        self._error = None
+        self._zip = None
+        self._thread = None
+
+    def __enter__(self) -> "ZipStreamWriter":
+        self._zip = zipfile.ZipFile(self.path, "w", compression=self.compression)
+        self._thread = threading.Thread(
+            target=self._run, name="zip-writer", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def add(self, arcname: str, fileobj) -> None:
+        """voeg een open bestand toe onder `arcname`, het bestand wordt na het schrijven gesloten"""
+        if self._error is not None:
+            fileobj.close()
+            raise self._error
+        self._queue.put((arcname, fileobj))
+
+    def add_file(self, fname: Path, arcname: str) -> None:
+        """voeg een bestand van schijf toe"""
+        self.add(arcname, open(fname, "rb"))
+
+    def run(self, func):
+        """voer `func(zip)` uit op de schrijf thread (na alles wat eerder is aangeboden) en geef het resultaat terug"""
+        if self._error is not None:
+            raise self._error
+        future = Future()
+        self._queue.put((func, future))
+        return future.result()
+
+    @property
+    def kan_direct(self) -> bool:
+        """True als `add_direct` kan, daarvoor moet een onvolledige entry weer weggehaald kunnen worden"""
+        return self._zip is not None and _kan_entries_weghalen(self._zip)
+
+    def add_direct(self, arcname: str, write, size: Optional[int] = None):
+        """schrijf een bestand met `write(f)` op de schrijf thread direct in de zip en geef het resultaat terug
+
+        Gaat `write` fout, dan wordt de onvolledige entry weer weggehaald (zie `kan_direct`) en de fout opgegooid.
+        Met `size` (de verwachte grootte) bepaalt zipfile of zip64 nodig is, zonder `size` wordt dat altijd gebruikt.
+        """
+
+        def schrijf(archive: zipfile.ZipFile):
+            try:
+                with self._open(arcname, size) as dst:
+                    return write(dst)
+            except BaseException:
+                if arcname in archive.NameToInfo and not _haal_laatste_entries_weg(
+                    archive, [arcname]
+                ):
+                    self._error = RuntimeError(
+                        f"Onvolledige entry {arcname} niet uit {self.path} te halen"
+                    )
+                raise
+
+        return self.run(schrijf)
+
+    def close(self) -> None:
+        """wacht tot alles is geschreven en sluit de zip"""
+        if self._thread is None:
+            return
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+        self._zip.close()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            if isinstance(item[1], Future):
+                func, future = item
+                if self._error is not None:
+                    future.set_exception(self._error)
+                    continue
+                try:
+                    future.set_result(func(self._zip))
+                except BaseException as e:
+                    future.set_exception(e)
+                continue
+            arcname, fileobj = item
+            try:
+                if self._error is None:
+                    self._write(arcname, fileobj)
+            except Exception as e:
+                # onthoud de fout, maar blijf de wachtrij leeg maken zodat de downloads niet vast lopen
+                self._error = e
+            finally:
+                fileobj.close()
+
+    def _write(self, arcname: str, fileobj) -> None:
+        size = fileobj.seek(0, 2)
+        fileobj.seek(0)
+        with self._open(arcname, size) as dst:
+            shutil.copyfileobj(fileobj, dst, CHUNK_SIZE)
+
+    def _open(self, arcname: str, size: Optional[int]):
+        directory = arcname.rpartition("/")[0]
+        if directory and directory not in self._directories:
+            self._zip.mkdir(directory)
+            self._directories.add(directory)
+        zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+        zinfo.compress_type = self.compression
+        # met de grootte vooraf bepaalt zipfile of zip64 nodig is
+        zinfo.file_size = size or 0
+        return self._zip.open(zinfo, "w", force_zip64=size is None)
+
+
+# indexen in de local file header (`zipfile.structFileHeader`) en de id van het zip64 extra veld
+_FH_FILENAME_LENGTH = 10
+_FH_EXTRA_FIELD_LENGTH = 11
+_ZIP64_EXTRA = 0x0001
+
+
+def _zonder_zip64_extra(extra: bytes) -> bytes:
+    """het extra veld zonder zip64 record, `ZipInfo.FileHeader` voegt zelf een nieuw record toe als dat nodig is"""
+    resultaat = b""
+    i = 0
+    while i + 4 <= len(extra):
+        header_id, size = struct.unpack("<HH", extra[i : i + 4])
+        if header_id != _ZIP64_EXTRA:
+            resultaat += extra[i : i + 4 + size]
+        i += 4 + size
+    return resultaat
+
+
+def _data_offset(input_archive: zipfile.ZipFile, item: zipfile.ZipInfo) -> int:
+    """positie van de (gecomprimeerde) data van `item` in het archief, na de local file header"""
+    fp = input_archive.fp
+    fp.seek(item.header_offset)
+    header = fp.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Ongeldige local file header voor {item.filename}")
+    fheader = struct.unpack(zipfile.structFileHeader, header)
+    return (
+        item.header_offset
+        + zipfile.sizeFileHeader
+        + fheader[_FH_FILENAME_LENGTH]
+        + fheader[_FH_EXTRA_FIELD_LENGTH]
+    )
+
+
+def _kan_ruw_kopieren(
+    input_archive: zipfile.ZipFile, output_archive: zipfile.ZipFile
+) -> bool:
+    """heeft zipfile de (interne) attributen die `kopieer_entry` voor het kopiëren zonder uitpakken gebruikt"""
+    return (
+        all(hasattr(input_archive, attribute) for attribute in ("_lock", "fp"))
+        and all(
+            hasattr(output_archive, attribute)
+            for attribute in (
+                "_lock",
+                "_writing",
+                "_writecheck",
+                "_didModify",
+                "fp",
+                "start_dir",
+                "filelist",
+                "NameToInfo",
+            )
+        )
+        and getattr(output_archive, "_seekable", False)
+    )
+
+
+def kopieer_entry(
+    input_archive: zipfile.ZipFile,
+    output_archive: zipfile.ZipFile,
+    item,
+) -> None:
+    """kopieer een bestand (naam of ZipInfo) van het ene archief naar het andere
+
+    De gecomprimeerde bytes worden ongewijzigd (met dezelfde CRC) in blokken van `CHUNK_SIZE` gekopieerd, zonder
+    uitpakken en opnieuw comprimeren. Het geheugengebruik is daardoor constant en de snelheid wordt bepaald door
+    de schijf. zipfile heeft hier geen publieke functie voor, de kopie volgt wat `ZipFile.open(..., "w")` intern
+    doet. Versleutelde bestanden, of een zipfile zonder de verwachte interne attributen (zie `_kan_ruw_kopieren`),
+    worden uitgepakt en opnieuw weggeschreven met `ZipFile.open` (ook in blokken).
+    """
+    if isinstance(item, str):
+        item = input_archive.getinfo(item)
+    zinfo = copy.copy(item)
+    if item.flag_bits & 0x1 or not _kan_ruw_kopieren(input_archive, output_archive):
+        with input_archive.open(item) as src, output_archive.open(zinfo, "w") as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        return
+
+    # crc en groottes zijn bekend en komen in de local header, dus geen data descriptor achter de data
+    zinfo.flag_bits &= ~0x08
+    zinfo.extra = _zonder_zip64_extra(item.extra)
+    zip64 = max(zinfo.file_size, zinfo.compress_size) > zipfile.ZIP64_LIMIT
+
+    with input_archive._lock:
+        offset = _data_offset(input_archive, item)
+        with output_archive._lock:
+            if output_archive._writing:
+                raise ValueError("Er wordt al naar het archief geschreven")
+            output_archive._writecheck(zinfo)
+            output_archive._didModify = True
+            dst = output_archive.fp
+            dst.seek(output_archive.start_dir)
+            zinfo.header_offset = dst.tell()
+            dst.write(zinfo.FileHeader(zip64))
+
+            src = input_archive.fp
+            src.seek(offset)
+            remaining = item.compress_size
+            while remaining > 0:
+                block = src.read(min(CHUNK_SIZE, remaining))
+                if not block:
+                    raise zipfile.BadZipFile(f"Onvolledige data voor {item.filename}")
+                dst.write(block)
+                remaining -= len(block)
+
+            output_archive.start_dir = dst.tell()
+            output_archive.filelist.append(zinfo)
+            output_archive.NameToInfo[zinfo.filename] = zinfo
+
+
+def _haal_laatste_entries_weg(archive: zipfile.ZipFile, names: list) -> bool:
+    """haal de entries `names` uit een archief in "a" of "w" modus als ze achteraan staan, geeft False als dat niet kan
+
+    Nieuwe entries overschrijven dan de ruimte van de weggehaalde entries, zonder het archief te herschrijven.
+    zipfile heeft hier geen publieke functie voor: zonder de verwachte (interne) attributen geeft dit False.
+    """
+    if len(names) == 0:
+        return True
+    if not _kan_entries_weghalen(archive):
+        return False
+    start = min(archive.getinfo(name).header_offset for name in names)
+    if any(
+        item.header_offset >= start and item.filename not in names
+        for item in archive.infolist()
+    ):
+        return False
+    with archive._lock:
+        archive.filelist = [
+            item for item in archive.filelist if item.header_offset < start
+        ]
+        for name in names:
+            del archive.NameToInfo[name]
+        archive.start_dir = start
+        archive._didModify = True
+        if archive.mode == "w":
+            # in "w" modus kort zipfile het bestand bij het sluiten niet zelf in
+            archive.fp.seek(start)
+            archive.fp.truncate()
+    return True
+
+
+def _kan_entries_weghalen(archive: zipfile.ZipFile) -> bool:
+    """True als `_haal_laatste_entries_weg` de (interne) attributen van dit archief kan aanpassen"""
+    return (
+        archive.mode in ("a", "w")
+        and getattr(archive, "_seekable", False)
+        and all(
+            hasattr(archive, attribute)
+            for attribute in ("start_dir", "filelist", "NameToInfo", "_didModify", "fp")
+        )
+    )
+
+
+def _voeg_exports_toe(output_archive: zipfile.ZipFile, lst_zips_nieuwe_export: list):
+    """kopieer de scenarios uit de zips van nieuwe exports (zonder hun metadata excel) naar het archief"""
+    for zip_name in lst_zips_nieuwe_export:
+        with zipfile.ZipFile(zip_name, "r") as input_archive:
+            name_list = input_archive.namelist()
+            file_extensions = [name.split(".")[-1] for name in name_list]
+            excel_file = name_list[file_extensions.index("xlsx")]
+            name_list.remove(excel_file)
+            for file in name_list:
+                kopieer_entry(input_archive, output_archive, file)
+
+
+def lees_metadata_excel(combined_file: Path) -> "pd.DataFrame":
+    """Lees de metadata excel uit een gecombineerde zip of een gesharde archief"""
+    import pandas as pd
+
+    if combined_file.is_dir():
+        return pd.read_excel(combined_file / METADATA_NAME, index_col=0)
+    with zipfile.ZipFile(combined_file, "r") as archive:
+        name_list = archive.namelist()
+        file_extensions = [name.split(".")[-1] for name in name_list]
+        excel_file = name_list[file_extensions.index("xlsx")]
+        with archive.open(excel_file) as f_open:
+            return pd.read_excel(f_open, index_col=0)
+
+
+def lees_metadata_nieuwe_export(lst_zips_nieuwe_export: list) -> "pd.DataFrame":
+    """Lees de metadata excel uit de zips van nieuwe exports en voeg deze samen"""
+    import pandas as pd
+
+    skip_rows = [2, 3]
+    lst_dfs_new_scenarios = []
+    # open de metedata van de nieuwe scenarios
+    for file in lst_zips_nieuwe_export:
+        with zipfile.ZipFile(file, "r") as archive:
+            name_list = archive.namelist()
+            file_extensions = [name.split(".")[-1] for name in name_list]
+            excel_file = name_list[file_extensions.index("xlsx")]
+            with archive.open(excel_file) as f_open:
+                df_new_scenarios = pd.read_excel(
+                    f_open, header=1, skiprows=skip_rows, index_col=0
+                )
+                lst_dfs_new_scenarios.append(df_new_scenarios)
+    return pd.concat(lst_dfs_new_scenarios, axis=0)
+
+
+def migreer_metadata(
+    combined_file: Path, df_metadata: "Optional[pd.DataFrame]" = None
+) -> Path:
+    """Zet de metadata excel van een bestaand archief eenmalig om naar een metadata map (parquet) en geef die terug
+
+    Met `df_metadata` (de al ingelezen excel, zie `vergelijke_nieuwe_en_huidige`) wordt de excel niet opnieuw gelezen.
+    """
+    sidecar = metadata_sidecar(combined_file)
+    if not sidecar.exists():
+        if df_metadata is None:
+            df_metadata = lees_metadata_excel(combined_file)
+        maak_metadata_sidecar(df_metadata, sidecar)
+    return sidecar
+
+
+def vergelijke_nieuwe_en_huidige(
+    combined_file: Path, beschikbare_scenario_ids: list
+) -> "tuple[list, list, Optional[pd.DataFrame]]":
+    """Open de map Combined file, lees het huidige meta data bestand uit en vergelijk de ids hier in met de opgehaalde lijst
+
+    `combined_file` is een gecombineerde zip of een map met een gesharde archief (zie `maak_gesharde_archief`).
+    Staat er een metadata map naast (zie `metadata_LDO`), dan worden daaruit alleen de ids gelezen en is de
+    huidige metadata None. Anders wordt de excel gelezen en teruggegeven, voor het omzetten bij de update.
+    Er wordt niets weggeschreven, omzetten naar een metadata map gaat met `migreer_metadata`.
+    """
+    sidecar = metadata_sidecar(combined_file)
+    if sidecar.exists():
+        df_current_local_LDO = None
+        huidige_scenarios = set(lees_metadata_ids(sidecar))
+    else:
+        df_current_local_LDO = lees_metadata_excel(combined_file)
+        huidige_scenarios = set(df_current_local_LDO.index)
+
+    nieuwe_scenarios = list(set(beschikbare_scenario_ids).difference(huidige_scenarios))
+    verwijderde_scenarios = list(
+        set(huidige_scenarios).difference(beschikbare_scenario_ids)
+    )
+    return verwijderde_scenarios, nieuwe_scenarios, df_current_local_LDO
+
+
+def voeg_zips_samen_verwijder_ouder(
+    lst_zips_nieuwe_export: list,
+    verwijderde_scenarios: list,
+    df_current_local_LDO: "Optional[pd.DataFrame]",
+    current_archive: Path,
+    new_archive: Path,
+    excel_in_zip: bool = False,
+) -> None:
+    """
+    Lees de nieuwe metadata in en werk hiermee de metadata map (parquet) naast het nieuwe archief bij.
+    Vervolgens worden de nieuwe scenarios toegevoegd en als laatste worden indien nodig scenarios verwijderd.
+    Met `excel_in_zip` wordt de metadata ook als excel aan de zip toegevoegd, dat kost elke update een volledige
+    excel export. Standaard staat de metadata alleen in de metadata map, een excel maken gaat met
+    `exporteer_metadata_excel`. Zonder verwijderde scenarios wordt de zip ter plekke aangevuld (een oude metadata
+    excel staat achteraan en wordt weggehaald of overschreven), alleen als er scenarios weg moeten wordt de zip
+    herschreven.
+    """
+    # werk de meta data bij, naast de zip
+    df_new_scenarios = lees_metadata_nieuwe_export(lst_zips_nieuwe_export)
+    current_sidecar = migreer_metadata(current_archive, df_current_local_LDO)
+    new_sidecar = metadata_sidecar(new_archive)
+    if not new_sidecar.exists():
+        shutil.copytree(current_sidecar, new_sidecar)
+    voeg_metadata_toe(new_sidecar, df_new_scenarios, verwijderde_scenarios)
+
+    temp_excel_output_name = "merged_excel_temp_update.xlsx"
+    excel_name_in_zip = METADATA_NAME
+    excel_output_dir = current_archive.parent / temp_excel_output_name
+    if excel_in_zip:
+        exporteer_metadata_excel(new_sidecar, excel_output_dir)
+    if not new_archive.exists():
+        shutil.copy(current_archive, new_archive)
+
+    # voeg de nieuwe zips toe aan de bestaande scenarios
+    with zipfile.ZipFile(new_archive, "a") as output_archive:
+        oude_excels = [
+            name for name in output_archive.namelist() if name.split(".")[-1] == "xlsx"
+        ]
+        ter_plekke = len(verwijderde_scenarios) == 0 and _haal_laatste_entries_weg(
+            output_archive, oude_excels
+        )
+        _voeg_exports_toe(output_archive, lst_zips_nieuwe_export)
+        if ter_plekke and excel_in_zip:
+            output_archive.write(excel_output_dir, arcname=excel_name_in_zip)
+    if ter_plekke:
+        if excel_in_zip:
+            excel_output_dir.unlink()
+        return
+
+    # verwijder de verwijderde scenarios: dit doen we met een tijdelijke zip
+    verwijderde_scenario_names = [f"scenario_{id}" for id in verwijderde_scenarios]
+    # oude meta data excel moet er uit gehaald worden
+    temp_zip_file = new_archive.with_suffix(".temp.zip")
+    with (
+        zipfile.ZipFile(new_archive, "r") as input_archive,
+        zipfile.ZipFile(temp_zip_file, "w") as output_archive,
+    ):
+        for item in input_archive.infolist():
+            if (
+                item.filename.split("/")[0] not in verwijderde_scenario_names
+                and item.filename.split(".")[-1] != "xlsx"
+            ):
+                # verplaats alles naar de nieuwe zip
+                kopieer_entry(input_archive, output_archive, item)
+
+    # klaar: verwijder de oude zip
+    temp_zip_file.replace(new_archive)
+
+    if excel_in_zip:
+        with zipfile.ZipFile(new_archive, "a") as output_archive:
+            # als laaste voeg de meta data weer toe
+            output_archive.write(excel_output_dir, arcname=excel_name_in_zip)
+        excel_output_dir.unlink()
+
+
+# gesharde archief: een map met een zip per scenario, zodat een update alleen de gewijzigde scenarios raakt
+
+
+def scenario_map_naam(scenario_id) -> str:
+    """naam van de map van een scenario in de exports"""
+    return f"scenario_{scenario_id}"
+
+
+def _schrijf_shards(input_archive: zipfile.ZipFile, archive_dir: Path) -> list:
+    """Splits de bestanden van een zip per scenario map over losse shards, geeft de geschreven shards terug"""
+    per_scenario = {}
+    for item in input_archive.infolist():
+        if "/" not in item.filename:
+            continue  # metadata en andere losse bestanden horen niet in een shard
+        per_scenario.setdefault(item.filename.split("/")[0], []).append(item)
+
+    shards = []
+    for scenario_map, items in per_scenario.items():
+        shard = archive_dir / f"{scenario_map}.zip"
+        temp_shard = shard.with_name(shard.name + ".part")
+        with zipfile.ZipFile(temp_shard, "w") as output_archive:
+            for item in items:
+                kopieer_entry(input_archive, output_archive, item)
+        # pas als de shard compleet is vervangt deze een eventuele oude versie
+        os.replace(temp_shard, shard)
+        shards.append(shard)
+    return shards
+
+
+def maak_gesharde_archief(current_archive: Path, archive_dir: Path) -> None:
+    """Zet een gecombineerde zip eenmalig om naar een map met een zip per scenario en de metadata (parquet) ernaast"""
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(current_archive, "r") as input_archive:
+        _schrijf_shards(input_archive, archive_dir)
+    current_sidecar = metadata_sidecar(current_archive)
+    if current_sidecar.exists():
+        df_metadata = lees_metadata(current_sidecar)
+    else:
+        df_metadata = lees_metadata_excel(current_archive)
+    maak_metadata_sidecar(df_metadata, metadata_sidecar(archive_dir))
+
+
+def werk_gesharde_archief_bij(
+    lst_zips_nieuwe_export: list,
+    verwijderde_scenarios: list,
+    df_current_local_LDO: "Optional[pd.DataFrame]",
+    archive_dir: Path,
+    schrijf_excel: bool = False,
+) -> None:
+    """
+    Werk een gesharde archief bij: de nieuwe scenarios worden als losse shards toegevoegd, de shards van
+    verwijderde scenarios worden verwijderd en de metadata wordt bijgewerkt.
+    Bestaande shards worden niet aangeraakt, de kosten schalen dus met de grootte van de wijziging.
+    Met `schrijf_excel` wordt de metadata ook als excel in de map gezet.
+    """
+    df_new_scenarios = lees_metadata_nieuwe_export(lst_zips_nieuwe_export)
+    sidecar = migreer_metadata(archive_dir, df_current_local_LDO)
+
+    for zip_name in lst_zips_nieuwe_export:
+        with zipfile.ZipFile(zip_name, "r") as input_archive:
+            _schrijf_shards(input_archive, archive_dir)
+
+    for scenario_id in verwijderde_scenarios:
+        (archive_dir / f"{scenario_map_naam(scenario_id)}.zip").unlink(missing_ok=True)
+
+    # metadata als laatste, zodat de ids pas kloppen als de shards er zijn
+    voeg_metadata_toe(sidecar, df_new_scenarios, verwijderde_scenarios)
+    if schrijf_excel:
+        temp_excel = archive_dir / f"temp_{METADATA_NAME}"
+        exporteer_metadata_excel(sidecar, temp_excel)
+        os.replace(temp_excel, archive_dir / METADATA_NAME)
+
+
+def combineer_gesharde_archief(archive_dir: Path, output_archive_path: Path) -> None:
+    """Voeg alle shards en de metadata samen tot één zip, bijvoorbeeld om te delen (kost een volledige kopie)"""
+    with zipfile.ZipFile(output_archive_path, "w") as output_archive:
+        for shard in sorted(archive_dir.glob("*.zip")):
+            with zipfile.ZipFile(shard, "r") as input_archive:
+                for item in input_archive.infolist():
+                    kopieer_entry(input_archive, output_archive, item)
+        temp_excel = output_archive_path.parent / f"temp_{METADATA_NAME}"
+        exporteer_metadata_excel(metadata_sidecar(archive_dir), temp_excel)
+        output_archive.write(temp_excel, arcname=METADATA_NAME)
+        temp_excel.unlink()
@@ -0,0 +1,295 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Lokale catalogus (SQLite) van de scenarios, hun lagen, ssm metadata en de download status per bestand.
+
+Alle stappen (scenarios ophalen, lagen ophalen, downloaden, ssm) kunnen de catalogus lezen en bijwerken,
+zodat een volgende run een sync kan plannen met queries in plaats van duizenden API calls.
+Andere tools kunnen het bestand direct met SQLite lezen, zonder het LDO te benaderen.
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from LDO_API.export_LDO import sha256_of_file
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenarios (
+    scenario_id INTEGER PRIMARY KEY,
+    status TEXT,
+    first_seen TEXT,
+    last_seen TEXT,
+    removed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS layers (
+    scenario_id INTEGER NOT NULL,
+    layer_name TEXT NOT NULL,
+    updated TEXT,
+    PRIMARY KEY (scenario_id, layer_name)
+);
+CREATE TABLE IF NOT EXISTS files (
+    scenario_id INTEGER NOT NULL,
+    layer_name TEXT NOT NULL,
+    state TEXT NOT NULL,
+    size INTEGER,
+    etag TEXT,
+    last_modified TEXT,
+    sha256 TEXT,
+    message TEXT,
+    updated TEXT,
+    PRIMARY KEY (scenario_id, layer_name)
+);
+CREATE INDEX IF NOT EXISTS files_state ON files (state);
+CREATE TABLE IF NOT EXISTS ssm (
+    scenario_id INTEGER PRIMARY KEY,
+    data TEXT,
+    error TEXT,
+    updated TEXT
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _sinds(max_age: float) -> str:
+    """iso tijd van `max_age` seconden geleden, `updated` kolommen (`_now`) sorteren als tekst op tijd"""
+    return (datetime.now() - timedelta(seconds=max_age)).isoformat(timespec="seconds")
+
+
+class LDOCatalog:
+    """Lokale catalogus van het LDO in een SQLite bestand
+
+    Veilig te gebruiken vanuit meerdere threads. Heeft dezelfde methodes als `DownloadManifest`
+    (`get`, `is_current`, `record`, `forget`, `save`) en kan dus ook als manifest worden meegegeven.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self) -> "LDOCatalog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _execute(self, sql: str, parameters=()) -> list:
+        with self._lock, self._connection:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def _executemany(self, sql: str, rows: list) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(sql, rows)
+
+    # scenarios
+    def record_scenarios(
+        self,
+        scenario_ids: list,
+        status: str = "quality_checked",
+        full_listing: bool = False,
+    ) -> None:
+        """Leg de opgehaalde scenarios vast, bij een volledige lijst worden de ontbrekende als verwijderd gemarkeerd"""
+        now = _now()
+        with self._lock, self._connection:
+            if full_listing:
+                # alles wat niet (meer) in de lijst staat is verwijderd
+                self._connection.execute("UPDATE scenarios SET removed = 1")
+            self._connection.executemany(
+                """INSERT INTO scenarios (scenario_id, status, first_seen, last_seen, removed)
+                VALUES (?, ?, ?, ?, 0)
+                ON CONFLICT (scenario_id) DO UPDATE SET
+                    status = excluded.status, last_seen = excluded.last_seen, removed = 0""",
+                [(int(i), status, now, now) for i in scenario_ids],
+            )
+
+    def scenario_ids(self, include_removed: bool = False) -> list:
+        """ids van de bekende scenarios"""
+        sql = "SELECT scenario_id FROM scenarios"
+        if not include_removed:
+            sql += " WHERE removed = 0"
+        return [row[0] for row in self._execute(sql + " ORDER BY scenario_id")]
+
+    def removed_scenario_ids(self) -> list:
+        """ids van scenarios die niet meer in het LDO staan"""
+        rows = self._execute(
+            "SELECT scenario_id FROM scenarios WHERE removed = 1 ORDER BY scenario_id"
+        )
+        return [row[0] for row in rows]
+
+    def mark_removed(self, scenario_ids: list) -> None:
+        """markeer scenarios als verwijderd, bijvoorbeeld als ze niet meer quality_checked zijn"""
+        self._executemany(
+            "UPDATE scenarios SET removed = 1 WHERE scenario_id = ?",
+            [(int(i),) for i in scenario_ids],
+        )
+
+    # lagen
+    def record_layers(self, scenario_id, layer_names: list) -> None:
+        """Leg de bestandsnamen van een scenario vast (vervangt eerdere)"""
+        now = _now()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM layers WHERE scenario_id = ?", (int(scenario_id),)
+            )
+            self._connection.executemany(
+                "INSERT INTO layers (scenario_id, layer_name, updated) VALUES (?, ?, ?)",
+                [(int(scenario_id), name, now) for name in layer_names],
+            )
+
+    def layer_names(
+        self, scenario_id, max_age: Optional[float] = None
+    ) -> Optional[list]:
+        """bekende bestandsnamen van een scenario, of None als deze nog niet (of met `max_age` niet in de laatste
+        `max_age` seconden) zijn opgehaald"""
+        sql = "SELECT layer_name FROM layers WHERE scenario_id = ?"
+        parameters = (int(scenario_id),)
+        if max_age is not None:
+            # `record_layers` schrijft alle namen van een scenario met dezelfde tijd
+            sql += " AND updated >= ?"
+            parameters += (_sinds(max_age),)
+        rows = self._execute(sql + " ORDER BY layer_name", parameters)
+        return [row[0] for row in rows] if len(rows) > 0 else None
+
+    def forget_layers(self, scenario_id) -> None:
+        """vergeet de bestandsnamen van een scenario, zodat deze opnieuw worden opgehaald"""
+        self._execute("DELETE FROM layers WHERE scenario_id = ?", (int(scenario_id),))
+
+    # bestanden (zelfde interface als DownloadManifest)
+    def get(self, scenario_id, layer_name: str) -> Optional[dict]:
+        """gegevens van een gedownloade laag, of None"""
+        rows = self._execute(
+            "SELECT * FROM files WHERE scenario_id = ? AND layer_name = ? AND state = 'downloaded'",
+            (int(scenario_id), layer_name),
+        )
+        return dict(rows[0]) if len(rows) > 0 else None
+
+    def is_current(
+        self, scenario_id, layer_name: str, fname: Path, verify_checksum: bool = False
+    ) -> bool:
+        """True als de laag al is gedownload en het lokale bestand nog overeenkomt met de catalogus
+
+        Zegt niets over wijzigingen in het LDO: controleer daarvoor de bewaarde ETag/Last-Modified met
+        `export_LDO.not_modified` (zoals `resolve_layer` doet) voordat de download wordt overgeslagen.
+        """
+        entry = self.get(scenario_id, layer_name)
+        if entry is None or not fname.exists():
+            return False
+        if fname.stat().st_size != entry["size"]:
+            return False
+        if verify_checksum:
+            return sha256_of_file(fname).hexdigest() == entry["sha256"]
+        return True
+
+    def record(self, scenario_id, layer_name: str, info: dict) -> None:
+        """leg een geslaagde download vast, info komt van `download_file`"""
+        self._execute(
+            """INSERT OR REPLACE INTO files
+            (scenario_id, layer_name, state, size, etag, last_modified, sha256, message, updated)
+            VALUES (?, ?, 'downloaded', ?, ?, ?, ?, NULL, ?)""",
+            (
+                int(scenario_id),
+                layer_name,
+                info.get("size"),
+                info.get("etag"),
+                info.get("last_modified"),
+                info.get("sha256"),
+                _now(),
+            ),
+        )
+
+    def downloaded_layer_names(self, scenario_id) -> list:
+        """bestandsnamen van de lagen van een scenario die als gedownload in de catalogus staan"""
+        rows = self._execute(
+            "SELECT layer_name FROM files WHERE scenario_id = ? AND state = 'downloaded' ORDER BY layer_name",
+            (int(scenario_id),),
+        )
+        return [row[0] for row in rows]
+
+    def record_missing(self, scenario_id, layer_name: str, message: str) -> None:
+        """leg een mislukte download vast"""
+        self._execute(
+            """INSERT OR REPLACE INTO files (scenario_id, layer_name, state, message, updated)
+            VALUES (?, ?, 'missing', ?, ?)""",
+            (int(scenario_id), layer_name, str(message), _now()),
+        )
+
+    def missing_files(self) -> dict:
+        """mislukte downloads als {scenario_id: [bestandsnamen]}, zelfde vorm als missing_values"""
+        missing = {}
+        for row in self._execute(
+            "SELECT scenario_id, layer_name FROM files WHERE state = 'missing' ORDER BY scenario_id"
+        ):
+            missing.setdefault(row[0], []).append(row[1])
+        return missing
+
+    def forget(self, scenario_id, layer_name: Optional[str] = None) -> None:
+        """vergeet een laag of een heel scenario, bijvoorbeeld als het in het LDO is gewijzigd"""
+        if layer_name is None:
+            self._execute(
+                "DELETE FROM files WHERE scenario_id = ?", (int(scenario_id),)
+            )
+        else:
+            self._execute(
+                "DELETE FROM files WHERE scenario_id = ? AND layer_name = ?",
+                (int(scenario_id), layer_name),
+            )
+
+    def save(self) -> None:
+        """niets te doen: elke wijziging wordt direct vastgelegd"""
+
+    # ssm
+    def record_ssm(
+        self, scenario_id, record: Optional[dict] = None, error: Optional[str] = None
+    ) -> None:
+        """leg de ssm metadata (of de fout bij het ophalen) van een scenario vast"""
+        self._execute(
+            "INSERT OR REPLACE INTO ssm (scenario_id, data, error, updated) VALUES (?, ?, ?, ?)",
+            (
+                int(scenario_id),
+                None if record is None else json.dumps(record, default=str),
+                error,
+                _now(),
+            ),
+        )
+
+    def ssm_records(self, max_age: Optional[float] = None) -> dict:
+        """geslaagde ssm metadata als {scenario_id: record}, met `max_age` alleen die van de laatste `max_age` seconden"""
+        sql = "SELECT scenario_id, data FROM ssm WHERE error IS NULL"
+        parameters = ()
+        if max_age is not None:
+            sql += " AND updated >= ?"
+            parameters = (_sinds(max_age),)
+        rows = self._execute(sql + " ORDER BY scenario_id", parameters)
+        return {row[0]: json.loads(row[1]) for row in rows}
+
+    # sync status, bijvoorbeeld het watermerk van de laatste delta sync
+    def get_state(self, key: str) -> Optional[str]:
+        rows = self._execute("SELECT value FROM sync_state WHERE key = ?", (key,))
+        return rows[0][0] if len(rows) > 0 else None
+
+    def set_state(self, key: str, value: str) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+            (key, value),
+        )
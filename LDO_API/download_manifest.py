@@ -0,0 +1,77 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Houdt bij welke lagen al zijn gedownload, zodat een nieuwe run alleen het verschil ophaalt.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from LDO_API.export_LDO import sha256_of_file
+
+
+class DownloadManifest:
+    """Manifest (json) met per scenario en laag de grootte, ETag/Last-Modified van de server en sha256 van het lokale bestand
+
+    Is veilig te gebruiken vanuit meerdere download threads, `save` schrijft het manifest atomair weg.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        else:
+            self._entries = {}
+
+    def get(self, scenario_id, layer_name: str) -> Optional[dict]:
+        """gegevens van een eerder gedownloade laag, of None"""
+        with self._lock:
+            return self._entries.get(str(scenario_id), {}).get(layer_name)
+
+    def is_current(
+        self, scenario_id, layer_name: str, fname: Path, verify_checksum: bool = False
+    ) -> bool:
+        """True als de laag al is gedownload en het lokale bestand nog overeenkomt met het manifest
+
+        Zegt niets over wijzigingen in het LDO: controleer daarvoor de bewaarde ETag/Last-Modified met
+        `export_LDO.not_modified` (zoals `resolve_layer` doet) voordat de download wordt overgeslagen.
+        """
+        entry = self.get(scenario_id, layer_name)
+        if entry is None or not fname.exists():
+            return False
+        if fname.stat().st_size != entry["size"]:
+            return False
+        if verify_checksum:
+            return sha256_of_file(fname).hexdigest() == entry["sha256"]
+        return True
+
+    def record(self, scenario_id, layer_name: str, info: dict) -> None:
+        """leg een geslaagde download vast, info komt van `download_file`"""
+        entry = {key: value for key, value in info.items() if key != "transfer"}
+        entry["downloaded"] = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            self._entries.setdefault(str(scenario_id), {})[layer_name] = entry
+
+    def forget(self, scenario_id, layer_name: Optional[str] = None) -> None:
+        """vergeet een laag of een heel scenario, bijvoorbeeld als het in het LDO is gewijzigd"""
+        with self._lock:
+            if layer_name is None:
+                self._entries.pop(str(scenario_id), None)
+            else:
+                self._entries.get(str(scenario_id), {}).pop(layer_name, None)
+
+    def save(self) -> None:
+        """schrijf het manifest weg via een tijdelijk bestand"""
+        with self._lock:
+            temp_file = self.path.with_name(self.path.name + ".tmp")
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, indent=1)
+            os.replace(temp_file, self.path)
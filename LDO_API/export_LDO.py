@@ -6,37 +6,66 @@ Juni, 2025
 Bevat functies voor interactie met de API, worden gebruikt door andere scripts.
 """
 
+import hashlib
+import heapq
+import http.client
+import os
+import re
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import json
 import time
-from datetime import datetime as date
-from typing import Optional
+from datetime import datetime as date, timezone
+from typing import Iterator, Optional
 from pathlib import Path
-from requests.adapters import HTTPAdapter
+from urllib.parse import parse_qs, quote, urlsplit
+import urllib3
 from urllib3.util.retry import Retry
+from LDO_API.http_cache_LDO import DEFAULT_MAX_BYTES, DEFAULT_TTL, HttpCache
+from LDO_API.metrics_LDO import metrics
+from LDO_API.rate_limit_LDO import IDEMPOTENT_METHODS, RateLimitedAdapter
 
 """
 Python bestand met helper functies voor het exporteren van scenario's uit de LDO via de API van www.ldo.overstromingsinformatie.nl
 Zie `export_SSM_metadata_uit_LDO_met_API.py of update_local_bulk_LOD.py` voor stappen plan voor het aanmaken van een api key.
 """
 
-server = "https://ldo.overstromingsinformatie.nl"
+# overschrijfbaar met de omgevingsvariabele LDO_SERVER, bijvoorbeeld voor een lokale test server
+server = os.environ.get("LDO_SERVER", "https://ldo.overstromingsinformatie.nl")
+
+# buffer grootte voor het wegschrijven van downloads, zie `stream_response`
+CHUNK_SIZE = 1024 * 1024
+
+# aanbevolen aantal scenarios per `POST /scenarios/export` als `get_all_metadata` in batches werkt
+METADATA_BATCH_SIZE = 500
+# rijen met de kop en toelichting bovenaan de metadata excel (zie `lees_metadata_nieuwe_export`)
+METADATA_HEADER_ROWS = 4
+
+# query parameter voor scenarios die sinds een tijdstip zijn aangemaakt of gewijzigd, zie `delta_filter`
+DELTA_FILTER_FIELD = os.environ.get("LDO_DELTA_FILTER", "last_modified__gte")
 
 
 def get_session():
-    """Create a global requests session with connection pooling and retry logic"""
+    """Create a global requests session with connection pooling and retry logic
+
+    429 en 503 worden afgehandeld door de adaptieve begrenzing in `RateLimitedAdapter` (met Retry-After),
+    de overige server fouten door urllib3 `Retry`. Beide herhalen alleen idempotente requests, een POST kan bij
+    een 5xx al zijn uitgevoerd (zie `rate_limit_LDO`).
+    """
     session = requests.Session()
     retry_strategy = Retry(
         total=3,
         backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET", "POST", "PATCH", "DELETE"],
+        status_forcelist=[500, 502, 504],
+        respect_retry_after_header=False,  # 429/503 met Retry-After: zie RateLimitedAdapter
+        allowed_methods=sorted(IDEMPOTENT_METHODS),
     )
-    adapter = HTTPAdapter(
+    adapter = RateLimitedAdapter(
         max_retries=retry_strategy,
         pool_connections=10,
-        pool_maxsize=10,
+        pool_maxsize=32,
         pool_block=False,
     )
     session.mount("https://", adapter)
@@ -44,40 +73,178 @@ def get_session():
     return session
 
 
-_session = get_session()
+class _LazySession:
+    """De gedeelde sessie, wordt pas bij het eerste gebruik aangemaakt met `get_session`
 
+    Zo kost `import LDO_API.export_LDO` geen sessie met adapters en pools als er (nog) geen requests worden gedaan.
+    """
 
-def get_scenario_subset(mode, limit_per_request, offset, headers, extra_filter=""):
-    """Get list of scenarios status landelijk gebruik (mode=public)"""
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._session = None
+
+    def _get(self) -> requests.Session:
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._factory()
+        return self._session
+
+    def __getattr__(self, name: str):
+        return getattr(self._get(), name)
+
+
+_session = _LazySession(get_session)
+
+
+def enable_http_cache(
+    path: Path = Path("ldo_http_cache.sqlite"),
+    ttl: float = DEFAULT_TTL,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> HttpCache:
+    """zet de persistente http cache aan voor de alleen-lezen endpoints van `_session`, zie `LDO_API.http_cache_LDO`
+
+    `ttl` is het aantal seconden dat een antwoord zonder request wordt gebruikt, daarna wordt het met een
+    conditioneel request (ETag/Last-Modified) gevalideerd.
+    """
+    cache = HttpCache(path, ttl=ttl, max_bytes=max_bytes)
+    for adapter in set(_session.adapters.values()):
+        if isinstance(adapter, RateLimitedAdapter):
+            adapter.cache = cache
+    return cache
+
+
+def disable_http_cache() -> None:
+    """zet de http cache van `_session` weer uit"""
+    for adapter in set(_session.adapters.values()):
+        if isinstance(adapter, RateLimitedAdapter) and adapter.cache is not None:
+            adapter.cache.close()
+            adapter.cache = None
+
+
+if os.environ.get("LDO_HTTP_CACHE"):
+    enable_http_cache(Path(os.environ["LDO_HTTP_CACHE"]))
+
+
+def get_scenario_page(
+    mode, limit_per_request, offset, headers, extra_filter=""
+) -> tuple[list, Optional[int]]:
+    """Haal een pagina met scenarios op, geeft (items, total) terug of ([], None) bij een fout"""
     response = _session.get(
         f"{server}/api/v1/scenarios?mode={mode}&limit={limit_per_request}&offset={offset}&order_by=id{extra_filter}",
         headers=headers,
     )
     if response.status_code == 200:
         result = response.json()
-        scenario_list = list(
-            (
-                item.get("id")
-                for item in result["items"]
-                if item.get("status") == "quality_checked"
-            )
-        )
+        return result["items"], result.get("total")
     else:
         warnings.warn(f"{response.status_code}:{response.text}")
-        scenario_list = []
-    return scenario_list
+        return [], None
 
 
-def get_scenario_list(offset, limit_per_request, maximum, headers, extra_filter=""):
-    mode = "public"
-    scenario_ids = []
+def quality_checked_ids(items: list) -> list:
+    """Geef de ids van de scenarios met status quality_checked"""
+    return [item.get("id") for item in items if item.get("status") == "quality_checked"]
+
+
+def get_scenario_subset(mode, limit_per_request, offset, headers, extra_filter=""):
+    """Get list of scenarios status landelijk gebruik (mode=public)"""
+    items, _ = get_scenario_page(
+        mode, limit_per_request, offset, headers, extra_filter=extra_filter
+    )
+    return quality_checked_ids(items)
+
+
+def delta_filter(since: str, field: str = DELTA_FILTER_FIELD) -> str:
+    """filter voor `extra_filter` die alleen scenarios geeft die sinds `since` (iso tijd) zijn aangemaakt of gewijzigd"""
+    return f"&{field}={quote(since)}"
+
 
-    for offset in range(0, maximum, limit_per_request):
-        scenario_ids += get_scenario_subset(
-            mode, limit_per_request, offset, headers, extra_filter=extra_filter
+def get_scenario_items(
+    offset,
+    limit_per_request,
+    maximum: Optional[int],
+    headers,
+    extra_filter="",
+    max_workers: int = 8,
+) -> list:
+    """Haal alle scenarios op (de volledige items, ongeacht status).
+
+    De eerste pagina geeft het totaal aantal scenarios (`total`) van de server, de overige pagina's worden
+    daarna gelijktijdig opgehaald (maximaal `max_workers` tegelijk) en op volgorde samengevoegd.
+    `maximum` is optioneel een bovengrens voor het aantal op te halen scenarios (None = alles).
+    """
+    mode = "public"
+    items, total = get_scenario_page(
+        mode, limit_per_request, offset, headers, extra_filter=extra_filter
+    )
+    if total is None:
+        raise UserWarning(f"Eerste pagina met scenarios (offset {offset}) mislukt")
+    if maximum is not None:
+        total = min(total, maximum)
+
+    def get_page(page_offset: int) -> list:
+        page_items, page_total = get_scenario_page(
+            mode, limit_per_request, page_offset, headers, extra_filter=extra_filter
         )
+        if page_total is None:
+            # liever een fout dan stilletjes een onvolledige lijst
+            raise UserWarning(f"Pagina met scenarios (offset {page_offset}) mislukt")
+        return page_items
+
+    offsets = range(offset + limit_per_request, total, limit_per_request)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # map geeft de resultaten in de volgorde van de offsets terug
+        for page_items in executor.map(get_page, offsets):
+            items += page_items
+
+    return items[: total - offset]
+
+
+def get_scenario_list(
+    offset,
+    limit_per_request,
+    maximum: Optional[int],
+    headers,
+    extra_filter="",
+    max_workers: int = 8,
+):
+    """Haal alle scenario ids met status quality_checked op, zie `get_scenario_items`"""
+    items = get_scenario_items(
+        offset,
+        limit_per_request,
+        maximum,
+        headers,
+        extra_filter=extra_filter,
+        max_workers=max_workers,
+    )
+    return quality_checked_ids(items)
+
+
+class ExportTooLargeError(UserWarning):
+    """De server weigert een bulk-export omdat er te veel (of te grote) scenarios in zitten"""
+
+
+# begin van de `detail` van een 400/422 als een bulk-export te veel scenarios bevat
+SIZE_ERROR_DETAIL = re.compile(r"(too many scenarios|request entity too large)\b", re.I)
+
+
+def _is_size_error(response: requests.Response) -> bool:
+    """herken een weigering van de server vanwege de omvang van een bulk-export
 
-    return scenario_ids
+    Een 413, of een 400/422 waarvan de `detail` begint met `SIZE_ERROR_DETAIL`; andere fouten
+    (bijvoorbeeld over een rate limit) worden niet als omvang gezien.
+    """
+    if response.status_code == 413:
+        return True
+    if response.status_code not in (400, 422):
+        return False
+    try:
+        detail = response.json().get("detail")
+    except (ValueError, AttributeError):
+        return False
+    return isinstance(detail, str) and SIZE_ERROR_DETAIL.match(detail) is not None
 
 
 def create_new_bulk_export(headers: dict, index: int) -> tuple[str, str, str]:
@@ -239,6 +406,8 @@ def add_ids_to_export(
         # print(f"{response.json()}")
         # print(len(response.json()['scenario_ids']))
         pass
+    elif _is_size_error(response):
+        raise ExportTooLargeError(f"{response.status_code}: {response.text}")
     else:
         # print(response.status_code, response.text)
         raise UserWarning(f"{response.status_code}: {response.text}")
@@ -275,25 +444,110 @@ def start_export(
     return response, export_body
 
 
-def wait_for_export(
-    export_id: str, headers: dict, status: str
-) -> Optional[requests.Response]:
-    """wacht tot export klaar is voor download"""
-    while status == "submitted":
-        response = _session.get(
-            f"{server}/api/v1/bulk-exports/{export_id}", headers=headers
+class ExportPoller:
+    """Volg de status van veel bulk-exports tegelijk vanuit één thread
+
+    Elke export wordt eerst na `min_interval` seconden opgevraagd, zolang deze nog loopt wordt de wachttijd
+    steeds met `factor` vermenigvuldigd tot maximaal `max_interval`. Itereren geeft (export_id, status) terug
+    zodra een export klaar is of mislukt (`error`), in de volgorde waarin ze klaar zijn. Tijdens het itereren
+    kunnen nieuwe exports worden toegevoegd.
+    Een mislukt opvragen (foutcode of netwerkfout) raakt alleen die export, deze wordt volgens hetzelfde schema
+    opnieuw opgevraagd. Na `max_failures` keer achter elkaar mislukt geeft de export `error`.
+
+    ```python
+    poller = ExportPoller(headers)
+    for export_id, status in started:
+        poller.add(export_id, status)
+    for export_id, status in poller:
+        ...
+    ```
+    """
+
+    def __init__(
+        self,
+        headers: dict,
+        min_interval: float = 2,
+        max_interval: float = 60,
+        factor: float = 1.5,
+        max_failures: int = 5,
+    ):
+        self.headers = headers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.max_failures = max_failures
+        self._queue = []  # heap met (volgende poll, volgorde, export_id, interval, mislukt achter elkaar)
+        self._done = []  # exports die al klaar waren bij het toevoegen
+        self._counter = 0
+
+    def __len__(self) -> int:
+        return len(self._queue) + len(self._done)
+
+    def add(self, export_id: str, status: str = "submitted") -> None:
+        """volg een gestarte export, met de status van `start_export`"""
+        if status != "submitted":
+            self._done.append((export_id, status))
+            return
+        self._schedule(export_id, self.min_interval)
+
+    def _schedule(self, export_id: str, interval: float, failures: int = 0) -> None:
+        self._counter += 1
+        heapq.heappush(
+            self._queue,
+            (time.monotonic() + interval, self._counter, export_id, interval, failures),
         )
+
+    def _poll(self, export_id: str) -> Optional[str]:
+        """huidige status van een export, None als het opvragen mislukt"""
+        try:
+            response = _session.get(
+                f"{server}/api/v1/bulk-exports/{export_id}", headers=self.headers
+            )
+        except requests.exceptions.RequestException as e:
+            warnings.warn(f"Status van export {export_id} niet opgehaald: {e}")
+            return None
         if response.status_code == 200:
-            status = response.json()["status"]
-            # print(f"status taak: {status}", end="\r")
-            if status == "error":
-                response = None
-                break
-        else:
-            warnings.warn(f"{response.status_code}: {response.text}")
-        time.sleep(10)
+            return response.json()["status"]
+        warnings.warn(f"{response.status_code}: {response.text}")
+        return None
 
-    return response
+    def __iter__(self) -> Iterator[tuple[str, str]]:
+        while len(self) > 0:
+            if len(self._done) > 0:
+                yield self._done.pop(0)
+                continue
+            due, _, export_id, interval, failures = heapq.heappop(self._queue)
+            time.sleep(max(0.0, due - time.monotonic()))
+            status = self._poll(export_id)
+            if status == "submitted":
+                failures = 0
+            elif status is not None:
+                yield export_id, status
+                continue
+            else:
+                failures += 1
+                if failures >= self.max_failures:
+                    warnings.warn(
+                        f"Status van export {export_id} {failures} keer niet opgehaald, opgegeven"
+                    )
+                    yield export_id, "error"
+                    continue
+            self._schedule(
+                export_id, min(interval * self.factor, self.max_interval), failures
+            )
+
+
+def wait_for_export(
+    export_id: str, headers: dict, status: str
+) -> Optional[requests.Response]:
+    """wacht tot export klaar is voor download, geeft None terug als de export is mislukt"""
+    poller = ExportPoller(headers)
+    poller.add(export_id, status)
+    for _, status in poller:
+        pass
+    if status == "error":
+        return None
+    return check_export_id(export_id, headers)
 
 
 def get_file_name(export_id: str, headers: dict, export_body: dict) -> str:
@@ -331,13 +585,273 @@ def get_download_url(
     return url
 
 
-def download_zip(url: str, export_id: str) -> None:
-    """download het zip bestand"""
-    response = _session.get(url, stream=True)
-    with open(f"export_{export_id}.zip", "wb") as f:
-        for chunk in response.iter_content(chunk_size=512):
-            if chunk:  # filter out keep-alive new chunks
-                f.write(chunk)
+class UrlExpiredError(ConnectionError):
+    """De gesigneerde download url is verlopen of geweigerd (401/403), vraag een nieuwe op met `get_file_url`"""
+
+
+# statussen van de object storage voor een verlopen of ongeldige handtekening
+EXPIRED_STATUS = (401, 403)
+
+
+def url_expiry(url: str) -> Optional[float]:
+    """verlooptijd (unix tijd) van een gesigneerde url, of None als deze niet in de url staat
+
+    Herkent S3 (`X-Amz-Date` + `X-Amz-Expires`), Azure (`se`) en een `Expires`/`expires` unix tijd (S3 v2, GCS).
+    """
+    query = {
+        key.lower(): values[0] for key, values in parse_qs(urlsplit(url).query).items()
+    }
+    try:
+        if "x-amz-date" in query and "x-amz-expires" in query:
+            start = date.strptime(query["x-amz-date"], "%Y%m%dT%H%M%SZ")
+            start = start.replace(tzinfo=timezone.utc).timestamp()
+            return start + int(query["x-amz-expires"])
+        if "se" in query:
+            return date.fromisoformat(query["se"].replace("Z", "+00:00")).timestamp()
+        if "expires" in query:
+            return float(query["expires"])
+    except ValueError:
+        return None
+    return None
+
+
+def _expected_size(response: requests.Response, offset: int) -> Optional[int]:
+    """bepaal de verwachte totale grootte van het bestand uit Content-Range of Content-Length"""
+    content_range = response.headers.get("Content-Range")
+    if content_range is not None and "/" in content_range:
+        total = content_range.split("/")[-1]
+        return int(total) if total.isdigit() else None
+    content_length = response.headers.get("Content-Length")
+    # bij een gecomprimeerde response klopt Content-Length niet met wat er naar schijf gaat
+    if content_length is None or response.headers.get("Content-Encoding"):
+        return None
+    return offset + int(content_length)
+
+
+def sha256_of_file(fname: Path):
+    """sha256 van een (deel)bestand, om bij hervatten verder te kunnen rekenen"""
+    hasher = hashlib.sha256()
+    with open(fname, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher
+
+
+def _file_info(response: requests.Response, fname: Path, hasher) -> dict:
+    """gegevens van een gedownload bestand voor het download manifest"""
+    return {
+        "size": fname.stat().st_size,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256": hasher.hexdigest(),
+    }
+
+
+def _blokken(response: requests.Response, buffer: bytearray) -> Iterator:
+    """lees de body van een (stream=True) response in blokken van maximaal `len(buffer)` bytes
+
+    Zonder Content-Encoding wordt met readinto direct van de socket in de buffer gelezen, zonder tussenkopie per
+    chunk. Dat gaat via het (interne) http.client object van urllib3; heeft de response dat niet (een andere
+    urllib3 versie of adapter), dan wordt het publieke `iter_content` gebruikt.
+    """
+    fp = getattr(response.raw, "_fp", None)
+    if response.headers.get("Content-Encoding") is None and callable(
+        getattr(fp, "readinto", None)
+    ):
+        view = memoryview(buffer)
+        while True:
+            n = fp.readinto(buffer)
+            if not n:
+                break
+            yield view[:n]
+        # volledig gelezen: verbinding terug naar de pool in plaats van sluiten
+        release_conn = getattr(response.raw, "release_conn", None)
+        if release_conn is not None:
+            release_conn()
+    else:
+        yield from response.iter_content(len(buffer))
+
+
+def stream_response(
+    response: requests.Response, f, hasher=None, chunk_size: Optional[int] = None
+) -> dict:
+    """Schrijf de body van een (stream=True) response naar het open bestand f
+
+    Er wordt met een vaste buffer van `chunk_size` (standaard `CHUNK_SIZE`) gelezen, zie `_blokken`.
+    Geeft statistieken van de overdracht terug: bytes, seconds en mb_per_s.
+    """
+    buffer = bytearray(chunk_size or CHUNK_SIZE)
+    start = time.perf_counter()
+    received = 0
+    try:
+        for block in _blokken(response, buffer):
+            f.write(block)
+            if hasher is not None:
+                hasher.update(block)
+            received += len(block)
+    except (urllib3.exceptions.HTTPError, http.client.HTTPException, OSError) as e:
+        raise requests.exceptions.ConnectionError(e) from e
+    seconds = time.perf_counter() - start
+    if response.request is not None:
+        metrics.record_transfer(
+            response.request.method, response.url, received, seconds
+        )
+    return {
+        "bytes": received,
+        "seconds": seconds,
+        "mb_per_s": received / 1e6 / seconds if seconds > 0 else None,
+    }
+
+
+def download_file(url: str, fname: Path, resume: bool = True) -> dict:
+    """download een bestand van de gegeven url naar fname
+
+    Er wordt eerst naar `fname.part` geschreven, pas als de grootte klopt met Content-Length wordt dit hernoemd
+    naar fname. Een bestaand `.part` bestand van een afgebroken download wordt met een Range request hervat
+    als de server dat ondersteunt. Bij een onderbroken of onvolledige download volgt een ConnectionError, bij een
+    verlopen url een `UrlExpiredError`.
+    Geeft grootte, ETag, Last-Modified en sha256 van het bestand terug, plus de statistieken van de overdracht
+    onder "transfer" (zie `stream_response`).
+    """
+    fname = Path(fname)
+    part_file = fname.with_name(fname.name + ".part")
+    offset = part_file.stat().st_size if resume and part_file.exists() else 0
+    range_header = {"Range": f"bytes={offset}-"} if offset > 0 else None
+
+    try:
+        response = _session.get(url, stream=True, headers=range_header)
+    except requests.exceptions.RequestException as e:
+        raise ConnectionError(f"Download van {fname.name} mislukt: {e}") from e
+    try:
+        if response.status_code == 416 and _expected_size(response, 0) == offset:
+            # het .part bestand was al compleet
+            hasher = sha256_of_file(part_file)
+            os.replace(part_file, fname)
+            return _file_info(response, fname, hasher)
+        elif response.status_code == 206:
+            mode = "ab"
+            hasher = sha256_of_file(part_file)
+        elif response.status_code == 200:
+            # server ondersteunt geen Range (of er was niets om te hervatten): opnieuw beginnen
+            mode, offset = "wb", 0
+            hasher = hashlib.sha256()
+        elif response.status_code in EXPIRED_STATUS:
+            # het .part bestand blijft staan, hervatten met een nieuwe url
+            raise UrlExpiredError(
+                f"Download url van {fname.name} verlopen: {response.status_code}"
+            )
+        else:
+            if response.status_code == 416:
+                part_file.unlink(missing_ok=True)
+            raise ConnectionError(
+                f"Download van {fname.name} mislukt: {response.status_code}: {response.text[:200]}"
+            )
+
+        expected = _expected_size(response, offset)
+        try:
+            with open(part_file, mode) as f:
+                transfer = stream_response(response, f, hasher)
+        except requests.exceptions.RequestException as e:
+            # het .part bestand blijft staan, de volgende poging gaat verder
+            raise ConnectionError(f"Download van {fname.name} onderbroken: {e}") from e
+    finally:
+        response.close()
+
+    received = part_file.stat().st_size
+    if expected is not None and received != expected:
+        if received > expected:
+            part_file.unlink()
+        raise ConnectionError(
+            f"Download van {fname.name} onvolledig: {received} van {expected} bytes"
+        )
+    os.replace(part_file, fname)
+    return dict(_file_info(response, fname, hasher), transfer=transfer)
+
+
+def not_modified(url: str, entry: Optional[dict]) -> bool:
+    """True als het bestand achter `url` niet is gewijzigd sinds de download in `entry` (van `download_file`)
+
+    Stuurt een conditioneel request met de bewaarde ETag/Last-Modified, zonder validators is niet te bewijzen
+    dat het bestand ongewijzigd is en wordt False teruggegeven. Bij een verlopen url volgt een `UrlExpiredError`.
+    """
+    validators = {}
+    if entry is not None and entry.get("etag"):
+        validators["If-None-Match"] = entry["etag"]
+    if entry is not None and entry.get("last_modified"):
+        validators["If-Modified-Since"] = entry["last_modified"]
+    if len(validators) == 0:
+        return False
+    try:
+        # stream: bij een 200 wordt de body niet gelezen, de download volgt met `download_file`
+        response = _session.get(url, stream=True, headers=validators)
+    except requests.exceptions.RequestException as e:
+        raise ConnectionError(f"Controle van {url} mislukt: {e}") from e
+    response.close()
+    if response.status_code in EXPIRED_STATUS:
+        raise UrlExpiredError(f"Download url verlopen: {response.status_code}")
+    return response.status_code == 304
+
+
+def download_fileobj(url: str, f) -> dict:
+    """download een bestand van de gegeven url naar een open (tijdelijk) bestand f, zonder hervatten
+
+    Bij een onderbroken of onvolledige download volgt een ConnectionError, zie `download_file`.
+    """
+    response, expected = open_download(url)
+    return receive_download(url, response, expected, f)
+
+
+def open_download(url: str) -> tuple[requests.Response, Optional[int]]:
+    """start de download van een bestand, geeft de (stream=True) response en de verwachte grootte terug
+
+    Zo kan op grond van de grootte worden gekozen waar het bestand heen gaat, lees daarna met `receive_download`.
+    """
+    try:
+        response = _session.get(url, stream=True)
+    except requests.exceptions.RequestException as e:
+        raise ConnectionError(f"Download van {url} mislukt: {e}") from e
+    try:
+        if response.status_code in EXPIRED_STATUS:
+            raise UrlExpiredError(f"Download url verlopen: {response.status_code}")
+        if response.status_code != 200:
+            raise ConnectionError(
+                f"Download van {url} mislukt: {response.status_code}: {response.text[:200]}"
+            )
+    except BaseException:
+        response.close()
+        raise
+    return response, _expected_size(response, 0)
+
+
+def receive_download(
+    url: str, response: requests.Response, expected: Optional[int], f
+) -> dict:
+    """lees de response van `open_download` naar het open bestand f en sluit de response, zie `download_fileobj`"""
+    try:
+        hasher = hashlib.sha256()
+        try:
+            transfer = stream_response(response, f, hasher)
+        except requests.exceptions.RequestException as e:
+            raise ConnectionError(f"Download van {url} onderbroken: {e}") from e
+    finally:
+        response.close()
+
+    if expected is not None and transfer["bytes"] != expected:
+        raise ConnectionError(
+            f"Download van {url} onvolledig: {transfer['bytes']} van {expected} bytes"
+        )
+    return {
+        "size": transfer["bytes"],
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256": hasher.hexdigest(),
+        "transfer": transfer,
+    }
+
+
+def download_zip(url: str, export_id: str, work_dir: Path = Path(".")) -> None:
+    """download het zip bestand naar `work_dir/export_{export_id}.zip`"""
+    download_file(url, work_dir / f"export_{export_id}.zip")
 
 
 def get_file_url(scenario_id: str, layer_name: str, headers: dict) -> str:
@@ -357,34 +871,37 @@ def get_file_url(scenario_id: str, layer_name: str, headers: dict) -> str:
         return response.status_code, response.text
 
 
-def download_tif(url: str, name: str, export_id: str, work_dir: Path) -> None:
-    """download een tif bestand"""
-    response = _session.get(url, stream=True)
-
-    export_path = work_dir / f"{export_id}"
-    if not export_path.exists():
-        export_path.mkdir()
+def local_file_name(name: str) -> str:
+    """lokale bestandsnaam van een laag: `scenario_<id>_` wordt van de naam afgehaald"""
     if name.startswith("scenario_"):
-        new_name = "_".join(name.split("_")[2:])
+        return "_".join(name.split("_")[2:])
     else:
-        new_name = name
-    fname = export_path / new_name
-    try:
-        with open(fname, "wb") as f:
-            for chunk in response.iter_content(chunk_size=512):
-                if chunk:  # filter out keep-alive new chunks
-                    f.write(chunk)
-    finally:
-        response.close()
+        return name
 
 
-def get_ssm(scenario_id: str, headers: dict) -> str:
-    """haal de bestandsnaam van de export op"""
+def download_tif(url: str, name: str, export_id: str, work_dir: Path) -> dict:
+    """download een tif bestand, geeft de gegevens van het bestand terug (zie `download_file`)"""
+    export_path = work_dir / f"{export_id}"
+    export_path.mkdir(exist_ok=True)
+    return download_file(url, export_path / local_file_name(name))
+
+
+def get_ssm(scenario_id: str, headers: dict, raise_on_error: bool = False) -> str:
+    """haal de ssm metadata van een scenario op
+
+    Bij een fout wordt een waarschuwing gegeven en None terug gegeven, of met `raise_on_error` een UserWarning opgegooid.
+    """
     response = _session.get(
         f"{server}/api/v1/scenarios/{scenario_id}/external-processings", headers=headers
     )
 
-    if response.status_code == 200:
+    if response.status_code == 200 and len(response.json()["items"]) == 0:
+        message = f"Geen external-processings voor scenario {scenario_id}"
+        if raise_on_error:
+            raise UserWarning(message)
+        warnings.warn(message)
+        return None
+    elif response.status_code == 200:
         json = response.json()["items"][0]
         if json["config"] is not None:
             json.update(json["config"])
@@ -401,6 +918,8 @@ def get_ssm(scenario_id: str, headers: dict) -> str:
             json["errors"] = ";".join(json["errors"])
 
         return json
+    elif raise_on_error:
+        raise UserWarning(f"{response.status_code}: {response.text}")
     else:
         warnings.warn(f"{response.status_code}: {response.text}")
         return None
@@ -409,12 +928,19 @@ def get_ssm(scenario_id: str, headers: dict) -> str:
 def combine_functions_start_export(
     headers: dict, index: int, scenario_ids: list
 ) -> tuple[str, str, dict]:
-    """maakt een nieuwe (lege) bulk-export aan, voegt ids toe en start de export"""
+    """maakt een nieuwe (lege) bulk-export aan, voegt ids toe en start de export
+
+    Bij een `ExportTooLargeError` wordt de lege export weer verwijderd.
+    """
     export_name, export_description, export_id = create_new_bulk_export(headers, index)
     response = check_export_id(export_id, headers)
-    response = add_ids_to_export(
-        scenario_ids, headers, export_name, export_description, export_id
-    )
+    try:
+        response = add_ids_to_export(
+            scenario_ids, headers, export_name, export_description, export_id
+        )
+    except ExportTooLargeError:
+        delete_bulk_export(headers, export_id)
+        raise
     response, export_body = start_export(
         headers, export_name, export_description, export_id
     )
@@ -423,17 +949,36 @@ def combine_functions_start_export(
 
 
 def combine_functions_download_export(
-    headers: dict, export_id: int, status, export_body: dict
-) -> None:
-    """Wacht tot de gegenereerde export is voltooid en download deze vervolgens"""
+    headers: dict,
+    export_id: int,
+    status,
+    export_body: dict,
+    work_dir: Path = Path("."),
+) -> bool:
+    """Wacht tot de gegenereerde export is voltooid en download deze naar `work_dir`, geeft terug of dit is gelukt"""
     response = wait_for_export(export_id, headers, status)
     if response is not None:
-        url = get_download_url(server, export_id, headers, export_body)
-        download_zip(url, export_id)
+        return download_finished_export(headers, export_id, export_body, work_dir)
     else:
         warnings.warn(
             f"Export with id {export_id} had an issue downloading, moving onto the next"
         )
+        return False
+
+
+def download_finished_export(
+    headers: dict, export_id: int, export_body: dict, work_dir: Path = Path(".")
+) -> bool:
+    """Download een voltooide export naar `work_dir/export_{export_id}.zip`, geeft terug of dit is gelukt"""
+    url = get_download_url(server, export_id, headers, export_body)
+    if url is None:
+        return False
+    try:
+        download_zip(url, export_id, work_dir)
+    except ConnectionError as e:
+        warnings.warn(f"Export with id {export_id} could not be downloaded: {e}")
+        return False
+    return True
 
 
 def status_update(export_id: str, headers: dict) -> str:
@@ -466,8 +1011,8 @@ def get_layer_names(export_id: str, headers: dict) -> str:
         return None
 
 
-def get_all_metadata(scenario_ids: list, fname: Path, headers: dict) -> str:
-    """haal de bestanden van de export op"""
+def _post_metadata_export(scenario_ids: list, fname: Path, headers: dict):
+    """één `POST /scenarios/export`, geeft None terug als gelukt of anders (status_code, tekst)"""
     data = dict()
     data["id"] = scenario_ids
     response = _session.post(
@@ -478,10 +1023,115 @@ def get_all_metadata(scenario_ids: list, fname: Path, headers: dict) -> str:
     )
 
     if response.status_code == 200:
-        with open(fname, "wb") as f:
-            for chunk in response.iter_content(chunk_size=512):
-                if chunk:  # filter out keep-alive new chunks
-                    f.write(chunk)
+        # eerst naar een tijdelijk bestand, zodat een afgebroken download geen half bestand achterlaat
+        part_file = Path(fname).with_name(Path(fname).name + ".part")
+        try:
+            with open(part_file, "wb") as f:
+                stream_response(response, f)
+        finally:
+            response.close()
+        os.replace(part_file, fname)
 
     else:
         return response.status_code, response.text
+
+
+def voeg_metadata_excels_samen(
+    parts: list, fname: Path, header_rows: int = METADATA_HEADER_ROWS
+) -> None:
+    """Voeg de metadata excels van de batches samen tot één excel, per werkblad
+
+    De eerste `header_rows` rijen (kop en toelichting) komen uit het eerste bestand, daarna volgen de rijen
+    van alle bestanden op volgorde. Wijken de kolomnamen van een bestand af, dan volgt een UserWarning.
+    Leest en schrijft rij voor rij (openpyxl read/write only).
+    """
+    from openpyxl import Workbook, load_workbook
+
+    sources = [load_workbook(part, read_only=True) for part in parts]
+    try:
+        merged = Workbook(write_only=True)
+        for sheet_name in sources[0].sheetnames:
+            sheet = merged.create_sheet(sheet_name)
+            kop = None
+            for index, source in enumerate(sources):
+                if sheet_name not in source.sheetnames:
+                    continue
+                rows = source[sheet_name].iter_rows(values_only=True)
+                header = [row for _, row in zip(range(header_rows), rows)]
+                if kop is None:
+                    kop = header
+                    for row in header:
+                        sheet.append(row)
+                elif header[1:2] != kop[1:2]:
+                    # de kolomnamen (tweede rij) moeten gelijk zijn, anders is het formaat veranderd
+                    raise UserWarning(
+                        f"Kolommen van {parts[index]} wijken af van {parts[0]}, niet samengevoegd"
+                    )
+                for row in rows:
+                    sheet.append(row)
+        part_file = Path(fname).with_name(Path(fname).name + ".part")
+        merged.save(part_file)
+    finally:
+        for source in sources:
+            source.close()
+    os.replace(part_file, fname)
+
+
+def get_all_metadata(
+    scenario_ids: list,
+    fname: Path,
+    headers: dict,
+    batch_size: Optional[int] = None,
+    max_workers: int = 4,
+    max_attempts: int = 3,
+):
+    """Haal de metadata excel van de scenarios op, geeft None terug als gelukt of anders (status_code, tekst)
+
+    Standaard gaat alles in één request. Met `batch_size` (bijvoorbeeld `METADATA_BATCH_SIZE`) wordt de export
+    bij meer scenarios in batches opgevraagd (maximaal `max_workers` tegelijk, elke batch tot `max_attempts` keer)
+    en worden de excels samengevoegd tot `fname`. Geslaagde batches blijven in `<fname>.parts-<hash>/` staan tot
+    alles binnen is: een volgende aanroep met dezelfde scenarios en `batch_size` haalt alleen de ontbrekende
+    batches op. Na het samenvoegen wordt de map verwijderd.
+    """
+    fname = Path(fname)
+    if batch_size is None or len(scenario_ids) <= batch_size:
+        return _post_metadata_export(scenario_ids, fname, headers)
+
+    # de naam hangt af van de hele lijst, zodat een andere lijst of batch grootte geen oude batches hergebruikt
+    digest = hashlib.sha1(json.dumps([batch_size, scenario_ids]).encode()).hexdigest()
+    parts_dir = fname.with_name(f"{fname.name}.parts-{digest[:12]}")
+    parts_dir.mkdir(exist_ok=True)
+    batches = [
+        scenario_ids[i : i + batch_size]
+        for i in range(0, len(scenario_ids), batch_size)
+    ]
+
+    def get_batch(index: int, batch: list):
+        part = parts_dir / f"batch_{index:05d}{fname.suffix}"
+        if part.exists():
+            return part, None
+        error = None
+        for attempt in range(1, max_attempts + 1):
+            try:
+                error = _post_metadata_export(batch, part, headers)
+            except (requests.exceptions.RequestException, ConnectionError) as e:
+                error = None, str(e)
+            if error is None:
+                return part, None
+            if attempt < max_attempts:
+                time.sleep(2 ** (attempt - 1))
+        warnings.warn(
+            f"Metadata van batch {index} ({len(batch)} scenarios) mislukt: {error}"
+        )
+        return part, error
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(get_batch, range(len(batches)), batches))
+
+    errors = [error for _, error in results if error is not None]
+    if len(errors) > 0:
+        return errors[0]
+    voeg_metadata_excels_samen([part for part, _ in results], fname)
+    for part in parts_dir.iterdir():
+        part.unlink()
+    parts_dir.rmdir()
@@ -0,0 +1,210 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Asyncio adapter voor de functies in `export_LDO.py`, zodat de API vanuit een event loop kan worden gebruikt
+(bijvoorbeeld vanuit een orchestratie service) zonder die loop te blokkeren.
+
+Dit is geen native async http client: elke call draait de blokkerende `export_LDO` functie in een eigen thread
+pool, via dezelfde gedeelde `requests` sessie (met connection pooling en retries). Het aantal gelijktijdige calls
+is daarmee begrensd door het aantal threads, `max_concurrency`.
+Voor testen tegen een lokale server: zet de omgevingsvariabele `LDO_SERVER` of `export_LDO.server`.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from LDO_API import export_LDO
+
+
+class AsyncLDOClient:
+    """Dezelfde operaties als `export_LDO`, als coroutines die de blokkerende calls naar een thread pool sturen
+
+    Een thread-offload adapter, geen native async I/O: er lopen maximaal `max_concurrency` calls tegelijk, elk in
+    een eigen thread. Gebruik als async context manager (of roep `aclose` aan), zodat de thread pool wordt afgesloten:
+
+    ```python
+    async with AsyncLDOClient(headers, max_concurrency=32) as client:
+        ids = await client.get_scenario_list()
+        layers = await asyncio.gather(*(client.get_layer_names(i) for i in ids))
+    ```
+    """
+
+    def __init__(self, headers: dict, max_concurrency: int = 32):
+        self.headers = headers
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="ldo-async"
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def __aenter__(self) -> "AsyncLDOClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """sluit de thread pool af, na het afronden van de lopende calls"""
+        await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(self._executor.shutdown, wait=True)
+        )
+
+    async def _run(self, func, *args, **kwargs):
+        """voer een (blokkerende) functie uit export_LDO uit in de thread pool"""
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, functools.partial(func, *args, **kwargs)
+            )
+
+    # scenarios
+    async def get_scenario_subset(
+        self, mode: str, limit_per_request: int, offset: int, extra_filter: str = ""
+    ) -> list:
+        """Get list of scenarios status landelijk gebruik (mode=public)"""
+        return await self._run(
+            export_LDO.get_scenario_subset,
+            mode,
+            limit_per_request,
+            offset,
+            self.headers,
+            extra_filter=extra_filter,
+        )
+
+    async def get_scenario_page(
+        self, mode: str, limit_per_request: int, offset: int, extra_filter: str = ""
+    ) -> tuple[list, Optional[int]]:
+        """Haal een pagina met scenarios op, geeft (items, total) terug"""
+        return await self._run(
+            export_LDO.get_scenario_page,
+            mode,
+            limit_per_request,
+            offset,
+            self.headers,
+            extra_filter=extra_filter,
+        )
+
+    async def get_scenario_list(
+        self,
+        maximum: Optional[int] = None,
+        limit_per_request: int = 100,
+        extra_filter: str = "",
+        mode: str = "public",
+    ) -> list:
+        """haal de eerste pagina op voor het totaal, daarna de rest gelijktijdig en voeg ze op volgorde samen"""
+        items, total = await self.get_scenario_page(
+            mode, limit_per_request, 0, extra_filter=extra_filter
+        )
+        if total is None:
+            raise UserWarning("Eerste pagina met scenarios mislukt")
+        if maximum is not None:
+            total = min(total, maximum)
+        offsets = range(limit_per_request, total, limit_per_request)
+        pages = await asyncio.gather(
+            *(
+                self.get_scenario_page(
+                    mode, limit_per_request, offset, extra_filter=extra_filter
+                )
+                for offset in offsets
+            )
+        )
+        for offset, (page_items, page_total) in zip(offsets, pages):
+            if page_total is None:
+                raise UserWarning(f"Pagina met scenarios (offset {offset}) mislukt")
+            items += page_items
+        return export_LDO.quality_checked_ids(items[:total])
+
+    async def get_layer_names(self, scenario_id: int) -> Optional[list]:
+        """haal de bestandsnamen van een scenario op"""
+        return await self._run(export_LDO.get_layer_names, scenario_id, self.headers)
+
+    async def get_ssm(self, scenario_id: int) -> Optional[dict]:
+        """haal de ssm metadata van een scenario op"""
+        return await self._run(export_LDO.get_ssm, scenario_id, self.headers)
+
+    # bestanden
+    async def get_file_url(self, scenario_id: int, layer_name: str) -> tuple[int, str]:
+        """haal de (presigned) download url van een laag op"""
+        return await self._run(
+            export_LDO.get_file_url, scenario_id, layer_name, self.headers
+        )
+
+    async def download_file(self, url: str, fname: Path) -> None:
+        """stream een bestand naar schijf"""
+        await self._run(export_LDO.download_file, url, fname)
+
+    async def download_tif(
+        self, url: str, name: str, scenario_id: int, work_dir: Path
+    ) -> None:
+        """stream een tif bestand naar `work_dir/scenario_id/`"""
+        await self._run(export_LDO.download_tif, url, name, scenario_id, work_dir)
+
+    async def download_layer(
+        self, scenario_id: int, layer_name: str, work_dir: Path
+    ) -> tuple[int, str]:
+        """haal de url van een laag op en download deze, geeft (status_code, url of foutmelding) terug"""
+        status_code, url = await self.get_file_url(scenario_id, layer_name)
+        if status_code == 200:
+            await self.download_tif(url, layer_name, scenario_id, work_dir)
+        return status_code, url
+
+    async def get_all_metadata(self, scenario_ids: list, fname: Path):
+        """haal de metadata van de scenarios op als excel"""
+        return await self._run(
+            export_LDO.get_all_metadata, scenario_ids, fname, self.headers
+        )
+
+    # bulk exports
+    async def start_export(
+        self, index: int, scenario_ids: list
+    ) -> tuple[str, str, dict]:
+        """maakt een nieuwe bulk-export aan, voegt ids toe en start de export"""
+        return await self._run(
+            export_LDO.combine_functions_start_export,
+            self.headers,
+            index,
+            scenario_ids,
+        )
+
+    async def wait_for_export(
+        self, export_id: str, status: str, poll_interval: float = 10
+    ) -> Optional[str]:
+        """wacht (zonder een thread te blokkeren) tot de export klaar is, geeft de status terug of None bij een error"""
+        while status == "submitted":
+            await asyncio.sleep(poll_interval)
+            response = await self._run(
+                export_LDO.check_export_id, export_id, self.headers
+            )
+            status = response.json()["status"]
+        # ook een export die bij het aanmaken al mislukt was
+        if status == "error":
+            return None
+        return status
+
+    async def download_export(
+        self,
+        export_id: str,
+        status: str,
+        export_body: dict,
+        work_dir: Path = Path("."),
+        poll_interval: float = 10,
+    ) -> Optional[Path]:
+        """Wacht tot de export is voltooid en download deze naar `work_dir/export_{export_id}.zip`"""
+        if await self.wait_for_export(export_id, status, poll_interval) is None:
+            return None
+        url = await self._run(
+            export_LDO.get_download_url,
+            export_LDO.server,
+            export_id,
+            self.headers,
+            export_body,
+        )
+        if url is None:
+            return None
+        fname = work_dir / f"export_{export_id}.zip"
+        await self.download_file(url, fname)
+        return fname
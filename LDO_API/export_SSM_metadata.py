@@ -0,0 +1,110 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Haal de ssm metadata van veel scenarios gelijktijdig op, zie `export_SSM_metadata_uit_LDO_met_API.py`.
+"""
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Optional
+
+from LDO_API.catalog_LDO import LDOCatalog
+from LDO_API.export_LDO import get_ssm
+from LDO_API.tracing_LDO import submit, tracer
+
+logger = logging.getLogger(__name__)
+
+# zo lang (seconden) blijft ssm metadata uit de catalogus geldig, daarna wordt deze opnieuw opgehaald
+SSM_MAX_AGE = 7 * 24 * 3600
+
+
+def lees_ssm_resultaten(output_file: Path) -> tuple[dict, dict]:
+    """Lees een (deels) gevuld json lines bestand van `haal_ssm_op` in, geeft (records, mislukt) per scenario id terug"""
+    records, mislukt = {}, {}
+    if not output_file.exists():
+        return records, mislukt
+    with open(output_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            regel = json.loads(line)
+            scenario_id = regel["scenario_id"]
+            if "error" in regel:
+                mislukt[scenario_id] = regel["error"]
+            else:
+                # een latere geslaagde poging overschrijft een eerdere fout
+                records[scenario_id] = regel["record"]
+                mislukt.pop(scenario_id, None)
+    return records, mislukt
+
+
+@tracer.traced()
+def haal_ssm_op(
+    scenario_ids: list,
+    headers: dict,
+    max_workers: int = 16,
+    output_file: Optional[Path] = None,
+    catalog: Optional[LDOCatalog] = None,
+    max_age: Optional[float] = SSM_MAX_AGE,
+) -> tuple[list, dict]:
+    """Haal gelijktijdig de ssm metadata van de scenarios op met maximaal `max_workers` tegelijk
+
+    Elk resultaat wordt direct naar `output_file` (json lines) geschreven, zodat een afgebroken run
+    verder kan: scenarios die daar al succesvol in staan worden overgeslagen, mislukte worden opnieuw geprobeerd.
+    Is alles gelukt, dan wordt `output_file` verwijderd: een volgende run haalt de metadata weer opnieuw op.
+    Met een `catalog` wordt elk resultaat ook in de catalogus vastgelegd en worden scenarios die daar
+    metadata van de laatste `max_age` seconden hebben overgeslagen (`max_age=0`: alles opnieuw ophalen,
+    `None`: metadata uit de catalogus verloopt niet).
+    Geeft (records, mislukt) terug, met mislukt een dict {scenario_id: reden}.
+    """
+    from tqdm import tqdm
+
+    records, mislukt = {}, {}
+    if output_file is not None:
+        records, _ = lees_ssm_resultaten(output_file)
+    if catalog is not None:
+        records.update(catalog.ssm_records(max_age=max_age))
+    te_doen = [i for i in scenario_ids if i not in records]
+
+    f_out = open(output_file, "a", encoding="utf-8") if output_file else None
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                submit(
+                    executor,
+                    tracer.traced("get_ssm", kind="item")(get_ssm),
+                    scenario_id,
+                    headers,
+                    raise_on_error=True,
+                ): scenario_id
+                for scenario_id in te_doen
+            }
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                scenario_id = futures[future]
+                try:
+                    record = future.result()
+                    regel = {"scenario_id": scenario_id, "record": record}
+                    records[scenario_id] = record
+                    if catalog is not None:
+                        catalog.record_ssm(scenario_id, record=record)
+                except Exception as e:
+                    logger.error(f"Failed to get ssm for scenario {scenario_id}: {e}")
+                    regel = {"scenario_id": scenario_id, "error": str(e)}
+                    mislukt[scenario_id] = str(e)
+                    if catalog is not None:
+                        catalog.record_ssm(scenario_id, error=str(e))
+                if f_out is not None:
+                    f_out.write(json.dumps(regel, default=str) + "\n")
+                    f_out.flush()
+    finally:
+        if f_out is not None:
+            f_out.close()
+
+    if output_file is not None and len(mislukt) == 0:
+        # alleen bedoeld om een afgebroken run te hervatten
+        output_file.unlink(missing_ok=True)
+    return [records[i] for i in scenario_ids if i in records], mislukt
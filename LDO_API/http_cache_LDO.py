@@ -0,0 +1,260 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Optionele persistente http cache (SQLite) voor de alleen-lezen GET endpoints van de API: de lijst met scenarios,
+`/scenarios/{id}` (`get_layer_names`) en `/scenarios/{id}/external-processings` (`get_ssm`).
+
+Een antwoord is `ttl` seconden vers (of `max-age` uit de Cache-Control header van de server) en komt dan direct
+uit de cache. Daarna wordt het opnieuw gevalideerd met If-None-Match / If-Modified-Since: bij een 304 komt de body
+uit de cache. Bij meer dan `max_bytes` worden de langst niet gebruikte antwoorden verwijderd. Andere requests
+(POST, downloads, bulk-exports, tokens) gaan altijd langs de cache heen.
+
+De cache hoort bij één api key / tenant, de Authorization header maakt geen deel uit van de sleutel.
+Aanzetten met `export_LDO.enable_http_cache(Path("ldo_http_cache.sqlite"))` of de omgevingsvariabele `LDO_HTTP_CACHE`.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# paden van de alleen-lezen endpoints die gecached mogen worden
+CACHEABLE_PATHS = (
+    re.compile(r"^/api/v1/scenarios/?$"),
+    re.compile(r"^/api/v1/scenarios/\d+/?$"),
+    re.compile(r"^/api/v1/scenarios/\d+/external-processings/?$"),
+)
+DEFAULT_TTL = 600  # seconden
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored REAL NOT NULL,
+    max_age REAL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+
+def _max_age(headers) -> Optional[float]:
+    """versheid in seconden volgens Cache-Control, of None als de server niets opgeeft"""
+    directives = {}
+    for part in headers.get("Cache-Control", "").split(","):
+        key, _, value = part.strip().lower().partition("=")
+        directives[key] = value
+    if "no-cache" in directives:
+        return 0.0
+    if directives.get("max-age", "").isdigit():
+        return float(directives["max-age"])
+    return None
+
+
+def _no_store(headers) -> bool:
+    return "no-store" in headers.get("Cache-Control", "").lower()
+
+
+class CachedEntry:
+    """Een bewaard antwoord uit de cache"""
+
+    def __init__(self, row: sqlite3.Row, ttl: float):
+        self.url = row["url"]
+        self.headers = json.loads(row["headers"])
+        self.body = row["body"]
+        self.etag = row["etag"]
+        self.last_modified = row["last_modified"]
+        # max-age van de server gaat voor de ttl van de cache
+        max_age = row["max_age"] if row["max_age"] is not None else ttl
+        self.fresh_until = row["stored"] + max_age
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.fresh_until
+
+    def validators(self) -> dict:
+        """headers voor een conditioneel request"""
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def to_response(self, request: requests.PreparedRequest) -> requests.Response:
+        """het bewaarde antwoord als `requests.Response`"""
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.body
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.from_cache = True
+        return response
+
+
+class HttpCache:
+    """Persistente http cache in een SQLite bestand, veilig te gebruiken vanuit meerdere threads"""
+
+    def __init__(
+        self,
+        path: Path,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+            self._total = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()[0]
+            self._evict()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    @staticmethod
+    def cacheable(request: requests.PreparedRequest) -> bool:
+        """alleen GET requests naar de alleen-lezen endpoints"""
+        if request.method != "GET" or request.headers.get("Range"):
+            return False
+        path = urlsplit(request.url).path
+        return any(pattern.match(path) for pattern in CACHEABLE_PATHS)
+
+    def lookup(self, url: str) -> Optional[CachedEntry]:
+        """het bewaarde antwoord voor `url`, of None"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self._connection:
+                self._connection.execute(
+                    "UPDATE responses SET last_used = ? WHERE url = ?",
+                    (time.time(), url),
+                )
+        return CachedEntry(row, self.ttl)
+
+    def store(self, url: str, response: requests.Response) -> None:
+        """bewaar een 200 antwoord, tenzij de server no-store aangeeft"""
+        if _no_store(response.headers):
+            self.forget(url)
+            return
+        body = response.content
+        headers = {
+            key: value
+            for key, value in response.headers.items()
+            # de body wordt onverpakt bewaard
+            if key.lower()
+            not in ("content-encoding", "transfer-encoding", "connection")
+        }
+        headers["Content-Length"] = str(len(body))
+        now = time.time()
+        with self._lock, self._connection:
+            self._delete(url)
+            self._connection.execute(
+                "INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    json.dumps(headers),
+                    body,
+                    len(body),
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    now,
+                    _max_age(response.headers),
+                    now,
+                ),
+            )
+            self._total += len(body)
+            self._evict()
+
+    def revalidated(self, url: str, response: requests.Response) -> None:
+        """het bewaarde antwoord is nog geldig (304), opnieuw vers vanaf nu
+
+        Validators en Cache-Control uit de 304 vervangen de bewaarde waarden.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT headers FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return
+            headers = json.loads(row["headers"])
+            for key in ("ETag", "Last-Modified", "Cache-Control", "Expires"):
+                if key in response.headers:
+                    headers[key] = response.headers[key]
+            self._connection.execute(
+                "UPDATE responses SET headers = ?, stored = ?, max_age = ?, last_used = ?, "
+                "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) "
+                "WHERE url = ?",
+                (
+                    json.dumps(headers),
+                    now,
+                    _max_age(response.headers),
+                    now,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    url,
+                ),
+            )
+
+    def forget(self, url: str) -> None:
+        with self._lock, self._connection:
+            self._delete(url)
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
+            self._total = 0
+
+    def size(self) -> int:
+        """totale grootte van de bewaarde bodies in bytes"""
+        with self._lock:
+            return self._total
+
+    def _delete(self, url: str) -> None:
+        # eerst de grootte opvragen: DELETE ... RETURNING vraagt SQLite 3.35 of nieuwer
+        row = self._connection.execute(
+            "SELECT size FROM responses WHERE url = ?", (url,)
+        ).fetchone()
+        if row is not None:
+            self._connection.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self._total -= row["size"]
+
+    def _evict(self) -> None:
+        """verwijder de langst niet gebruikte antwoorden tot de cache weer onder `max_bytes` is"""
+        if self._total <= self.max_bytes:
+            return
+        for row in self._connection.execute(
+            "SELECT url FROM responses ORDER BY last_used"
+        ).fetchall():
+            if self._total <= self.max_bytes:
+                break
+            self._delete(row["url"])
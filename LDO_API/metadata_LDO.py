@@ -0,0 +1,181 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Kolomgeoriënteerde (parquet) opslag van de scenario metadata naast het archief.
+
+De metadata staat in een map met parquet bestanden (parts), met de scenario id in de kolom `scenario_id`.
+Een update schrijft een nieuwe part en herschrijft alleen de parts met verwijderde of vervangen scenarios,
+vergelijken leest alleen de id kolom. Excel is alleen nog een export formaat, zie `exporteer_metadata_excel`.
+"""
+
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+ID_COLUMN = "scenario_id"
+# naam van de index in de oorspronkelijke excel (bijvoorbeeld "Scenario ID"), bewaard in de parquet metadata
+_INDEX_NAME_KEY = b"ldo_index_name"
+# kolommen met getallen en tekst door elkaar, per waarde als json opgeslagen (zie `_schrijf_part`)
+_JSON_COLUMNS_KEY = b"ldo_json_columns"
+
+
+def metadata_sidecar(archive: Path) -> Path:
+    """map met de metadata bij een archief: `<naam>.metadata/` naast een zip, of `metadata/` in een gesharde archief"""
+    archive = Path(archive)
+    if archive.is_dir():
+        return archive / "metadata"
+    return archive.with_suffix(".metadata")
+
+
+def _parts(sidecar: Path) -> list:
+    return sorted(sidecar.glob("*.parquet"))
+
+
+def _naar_json(value) -> "Optional[str]":
+    import pandas as pd
+
+    return None if pd.isna(value) else json.dumps(value, default=str)
+
+
+def _van_json(value):
+    import pandas as pd
+
+    return None if pd.isna(value) else json.loads(value)
+
+
+def _schrijf_part(df: "pd.DataFrame", fname: Path) -> None:
+    """schrijf metadata (met scenario id als index) atomair naar een parquet bestand
+
+    Excel kolommen kunnen getallen en tekst door elkaar bevatten, parquet niet: zo'n kolom wordt per waarde als
+    json opgeslagen en bij het lezen (`_lees_part`) teruggezet, zodat een getal een getal blijft.
+    Andere waarden dan getallen, tekst en bool (bijvoorbeeld een datum tussen tekst) komen als tekst terug.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    index_name = ID_COLUMN if df.index.name is None else str(df.index.name)
+    df = df.rename_axis(ID_COLUMN).reset_index()
+    json_columns = []
+    for column in df.columns:
+        if not pd.api.types.is_object_dtype(df[column]):
+            continue
+        try:
+            pa.array(df[column])
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[column] = df[column].map(_naar_json).astype("string")
+            json_columns.append(str(column))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            _INDEX_NAME_KEY: index_name.encode(),
+            _JSON_COLUMNS_KEY: json.dumps(json_columns).encode(),
+        }
+    )
+    temp_file = fname.with_name(fname.name + ".tmp")
+    pq.write_table(table, temp_file)
+    os.replace(temp_file, fname)
+
+
+def _lees_part(part: Path) -> "pd.DataFrame":
+    """lees een part in met de scenario id als index, met de oorspronkelijke naam van de index"""
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(part)
+    schema_metadata = table.schema.metadata or {}
+    index_name = schema_metadata.get(_INDEX_NAME_KEY)
+    df = table.to_pandas().set_index(ID_COLUMN)
+    for column in json.loads(schema_metadata.get(_JSON_COLUMNS_KEY, b"[]")):
+        df[column] = df[column].astype(object).map(_van_json)
+    df.index.name = ID_COLUMN if index_name is None else index_name.decode()
+    return df
+
+
+def _nieuwe_part_naam(sidecar: Path) -> Path:
+    import pandas as pd
+
+    return (
+        sidecar
+        / f"part-{pd.Timestamp.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+    )
+
+
+def _lees_ids_part(part: Path) -> list:
+    import pyarrow.parquet as pq
+
+    return pq.read_table(part, columns=[ID_COLUMN]).column(0).to_pylist()
+
+
+def maak_metadata_sidecar(df_metadata: "pd.DataFrame", sidecar: Path) -> None:
+    """Maak een nieuwe metadata map aan met de gegeven metadata (index = scenario id)"""
+    sidecar.mkdir(parents=True, exist_ok=True)
+    for part in _parts(sidecar):
+        part.unlink()
+    _schrijf_part(df_metadata, _nieuwe_part_naam(sidecar))
+
+
+def lees_metadata_ids(sidecar: Path) -> "pd.Index":
+    """Lees alleen de scenario ids uit de metadata"""
+    import pandas as pd
+
+    ids = []
+    for part in _parts(sidecar):
+        ids += _lees_ids_part(part)
+    return pd.Index(ids, name=ID_COLUMN)
+
+
+def lees_metadata(sidecar: Path) -> "pd.DataFrame":
+    """Lees de volledige metadata in, met de scenario id als index"""
+    import pandas as pd
+
+    dfs = [_lees_part(part) for part in _parts(sidecar)]
+    if len(dfs) == 0:
+        return pd.DataFrame(index=pd.Index([], name=ID_COLUMN))
+    return pd.concat(dfs, axis=0)
+
+
+def voeg_metadata_toe(
+    sidecar: Path, df_new_scenarios: "pd.DataFrame", verwijderde_scenarios: list
+) -> None:
+    """
+    Voeg de metadata van nieuwe scenarios toe als nieuwe part en haal verwijderde scenarios weg.
+    Alleen parts met verwijderde of opnieuw toegevoegde scenarios worden herschreven.
+    """
+    sidecar.mkdir(parents=True, exist_ok=True)
+    te_verwijderen = set(verwijderde_scenarios) | set(df_new_scenarios.index)
+    for part in _parts(sidecar):
+        if te_verwijderen.isdisjoint(_lees_ids_part(part)):
+            continue
+        df_part = _lees_part(part)
+        df_part = df_part[~df_part.index.isin(te_verwijderen)]
+        if len(df_part) == 0:
+            part.unlink()
+        else:
+            _schrijf_part(df_part, part)
+    if len(df_new_scenarios) > 0:
+        _schrijf_part(df_new_scenarios, _nieuwe_part_naam(sidecar))
+
+
+def compacteer_metadata(sidecar: Path) -> None:
+    """Voeg alle parts samen tot één bestand, handig na veel kleine updates"""
+    parts = _parts(sidecar)
+    if len(parts) <= 1:
+        return
+    df_metadata = lees_metadata(sidecar)
+    new_part = _nieuwe_part_naam(sidecar)
+    _schrijf_part(df_metadata, new_part)
+    for part in parts:
+        part.unlink()
+
+
+def exporteer_metadata_excel(sidecar: Path, fname: Path) -> None:
+    """Schrijf de metadata weg als excel"""
+    lees_metadata(sidecar).sort_index().to_excel(fname)
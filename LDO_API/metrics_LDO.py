@@ -0,0 +1,278 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Meten van alle http requests via `export_LDO._session`: aantal, statussen, retries, fouten, cache hits, latency en
+bytes per endpoint. De meetwaarden komen in `metrics` (wordt gevuld door `RateLimitedAdapter` en `stream_response`) en kunnen
+aan het einde van een run worden weggeschreven als json en in het Prometheus text-file formaat:
+
+```python
+from LDO_API.metrics_LDO import metrics
+metrics.write_report(Path("ldo_run_report.json"), Path("ldo_run_report.prom"))
+```
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def endpoint_name(method: str, url: str) -> str:
+    """naam van het endpoint, met ids en bestandsnamen vervangen zodat gelijke calls samen worden geteld"""
+    parts = urlsplit(url)
+    if not parts.path.startswith(("/api/", "/auth/")):
+        # gesigneerde download urls (object storage) per host
+        return f"{method} {parts.netloc} (download)"
+    segments = []
+    for segment in parts.path.rstrip("/").split("/"):
+        if segment.isdigit():
+            segment = "{id}"
+        elif "." in segment:
+            segment = "{name}"
+        segments.append(segment)
+    return f"{method} {'/'.join(segments)}"
+
+
+def _quantile(sorted_values: list, q: float) -> Optional[float]:
+    if len(sorted_values) == 0:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class _Endpoint:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0  # verbindingsfouten en statussen >= 400
+        self.retries = 0
+        self.status = {}
+        self.latencies = []
+        self.bytes = 0
+        self.transfer_bytes = 0
+        self.transfer_seconds = 0.0
+        self.cache_hits = 0
+
+
+class HttpMetrics:
+    """Verzamelt meetwaarden per endpoint, veilig te gebruiken vanuit meerdere threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints = {}
+            self._started = time.time()
+
+    def _endpoint(self, method: str, url: str) -> _Endpoint:
+        name = endpoint_name(method, url)
+        if name not in self._endpoints:
+            self._endpoints[name] = _Endpoint()
+        return self._endpoints[name]
+
+    def record(
+        self, method: str, url: str, response, seconds: float, retried: bool = False
+    ) -> None:
+        """leg één poging vast, `retried` als deze poging zelf een herhaling is"""
+        # retries binnen urllib3 (500, 502, 504) staan in de geschiedenis van de response
+        history = getattr(getattr(response.raw, "retries", None), "history", ())
+        content_length = response.headers.get("Content-Length", "")
+        with self._lock:
+            endpoint = self._endpoint(method, url)
+            endpoint.requests += 1
+            endpoint.retries += int(retried) + len(history)
+            key = str(response.status_code)
+            endpoint.status[key] = endpoint.status.get(key, 0) + 1
+            endpoint.errors += int(response.status_code >= 400)
+            endpoint.latencies.append(seconds)
+            endpoint.bytes += int(content_length) if content_length.isdigit() else 0
+
+    def record_error(
+        self, method: str, url: str, seconds: float, retried: bool = False
+    ) -> None:
+        """leg een poging vast die zonder response eindigde (verbindingsfout, timeout)"""
+        with self._lock:
+            endpoint = self._endpoint(method, url)
+            endpoint.requests += 1
+            endpoint.retries += int(retried)
+            endpoint.status["error"] = endpoint.status.get("error", 0) + 1
+            endpoint.errors += 1
+            endpoint.latencies.append(seconds)
+
+    def record_cache_hit(self, method: str, url: str) -> None:
+        """leg een antwoord vast dat zonder request uit de http cache kwam"""
+        with self._lock:
+            self._endpoint(method, url).cache_hits += 1
+
+    def record_transfer(self, method: str, url: str, n: int, seconds: float) -> None:
+        """leg het streamen van een body vast, voor de doorvoer"""
+        with self._lock:
+            endpoint = self._endpoint(method, url)
+            endpoint.transfer_bytes += n
+            endpoint.transfer_seconds += seconds
+
+    def report(self) -> dict:
+        """meetwaarden per endpoint en in totaal"""
+        with self._lock:
+            endpoints = {}
+            for name, e in sorted(self._endpoints.items()):
+                latencies = sorted(e.latencies)
+                endpoints[name] = {
+                    "requests": e.requests,
+                    "errors": e.errors,
+                    "error_rate": e.errors / e.requests if e.requests else 0.0,
+                    "retries": e.retries,
+                    "cache_hits": e.cache_hits,
+                    "status": dict(e.status),
+                    "latency_s": {
+                        **{
+                            f"p{int(q * 100)}": _quantile(latencies, q)
+                            for q in QUANTILES
+                        },
+                        "mean": sum(latencies) / len(latencies) if latencies else None,
+                        "max": latencies[-1] if latencies else None,
+                        "sum": sum(latencies),
+                    },
+                    "bytes": max(e.bytes, e.transfer_bytes),
+                    "mb_per_s": e.transfer_bytes / 1e6 / e.transfer_seconds
+                    if e.transfer_seconds > 0
+                    else None,
+                }
+            duration = time.time() - self._started
+            started = datetime.fromtimestamp(self._started).isoformat(
+                timespec="seconds"
+            )
+        totals = {
+            key: sum(e[key] for e in endpoints.values())
+            for key in ("requests", "errors", "retries", "cache_hits", "bytes")
+        }
+        return {
+            "started": started,
+            "duration_s": duration,
+            "totals": totals,
+            "endpoints": endpoints,
+        }
+
+    def to_prometheus(self, report: Optional[dict] = None) -> str:
+        """meetwaarden in het Prometheus text-file formaat (voor de node_exporter textfile collector)"""
+        report = report or self.report()
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: list) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_text = ",".join(
+                    f'{key}="{_escape(str(val))}"' for key, val in labels.items()
+                )
+                if label_text:
+                    lines.append(f"{name}{{{label_text}}} {value}")
+                else:
+                    lines.append(f"{name} {value}")
+
+        endpoints = report["endpoints"].items()
+        metric(
+            "ldo_http_requests_total",
+            "counter",
+            "Aantal http requests naar het LDO per endpoint en status",
+            [
+                ({"endpoint": name, "status": status}, count)
+                for name, e in endpoints
+                for status, count in e["status"].items()
+            ],
+        )
+        metric(
+            "ldo_http_retries_total",
+            "counter",
+            "Aantal herhaalde requests per endpoint",
+            [({"endpoint": name}, e["retries"]) for name, e in endpoints],
+        )
+        metric(
+            "ldo_http_cache_hits_total",
+            "counter",
+            "Aantal antwoorden uit de http cache (zonder request) per endpoint",
+            [({"endpoint": name}, e["cache_hits"]) for name, e in endpoints],
+        )
+        metric(
+            "ldo_http_errors_total",
+            "counter",
+            "Aantal mislukte requests (verbindingsfout of status >= 400) per endpoint",
+            [({"endpoint": name}, e["errors"]) for name, e in endpoints],
+        )
+        metric(
+            "ldo_http_request_duration_seconds",
+            "summary",
+            "Tijd tot de response headers per endpoint",
+            [
+                (
+                    {"endpoint": name, "quantile": str(q)},
+                    e["latency_s"][f"p{int(q * 100)}"],
+                )
+                for name, e in endpoints
+                for q in QUANTILES
+            ],
+        )
+        for name, e in endpoints:
+            labels = f'endpoint="{_escape(name)}"'
+            lines.append(
+                f"ldo_http_request_duration_seconds_sum{{{labels}}} {e['latency_s']['sum']}"
+            )
+            lines.append(
+                f"ldo_http_request_duration_seconds_count{{{labels}}} {e['requests']}"
+            )
+        metric(
+            "ldo_http_response_bytes_total",
+            "counter",
+            "Aantal ontvangen bytes per endpoint",
+            [({"endpoint": name}, e["bytes"]) for name, e in endpoints],
+        )
+        metric(
+            "ldo_http_transfer_megabytes_per_second",
+            "gauge",
+            "Gemiddelde doorvoer bij het streamen van downloads per endpoint",
+            [({"endpoint": name}, e["mb_per_s"]) for name, e in endpoints],
+        )
+        metric(
+            "ldo_run_duration_seconds",
+            "gauge",
+            "Duur van de run",
+            [({}, report["duration_s"])],
+        )
+        return "\n".join(lines) + "\n"
+
+    def write_report(
+        self, json_file: Optional[Path] = None, prom_file: Optional[Path] = None
+    ) -> dict:
+        """schrijf het rapport als json en/of Prometheus text-file (atomair), geeft het rapport terug"""
+        report = self.report()
+        if json_file is not None:
+            _write_atomic(Path(json_file), json.dumps(report, indent=2))
+        if prom_file is not None:
+            _write_atomic(Path(prom_file), self.to_prometheus(report))
+        return report
+
+
+def _escape(value: str) -> str:
+    return re.sub(r'(["\\])', r"\\\1", value).replace("\n", "\\n")
+
+
+def _write_atomic(fname: Path, text: str) -> None:
+    temp_file = fname.with_name(fname.name + ".tmp")
+    temp_file.write_text(text, encoding="utf-8")
+    os.replace(temp_file, fname)
+
+
+# gedeelde meetwaarden van `export_LDO._session`
+metrics = HttpMetrics()
@@ -0,0 +1,130 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Twee-traps pipeline voor downloads: een paar threads vragen de (gesigneerde) download urls op bij de API en zetten
+deze in een begrensde wachtrij, waaruit de transfer threads downloaden. Het opvragen van de volgende urls loopt zo
+door tijdens de lopende downloads, en de wachtrij houdt de urls vers: er liggen er nooit meer dan `queue_size` klaar.
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator
+
+from LDO_API.tracing_LDO import submit
+
+_STOP = object()
+
+
+class ResolveTransferPipeline:
+    """Pipeline van `resolve(*args)` naar `transfer(*args, resolved)`, met per taak één resultaat
+
+    `resolve` geeft de opgevraagde waarde (bijvoorbeeld (status_code, url)) terug, of een `Done(resultaat)` als de
+    taak zonder transfer klaar is (al gedownload, url niet beschikbaar). `transfer` geeft het resultaat van de taak.
+
+    ```python
+    with ResolveTransferPipeline(resolve, transfer) as pipeline:
+        for args in taken:
+            pipeline.submit(*args)
+        for resultaat in pipeline.results():
+            ...
+    ```
+    """
+
+    def __init__(
+        self,
+        resolve: Callable,
+        transfer: Callable,
+        resolve_workers: int = 4,
+        transfer_workers: int = 8,
+        queue_size: int = 16,
+    ):
+        self.resolve = resolve
+        self.transfer = transfer
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._results = queue.Queue()
+        self._stop = threading.Event()
+        self._submitted = 0
+        self._transfer_workers = transfer_workers
+        self._resolvers = ThreadPoolExecutor(max_workers=resolve_workers)
+        self._transfers = ThreadPoolExecutor(max_workers=transfer_workers)
+        for _ in range(transfer_workers):
+            submit(self._transfers, self._transfer_worker)
+
+    def __len__(self) -> int:
+        """aantal aangeboden taken"""
+        return self._submitted
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(cancel=exc_type is not None)
+
+    def submit(self, *args) -> None:
+        """bied een taak aan, het opvragen begint direct"""
+        self._submitted += 1
+        submit(self._resolvers, self._resolve_worker, args)
+
+    def results(self) -> Iterator:
+        """de resultaten van alle aangeboden taken, in de volgorde waarin ze klaar zijn"""
+        for _ in range(self._submitted):
+            result = self._results.get()
+            if isinstance(result, BaseException):
+                raise result
+            yield result
+
+    def close(self, cancel: bool = False) -> None:
+        """stop de threads, met `cancel` worden taken die nog niet gestart zijn overgeslagen"""
+        if cancel:
+            self._stop.set()
+        self._resolvers.shutdown(wait=True, cancel_futures=cancel)
+        for _ in range(self._transfer_workers):
+            self._put(_STOP, force=True)
+        self._transfers.shutdown(wait=True)
+
+    def _put(self, item, force: bool = False) -> bool:
+        """zet een item in de wachtrij, wacht zolang deze vol is (tenzij de pipeline wordt gestopt)"""
+        while True:
+            if self._stop.is_set() and not force:
+                return False
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+
+    def _resolve_worker(self, args: tuple) -> None:
+        if self._stop.is_set():
+            return
+        try:
+            resolved = self.resolve(*args)
+        except BaseException as e:
+            self._results.put(e)
+            return
+        if isinstance(resolved, Done):
+            self._results.put(resolved.result)
+        else:
+            self._put((args, resolved))
+
+    def _transfer_worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if self._stop.is_set():
+                continue
+            args, resolved = item
+            try:
+                self._results.put(self.transfer(*args, resolved))
+            except BaseException as e:
+                self._results.put(e)
+
+
+class Done:
+    """resultaat van een taak die al bij het opvragen klaar is"""
+
+    def __init__(self, result):
+        self.result = result
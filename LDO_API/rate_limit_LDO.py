@@ -0,0 +1,208 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Adaptieve begrenzing van het verkeer naar de server (AIMD), voor alle requests via `export_LDO._session`.
+
+Per host mogen maximaal `limit` requests tegelijk lopen. Zolang de server gezond antwoordt groeit de limiet
+langzaam (additive increase), bij een 429 of 503 wordt deze gehalveerd (multiplicative decrease) en wordt het
+request opnieuw geprobeerd. Een `Retry-After` header pauzeert alle requests naar die host tot het opgegeven moment.
+Alleen idempotente requests worden automatisch herhaald: een POST (bijvoorbeeld een nieuwe bulk-export) alleen bij
+een 429 met Retry-After, dan heeft de server het request niet uitgevoerd. Anders kan een herhaling een dubbele export
+aanmaken.
+"""
+
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+from LDO_API.metrics_LDO import HttpMetrics, metrics
+
+logger = logging.getLogger(__name__)
+
+# statussen waarmee de server aangeeft dat het te druk is
+OVERLOAD_STATUS = (429, 503)
+# methodes die zonder bijwerkingen herhaald kunnen worden
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """aantal seconden uit een Retry-After header (seconden of een http datum), of None"""
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """AIMD begrenzing van het aantal gelijktijdige requests, veilig te delen tussen threads"""
+
+    def __init__(
+        self,
+        initial: float = 8,
+        minimum: float = 1,
+        maximum: float = 32,
+        decrease: float = 0.5,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._issued = 0  # volgnummer van het laatst gestarte request
+        self._last_decrease = 0  # volgnummer bij de laatste verlaging
+        self._condition = threading.Condition()
+
+    def acquire(self) -> int:
+        """wacht tot er ruimte is voor een request, geeft het volgnummer terug voor `release`"""
+        with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause <= 0 and self._in_flight < int(self.limit):
+                    break
+                self._condition.wait(timeout=pause if pause > 0 else None)
+            self._in_flight += 1
+            self._issued += 1
+            return self._issued
+
+    def release(
+        self,
+        ticket: int,
+        overloaded: Optional[bool],
+        retry_after: Optional[float] = None,
+    ) -> None:
+        """geef de ruimte vrij; `overloaded=None` (bijvoorbeeld een verbindingsfout) laat de limiet ongemoeid
+
+        Alleen requests die na de laatste verlaging zijn gestart verlagen de limiet opnieuw (één keer per venster),
+        antwoorden op requests die daarvoor al liepen gaan nog over de oude limiet.
+        Een `retry_after` verlengt de pauze altijd, ook binnen het venster.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if overloaded:
+                if retry_after is not None:
+                    self._paused_until = max(
+                        self._paused_until, time.monotonic() + retry_after
+                    )
+                if ticket > self._last_decrease:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_decrease = self._issued
+                    logger.info(f"Server overbelast, limiet naar {self.limit:.1f}")
+            elif overloaded is not None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+def _herhaalbaar(method: str, status_code: int, retry_after: Optional[float]) -> bool:
+    """mag een request met deze overbelast status opnieuw worden verstuurd, zie de module docstring"""
+    if method.upper() in IDEMPOTENT_METHODS:
+        return True
+    return status_code == 429 and retry_after is not None
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """HTTPAdapter met een `AdaptiveLimiter` per host en retries bij 429/503 (met Retry-After)
+
+    Elke poging wordt vastgelegd in `metrics` (zie `LDO_API.metrics_LDO`). Met een `cache` (zie
+    `LDO_API.http_cache_LDO`) komen verse antwoorden van de alleen-lezen endpoints uit de cache en worden
+    verlopen antwoorden conditioneel opgevraagd.
+    """
+
+    def __init__(
+        self,
+        *args,
+        max_attempts: int = 5,
+        backoff_factor: float = 1,
+        initial_limit: float = 8,
+        metrics: HttpMetrics = metrics,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.initial_limit = initial_limit
+        self.cache = None
+        self._limiters = {}
+        self._limiters_lock = threading.Lock()
+
+    def limiter(self, url: str) -> AdaptiveLimiter:
+        """de begrenzing voor de host van `url`"""
+        host = urlsplit(url).netloc
+        with self._limiters_lock:
+            if host not in self._limiters:
+                self._limiters[host] = AdaptiveLimiter(
+                    initial=min(self.initial_limit, self._pool_maxsize),
+                    maximum=self._pool_maxsize,
+                )
+            return self._limiters[host]
+
+    def send(self, request, **kwargs):
+        cache = self.cache
+        if cache is None or not cache.cacheable(request):
+            return self._send_limited(request, **kwargs)
+        entry = cache.lookup(request.url)
+        if entry is not None and entry.fresh:
+            self.metrics.record_cache_hit(request.method, request.url)
+            return entry.to_response(request)
+        if entry is not None:
+            request = request.copy()
+            request.headers.update(entry.validators())
+        response = self._send_limited(request, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            cache.revalidated(request.url, response)
+            response.close()
+            return entry.to_response(request)
+        if response.status_code == 200:
+            cache.store(request.url, response)
+        return response
+
+    def _send_limited(self, request, **kwargs):
+        limiter = self.limiter(request.url)
+        for attempt in range(1, self.max_attempts + 1):
+            ticket = limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = super().send(request, **kwargs)
+            except BaseException:
+                limiter.release(ticket, None)
+                self.metrics.record_error(
+                    request.method,
+                    request.url,
+                    time.perf_counter() - start,
+                    retried=attempt > 1,
+                )
+                raise
+            self.metrics.record(
+                request.method,
+                request.url,
+                response,
+                time.perf_counter() - start,
+                retried=attempt > 1,
+            )
+            overloaded = response.status_code in OVERLOAD_STATUS
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            limiter.release(ticket, overloaded, retry_after if overloaded else None)
+            if (
+                not overloaded
+                or attempt == self.max_attempts
+                or not _herhaalbaar(request.method, response.status_code, retry_after)
+            ):
+                return response
+            response.close()
+            # met Retry-After wacht acquire op de pauze, anders exponentieel terugvallen
+            if retry_after is None:
+                time.sleep(self.backoff_factor * 2 ** (attempt - 1))
+        return response
@@ -0,0 +1,169 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Gedeeld beheer van de access token voor het LDO.
+
+`haal_token_op` geeft een `TokenManager` terug die overal als `headers` kan worden meegegeven (het is een Mapping).
+Bij elk request wordt de huidige token ingevuld, deze wordt kort voor het verlopen vernieuwd en ook direct als de
+server met 401 antwoordt (het request wordt dan één keer opnieuw verstuurd). Lange runs hoeven dus niet opnieuw
+te worden gestart, en zolang de token geldig is wordt er niet opnieuw aangemeld.
+"""
+
+import base64
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Iterator, Optional
+
+from LDO_API import export_LDO
+
+logger = logging.getLogger(__name__)
+
+# zo lang voor het verlopen wordt de token al vernieuwd
+REFRESH_MARGIN = 60
+# levensduur als de token geen (leesbare) verloopdatum heeft
+DEFAULT_LIFETIME = 5 * 60
+# zoveel vervangen tokens blijven herkenbaar, voor requests die nog met een oude token onderweg waren
+MAX_RETIRED_TOKENS = 64
+
+
+def token_expiry(token: str) -> Optional[float]:
+    """verloopdatum (unix tijd) uit de `exp` claim van een JWT, of None als deze niet te lezen is"""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenManager(Mapping):
+    """Headers met een access token die automatisch wordt vernieuwd, veilig te delen tussen threads"""
+
+    # managers per Authorization header (ook van vervangen tokens), voor het vernieuwen bij een 401
+    _by_header = OrderedDict()
+    _registry_lock = threading.Lock()
+
+    def __init__(self, api_key: str, tenant: int):
+        self.api_key = api_key
+        self.tenant = tenant
+        self._lock = threading.Lock()
+        self._token = None
+        self._refresh_at = 0.0
+        _install_hook()
+
+    def _fetch(self) -> None:
+        """vraag een nieuwe token aan bij het LDO"""
+        response = export_LDO._session.post(
+            url=f"{export_LDO.server}/auth/v1/token/",
+            headers={"accept": "application/json", "Content-Type": "application/json"},
+            json={"tenant": self.tenant},
+            auth=("__key__", self.api_key),
+        )
+        try:
+            token = response.json()["access"]
+        except (KeyError, ValueError):
+            res_error = response.text
+            if (
+                '"tenant"' in res_error
+                and "Invalid pk" in res_error
+                and "object does not exist." in res_error
+            ):
+                logger.error(f"Invalid tenant {self.tenant} for the provided API key.")
+                raise UserWarning(
+                    f"Invalid tenant {self.tenant} for the provided API key, adjust the TENANT variable accordingly."
+                )
+            logger.error(f"Failed to retrieve access token: {res_error}")
+            raise UserWarning(f"Failed to retrieve access token: {res_error}")
+        now = time.time()
+        lifetime = (token_expiry(token) or now + DEFAULT_LIFETIME) - now
+        # vernieuw ruim voor het verlopen, bij een korte levensduur halverwege
+        refresh_at = now + lifetime - min(REFRESH_MARGIN, lifetime / 2)
+        with self._registry_lock:
+            # de oude token blijft gekoppeld: een request dat daarmee al onderweg was kan nog een 401 krijgen
+            self._by_header[f"Bearer {token}"] = self
+            while len(self._by_header) > MAX_RETIRED_TOKENS:
+                self._by_header.popitem(last=False)
+        self._token, self._refresh_at = token, refresh_at
+
+    def token(self) -> str:
+        """geldige access token, wordt vernieuwd als deze (bijna) verlopen is"""
+        if self._token is None or time.time() > self._refresh_at:
+            with self._lock:
+                # een andere thread kan de token al hebben vernieuwd
+                if self._token is None or time.time() > self._refresh_at:
+                    self._fetch()
+        return self._token
+
+    def invalidate(self, authorization: str) -> None:
+        """markeer de token als ongeldig (na een 401), tenzij deze al is vervangen"""
+        with self._lock:
+            if authorization == f"Bearer {self._token}":
+                self._refresh_at = 0.0
+
+    @classmethod
+    def for_header(cls, authorization: Optional[str]) -> Optional["TokenManager"]:
+        with cls._registry_lock:
+            return cls._by_header.get(authorization)
+
+    # Mapping: te gebruiken als headers dict
+    def __getitem__(self, key: str) -> str:
+        if key == "Authorization":
+            return f"Bearer {self.token()}"
+        return {"accept": "application/json", "Content-Type": "application/json"}[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(("accept", "Content-Type", "Authorization"))
+
+    def __len__(self) -> int:
+        return 3
+
+
+def _refresh_on_401(response, *args, **kwargs):
+    """response hook: vernieuw een verlopen token en verstuur het request één keer opnieuw met de huidige token
+
+    Ook een 401 op een request met een al vervangen token wordt opnieuw verstuurd, de token wordt dan niet
+    nogmaals vernieuwd (zie `TokenManager.invalidate`).
+    """
+    if response.status_code != 401:
+        return response
+    authorization = response.request.headers.get("Authorization")
+    manager = TokenManager.for_header(authorization)
+    if manager is None:
+        return response
+    manager.invalidate(authorization)
+    request = response.request.copy()
+    request.headers["Authorization"] = manager["Authorization"]
+    _drain(response)
+    new_response = response.connection.send(request, **kwargs)
+    new_response.history.append(response)
+    new_response.request = request
+    return new_response
+
+
+def _drain(response) -> None:
+    """lees de (korte) body van een foutmelding zodat de verbinding terug kan naar de pool"""
+    try:
+        for _ in response.iter_content(chunk_size=64 * 1024):
+            pass
+    except (ConnectionError, OSError, ValueError):
+        pass
+    response.close()
+
+
+def _install_hook() -> None:
+    hooks = export_LDO._session.hooks["response"]
+    if _refresh_on_401 not in hooks:
+        hooks.append(_refresh_on_401)
+
+
+def haal_token_op(api_key: str, tenant: int) -> TokenManager:
+    """Haal de access token op voor het LDO gegeven de api key, te gebruiken als headers"""
+    headers = TokenManager(api_key, tenant)
+    headers.token()  # direct aanmelden, zodat een verkeerde api key meteen opvalt
+    return headers
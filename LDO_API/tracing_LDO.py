@@ -0,0 +1,278 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Tijdmeting (spans) van de stappen van de pipelines en van elk item daarin, zodat te zien is of een trage run door
+het ophalen van de scenarios, de download urls, de downloads zelf of het archiveren komt.
+
+Spans gaan naar een of meer sinks: `LogSink` (logging), `JsonLinesSink` (een json regel per span, met OpenTelemetry
+veldnamen) of `OpenTelemetrySink` (via de `opentelemetry` package, als die is geïnstalleerd).
+Per stap kan optioneel cProfile en/of tracemalloc aan worden gezet. Instellen in code of met omgevingsvariabelen:
+
+- `LDO_TRACE=log`, `LDO_TRACE=jsonl:trace.jsonl` of `LDO_TRACE=otel` (meerdere gescheiden door `,`)
+- `LDO_PROFILE=export_uit_LDO_custom,get_all_metadata` met de profielen in `LDO_PROFILE_DIR` (standaard `.`)
+- `LDO_TRACEMALLOC=export_uit_LDO_custom`
+"""
+
+import contextvars
+import cProfile
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar("ldo_current_span", default=None)
+
+
+class Span:
+    """Een afgeronde of lopende stap, met de tijden in nanoseconden (unix tijd)"""
+
+    def __init__(
+        self, name: str, kind: str, parent: Optional["Span"], attributes: dict
+    ):
+        self.name = name
+        self.kind = kind  # "stage" of "item"
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    @property
+    def seconds(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def set(self, **attributes) -> None:
+        """voeg attributen toe, bijvoorbeeld het aantal bytes"""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        """span met de veldnamen van OpenTelemetry (OTLP json)"""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationSeconds": self.seconds,
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error}
+            if self.error
+            else {"code": "OK"},
+        }
+
+
+class LogSink:
+    """schrijf spans naar de logging, stappen op INFO en items op DEBUG"""
+
+    def __init__(self, log: logging.Logger = logger):
+        self.log = log
+
+    def export(self, span: Span) -> None:
+        level = logging.INFO if span.kind == "stage" else logging.DEBUG
+        if self.log.isEnabledFor(level):
+            status = f" error={span.error}" if span.error else ""
+            self.log.log(
+                level, f"{span.name} {span.seconds:.3f} s {span.attributes}{status}"
+            )
+
+    def close(self) -> None:
+        pass
+
+
+class JsonLinesSink:
+    """schrijf elke span als json regel naar een bestand"""
+
+    def __init__(self, fname: Path):
+        self.fname = Path(fname)
+        self._lock = threading.Lock()
+        self._file = open(self.fname, "a", encoding="utf-8")
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class OpenTelemetrySink:
+    """geef spans door aan OpenTelemetry, vereist de `opentelemetry-api` package en een geconfigureerde exporter"""
+
+    def __init__(self, tracer=None):
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise UserWarning(
+                "OpenTelemetrySink vereist de package opentelemetry-api (pip install opentelemetry-sdk)"
+            )
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer("LDO_API")
+        self._contexts = {}  # span_id: otel span context, voor de parent relatie
+
+    def export(self, span: Span) -> None:
+        parent = self._contexts.get(span.parent_id)
+        context = (
+            self._trace.set_span_in_context(self._trace.NonRecordingSpan(parent))
+            if parent is not None
+            else None
+        )
+        otel_span = self.tracer.start_span(
+            span.name,
+            context=context,
+            start_time=span.start_ns,
+            attributes={
+                key: value if isinstance(value, (str, int, float, bool)) else str(value)
+                for key, value in span.attributes.items()
+            },
+        )
+        if span.error:
+            otel_span.set_status(
+                self._trace.Status(self._trace.StatusCode.ERROR, span.error)
+            )
+        otel_span.end(end_time=span.end_ns)
+        # stappen eindigen na hun items, dus de context wordt alleen voor latere spans bewaard
+        self._contexts[span.span_id] = otel_span.get_span_context()
+
+    def close(self) -> None:
+        self._contexts.clear()
+
+
+class Tracer:
+    """Maakt spans en stuurt ze naar de sinks, zonder sinks wordt alleen de tijd gemeten"""
+
+    def __init__(self):
+        self.sinks = []
+        self.profile_stages = set()
+        self.tracemalloc_stages = set()
+        self.profile_dir = Path(".")
+        self._profiling = (
+            threading.Lock()
+        )  # er kan maar één cProfile tegelijk actief zijn
+
+    def add_sink(self, sink) -> None:
+        self.sinks.append(sink)
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
+        self.sinks = []
+
+    @contextmanager
+    def span(self, name: str, kind: str = "item", **attributes) -> Iterator[Span]:
+        """meet de tijd van een blok code; een span binnen een andere span wordt daar een kind van"""
+        span = Span(name, kind, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        profiler = None
+        memory = False
+        if (
+            kind == "stage"
+            and name in self.profile_stages
+            and self._profiling.acquire(blocking=False)
+        ):
+            profiler = cProfile.Profile()
+        if kind == "stage" and name in self.tracemalloc_stages:
+            memory = not tracemalloc.is_tracing()
+            if memory:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                fname = self.profile_dir / f"{name}-{span.span_id}.prof"
+                profiler.dump_stats(fname)
+                self._profiling.release()
+                span.set(profile=str(fname))
+            if kind == "stage" and name in self.tracemalloc_stages:
+                current, peak = tracemalloc.get_traced_memory()
+                span.set(memory_current_bytes=current, memory_peak_bytes=peak)
+                if memory:
+                    tracemalloc.stop()
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            self._export(span)
+
+    def stage(self, name: str, **attributes):
+        """span voor een stap van een pipeline, met de optionele profilering
+
+        cProfile meet alleen de thread waarin de stap loopt (niet de worker threads) en een stap binnen een
+        andere geprofileerde stap wordt niet apart geprofileerd. tracemalloc meet wel alle threads.
+        """
+        return self.span(name, kind="stage", **attributes)
+
+    def traced(self, name: Optional[str] = None, kind: str = "stage"):
+        """decorator die elke aanroep van de functie in een span zet"""
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name or func.__name__, kind=kind):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def _export(self, span: Span) -> None:
+        for sink in self.sinks:
+            try:
+                sink.export(span)
+            except Exception as e:
+                logger.error(f"Span {span.name} niet weggeschreven: {e}")
+
+
+def submit(executor, func, *args, **kwargs):
+    """`executor.submit` met de huidige span, zodat spans in de worker threads onder de stap vallen"""
+    return executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+def configure_from_env(tracer: "Tracer") -> None:
+    """stel sinks en profilering in met de omgevingsvariabelen LDO_TRACE, LDO_PROFILE en LDO_TRACEMALLOC"""
+    for item in filter(None, os.environ.get("LDO_TRACE", "").split(",")):
+        kind, _, argument = item.partition(":")
+        if kind == "log":
+            tracer.add_sink(LogSink())
+        elif kind == "jsonl":
+            tracer.add_sink(JsonLinesSink(Path(argument or "ldo_trace.jsonl")))
+        elif kind == "otel":
+            tracer.add_sink(OpenTelemetrySink())
+        else:
+            logger.error(f"Onbekende LDO_TRACE sink: {item}")
+    tracer.profile_stages = set(
+        filter(None, os.environ.get("LDO_PROFILE", "").split(","))
+    )
+    tracer.tracemalloc_stages = set(
+        filter(None, os.environ.get("LDO_TRACEMALLOC", "").split(","))
+    )
+    tracer.profile_dir = Path(os.environ.get("LDO_PROFILE_DIR", "."))
+
+
+# gedeelde tracer van de pipelines
+tracer = Tracer()
+configure_from_env(tracer)
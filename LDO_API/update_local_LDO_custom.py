@@ -8,21 +8,50 @@ Download de bulk export en voegt dit toe aan een bestaande export.
 
 """
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from functools import partial
+from datetime import datetime, timedelta, timezone
+import json
 import logging
+import os
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional, Union
+import tempfile
 import time
 import zipfile
 from LDO_API.export_LDO import (
+    DELTA_FILTER_FIELD,
+    delta_filter,
     download_tif,
     get_all_metadata,
+    url_expiry,
+    UrlExpiredError,
+    get_scenario_items,
     get_scenario_list,
+    quality_checked_ids,
     get_layer_names,
     get_file_url,
+    local_file_name,
+    not_modified,
+    open_download,
+    receive_download,
 )
-import pandas as pd
-import requests
-import shutil
-from tqdm import tqdm
+from LDO_API.archive_LDO import (  # noqa: F401 (ook via deze module te importeren)
+    ZipStreamWriter,
+    kopieer_entry,
+    vergelijke_nieuwe_en_huidige,
+    voeg_zips_samen_verwijder_ouder,
+    werk_gesharde_archief_bij,
+)
+from LDO_API.catalog_LDO import LDOCatalog
+from LDO_API.token_LDO import haal_token_op  # noqa: F401 (ook via deze module te importeren)
+from LDO_API.download_manifest import DownloadManifest
+from LDO_API.pipeline_LDO import Done, ResolveTransferPipeline
+from LDO_API.tracing_LDO import submit, tracer
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 """
 Stappen plan voor het aanmaken van een api key.
@@ -76,78 +105,229 @@ logging.basicConfig(
 )
 logger = logging.getLogger()
 
+MANIFEST_NAME = "manifest.json"
+# bestanden die elke run opnieuw aan het archief worden toegevoegd
+BOOKKEEPING_NAMES = ("metadata.xlsx", "missing_values.csv")
+# sleutels in de sync status van de catalogus, zie `haal_gewijzigde_scenarios_op`
+SYNC_WATERMARK = "delta_sync_watermark"
+SYNC_PENDING = "delta_sync_pending"
+SYNC_RECONCILED = "delta_sync_reconciled"
+# zo lang (seconden) blijven de bestandsnamen van een scenario uit de catalogus geldig, zie `iter_layer_names_from_scenario`
+LAYER_NAMES_MAX_AGE = 7 * 24 * 3600
+# downloads tot deze grootte blijven in het geheugen bij `stream_to_zip`, grotere gaan direct in de zip
+SPOOL_SIZE = 64 * 1024 * 1024
+# aantal keer dat een verlopen download url opnieuw wordt opgevraagd, zie `download_with_fresh_url`
+MAX_URL_RESOLVES = 3
+# een url die binnen zoveel seconden verloopt wordt voor de download vernieuwd
+URL_EXPIRY_MARGIN = 30
 
-def haal_token_op(api_key: str, tenant: int) -> dict:
-    """Haal de access token op voor www.ldo.overstromingsinformatie.nl gegeven de api key"""
-    url_auth = "https://ldo.overstromingsinformatie.nl/auth/v1/token/"
-    headers = {"accept": "application/json", "Content-Type": "application/json"}
-    response = requests.post(
-        url=url_auth,
-        headers=headers,
-        json={"tenant": tenant},
-        auth=("__key__", api_key),
-    )
-    try:
-        id_token = response.json()["access"]
-    except KeyError:
-        res_error = response.text
-        if (
-            '"tenant"' in res_error
-            and "Invalid pk" in res_error
-            and "object does not exist." in res_error
-        ):
-            tenant = res_error.removeprefix('{"tenant":["Invalid pk \\"')[0]
-            logger.error(f"Invalid tenant {tenant} for the provided API key.")
-            raise UserWarning(
-                f"Invalid tenant {tenant} for the provided API key, adjust the TENANT variable accordingly."
-            )
-        else:
-            logger.error(f"Failed to retrieve access token: {res_error}")
-            raise UserWarning(f"Failed to retrieve access token: {res_error}")
-    headers = {
-        "accept": "application/json",
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {id_token}",
-    }
-    return headers
 
+def haal_scenarios_op(
+    maximum: Optional[int],
+    headers: dict,
+    extra_filter: str = "",
+    catalog: Optional[LDOCatalog] = None,
+) -> list:
+    """Haal de scenario ids op, met `maximum=None` worden alle scenarios opgehaald
 
-def haal_scenarios_op(maximum: int, headers: dict, extra_filter: str = "") -> list:
-    """ "Haal de scenario ids op"""
+    Met een `catalog` worden de scenarios daarin vastgelegd, bij een volledige lijst worden ontbrekende
+    scenarios als verwijderd gemarkeerd.
+    """
     limit_per_request = 100
     offset = 0
-    beschikbare_scenario_ids = get_scenario_list(
-        offset, limit_per_request, maximum, headers, extra_filter=extra_filter
-    )
+    with tracer.stage("haal_scenarios_op", maximum=maximum) as span:
+        beschikbare_scenario_ids = get_scenario_list(
+            offset, limit_per_request, maximum, headers, extra_filter=extra_filter
+        )
+        span.set(scenarios=len(beschikbare_scenario_ids))
+        if catalog is not None:
+            catalog.record_scenarios(
+                beschikbare_scenario_ids,
+                full_listing=maximum is None and extra_filter == "",
+            )
     return beschikbare_scenario_ids
 
 
-def vergelijke_nieuwe_en_huidige(
-    combined_file: Path, beschikbare_scenario_ids: list
-) -> tuple[list, list, pd.DataFrame]:
-    """Open de map Combined file, lees het huidige meta data bestand uit en vergelijk de ids hier in met de opgehaalde lijst"""
-    with zipfile.ZipFile(combined_file, "r") as archive:
-        name_list = archive.namelist()
-        file_extensions = [name.split(".")[-1] for name in name_list]
-        excel_file = name_list[file_extensions.index("xlsx")]
-        with archive.open(excel_file) as f_open:
-            df_current_local_LDO = pd.read_excel(f_open, index_col=0)
-
-    huidige_scenarios = set(df_current_local_LDO.index)
-    nieuwe_scenarios = list(set(beschikbare_scenario_ids).difference(huidige_scenarios))
-    verwijderde_scenarios = list(
-        set(huidige_scenarios).difference(beschikbare_scenario_ids)
-    )
-    return verwijderde_scenarios, nieuwe_scenarios, df_current_local_LDO
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    """iso tijd van de server of de catalogus, zonder tijdzone is het UTC"""
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
 
 
-def get_layer_names_from_scenario(nieuwe_scenarios: str, headers: dict) -> pd.DataFrame:
-    """Haal de bestandsnamen van de scenarios op om vervolgens te exporteren"""
-    data = {}
+def haal_gewijzigde_scenarios_op(
+    headers: dict,
+    catalog: LDOCatalog,
+    overlap: timedelta = timedelta(hours=1),
+    reconcile_every: Optional[timedelta] = timedelta(days=7),
+) -> list:
+    """Haal alleen de scenarios op die sinds de vorige sync zijn aangemaakt of gewijzigd (delta sync)
+
+    Het watermerk (starttijd van de vorige sync min `overlap`, voor klokverschillen met de server) staat in
+    de catalogus. Zonder watermerk wordt de volledige lijst opgehaald. Van gewijzigde scenarios worden de lagen
+    en download status vergeten zodat deze opnieuw worden opgehaald, scenarios die niet meer quality_checked
+    zijn worden als verwijderd gemarkeerd.
+    Het filter (`DELTA_FILTER_FIELD`) wordt gecontroleerd: geeft de server scenarios die voor het watermerk
+    zijn gewijzigd (filter genegeerd), dan wordt lokaal op `last_modified` gefilterd. Zonder `last_modified`
+    is dat niet te controleren en volgt een UserWarning in plaats van een volledige download.
+    Verwijderde scenarios staan niet in een delta, daarom wordt elke `reconcile_every` de volledige lijst met
+    ids opgehaald en worden ontbrekende scenarios als verwijderd gemarkeerd (None: nooit).
+    Scenarios blijven openstaan tot ze met `rond_delta_sync_af` zijn afgerond, een afgebroken of deels
+    mislukte sync wordt dus bij de volgende run opnieuw geprobeerd.
+    """
+    nu = datetime.now(timezone.utc)
+    watermerk = (nu - overlap).isoformat(timespec="seconds")
+    vorige = catalog.get_state(SYNC_WATERMARK)
+    if vorige is None:
+        logger.info("Geen watermerk in de catalogus, volledige lijst met scenarios")
+        gewijzigd = haal_scenarios_op(None, headers, catalog=catalog)
+        catalog.set_state(SYNC_RECONCILED, nu.isoformat(timespec="seconds"))
+    else:
+        logger.info(f"Haal scenarios op die sinds {vorige} zijn gewijzigd")
+        items = get_scenario_items(
+            0, 100, None, headers, extra_filter=delta_filter(vorige)
+        )
+        sinds = _parse_time(vorige)
+        tijden = [_parse_time(item.get("last_modified")) for item in items]
+        if any(moment is None for moment in tijden):
+            raise UserWarning(
+                "Delta sync: scenarios zonder (leesbare) last_modified, het filter "
+                f"{DELTA_FILTER_FIELD} is niet te controleren. Zet delta_sync uit of pas LDO_DELTA_FILTER aan."
+            )
+        if any(moment < sinds for moment in tijden):
+            # de server negeert het filter: dit is de volledige lijst
+            logger.warning(
+                f"Filter {DELTA_FILTER_FIELD} wordt door de server genegeerd, er wordt lokaal gefilterd op last_modified"
+            )
+            catalog.record_scenarios(quality_checked_ids(items), full_listing=True)
+            catalog.set_state(SYNC_RECONCILED, nu.isoformat(timespec="seconds"))
+            items = [item for item, moment in zip(items, tijden) if moment >= sinds]
+        gewijzigd = quality_checked_ids(items)
+        gewijzigd_set = set(gewijzigd)
+        catalog.record_scenarios(gewijzigd)
+        catalog.mark_removed(
+            [item["id"] for item in items if item["id"] not in gewijzigd_set]
+        )
+        for scenario_id in gewijzigd:
+            catalog.forget_layers(scenario_id)
+            catalog.forget(scenario_id)
+
+    laatste = _parse_time(catalog.get_state(SYNC_RECONCILED))
+    if reconcile_every is not None and (
+        laatste is None or nu - laatste > reconcile_every
+    ):
+        logger.info(
+            "Volledige lijst met scenarios voor het vinden van verwijderde scenarios"
+        )
+        haal_scenarios_op(None, headers, catalog=catalog)
+        catalog.set_state(SYNC_RECONCILED, nu.isoformat(timespec="seconds"))
+
+    verwijderd = set(catalog.removed_scenario_ids())
+    openstaand = json.loads(catalog.get_state(SYNC_PENDING) or "[]")
+    openstaand = sorted((set(openstaand) | set(gewijzigd)) - verwijderd)
+    catalog.set_state(SYNC_PENDING, json.dumps(openstaand))
+    catalog.set_state(SYNC_WATERMARK, watermerk)
+    return openstaand
+
+
+def rond_delta_sync_af(
+    catalog: LDOCatalog, scenario_ids: list, endings_to_skip=None
+) -> list:
+    """Rond de delta sync af voor scenarios waarvan alle lagen zijn gedownload, geeft de nog openstaande ids terug
+
+    Alleen de catalogus telt: een scenario waarvan de lagen niet zijn opgehaald, of met een laag die niet als
+    gedownload in de catalogus staat (mislukt, of niet aan toegekomen door een afgebroken export), blijft openstaan.
+    Lagen met een extensie uit `endings_to_skip` (zie `export_uit_LDO_custom`) tellen niet mee.
+    """
+    if endings_to_skip is None:
+        endings_to_skip = []
+    afgerond = set()
+    for scenario_id in scenario_ids:
+        names = catalog.layer_names(scenario_id)
+        if names is None:
+            continue
+        names = {
+            name for name in names if name.split(".")[-1].lower() not in endings_to_skip
+        }
+        if names.issubset(catalog.downloaded_layer_names(scenario_id)):
+            afgerond.add(scenario_id)
+    openstaand = json.loads(catalog.get_state(SYNC_PENDING) or "[]")
+    openstaand = [i for i in openstaand if i not in afgerond]
+    catalog.set_state(SYNC_PENDING, json.dumps(openstaand))
+    return openstaand
+
+
+def _get_layer_names(scenario_id: int, headers: dict) -> Optional[list]:
+    with tracer.span("get_layer_names", scenario_id=scenario_id) as span:
+        names = get_layer_names(scenario_id, headers)
+        span.set(layers=len(names) if names is not None else None)
+    return names
+
+
+def iter_layer_names_from_scenario(
+    nieuwe_scenarios: list,
+    headers: dict,
+    max_workers: int = 8,
+    catalog: Optional[LDOCatalog] = None,
+    max_age: Optional[float] = LAYER_NAMES_MAX_AGE,
+) -> Iterator[tuple[int, list]]:
+    """Haal gelijktijdig de bestandsnamen van de scenarios op, geeft (scenario_id, namen) terug zodra deze binnen zijn
+
+    Scenarios waarvoor het ophalen mislukt worden gelogd en overgeslagen, de rest gaat gewoon door.
+    Met een `catalog` komen bekende scenarios uit de catalogus en worden nieuwe daarin vastgelegd. Namen die
+    langer dan `max_age` seconden geleden zijn opgehaald worden opnieuw opgehaald (`max_age=None`: niet verlopen).
+    """
+    te_doen = []
     for ids in nieuwe_scenarios:
-        data[ids] = get_layer_names(ids, headers)
-        time.sleep(0.001)  # om niet te snel te gaan
-    max_length = max([len(data[ids]) for ids in data.keys()])
+        names = catalog.layer_names(ids, max_age) if catalog is not None else None
+        if names is None:
+            te_doen.append(ids)
+        else:
+            yield ids, names
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {
+            submit(executor, _get_layer_names, ids, headers): ids for ids in te_doen
+        }
+        for future in as_completed(futures):
+            ids = futures[future]
+            try:
+                names = future.result()
+            except Exception as e:
+                logger.error(f"Failed to get layer names for scenario {ids}: {e}")
+                continue
+            if names is None:
+                logger.error(f"Failed to get layer names for scenario {ids}")
+                continue
+            if catalog is not None:
+                catalog.record_layers(ids, names)
+            yield ids, names
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def get_layer_names_from_scenario(
+    nieuwe_scenarios: list,
+    headers: dict,
+    max_workers: int = 8,
+    catalog: Optional[LDOCatalog] = None,
+    max_age: Optional[float] = LAYER_NAMES_MAX_AGE,
+) -> "pd.DataFrame":
+    """Haal de bestandsnamen van de scenarios op om vervolgens te exporteren"""
+    import pandas as pd
+
+    with tracer.stage("get_layer_names_from_scenario", scenarios=len(nieuwe_scenarios)):
+        data = dict(
+            iter_layer_names_from_scenario(
+                nieuwe_scenarios, headers, max_workers, catalog, max_age
+            )
+        )
+    # zelfde volgorde als de opgegeven scenarios
+    data = {ids: data[ids] for ids in nieuwe_scenarios if ids in data}
+    max_length = max([len(name) for name in data.values()], default=0)
     # Fill each names list to max_length with None
     data = {
         ids: list(name) + [None] * (max_length - len(name))
@@ -156,137 +336,443 @@ def get_layer_names_from_scenario(nieuwe_scenarios: str, headers: dict) -> pd.Da
     return pd.DataFrame(data).T
 
 
+def resolve_layer_url(
+    scenario_id: int, file_name: str, headers: dict
+) -> tuple[int, str]:
+    """vraag de (gesigneerde) download url van een laag op, geeft (status_code, url of foutmelding) terug"""
+    with tracer.span("get_file_url", scenario_id=scenario_id, layer=file_name) as span:
+        status_code, url = get_file_url(scenario_id, file_name, headers)
+        span.set(status_code=status_code)
+    return status_code, url
+
+
+def resolve_layer(
+    scenario_id: int,
+    file_name: str,
+    headers: dict,
+    export_dir: Path,
+    manifest: Optional[Union[DownloadManifest, LDOCatalog]] = None,
+) -> Union[tuple[int, str], Done]:
+    """Eerste stap van de download pipeline: vraag de download url op
+
+    Geeft een `Done` met het resultaat van de laag als er niets te downloaden is (geen url, of al gedownload
+    volgens het `manifest` en met een conditioneel request op ETag/Last-Modified ongewijzigd in het LDO),
+    anders (status_code, url) voor `download_layer`.
+    """
+    fname = export_dir / f"{scenario_id}" / local_file_name(file_name)
+    downloaded = manifest is not None and manifest.is_current(
+        scenario_id, file_name, fname
+    )
+    status_code, url = resolve_layer_url(scenario_id, file_name, headers)
+    if status_code != 200:
+        return Done((scenario_id, file_name, False, url))
+    if downloaded and _ongewijzigd(url, manifest, scenario_id, file_name):
+        return Done((scenario_id, file_name, True, "al gedownload"))
+    return status_code, url
+
+
+def _ongewijzigd(
+    url: str,
+    manifest: Union[DownloadManifest, LDOCatalog],
+    scenario_id: int,
+    file_name: str,
+) -> bool:
+    """True als de laag volgens een conditioneel request met de ETag/Last-Modified uit het manifest ongewijzigd is"""
+    try:
+        return not_modified(url, manifest.get(scenario_id, file_name))
+    except ConnectionError as e:
+        # opnieuw downloaden, `download_with_fresh_url` handelt een verlopen url of fout af
+        logger.info(f"Controle van {file_name} ({scenario_id}) mislukt: {e}")
+        return False
+
+
+def zip_entry_name(scenario_id: int, file_name: str) -> str:
+    """naam van een laag in `downloaded_tiffs.zip`"""
+    return f"{scenario_id}/{local_file_name(file_name)}"
+
+
+def resolve_layer_to_zip(
+    scenario_id: int,
+    file_name: str,
+    headers: dict,
+    manifest: Optional[Union[DownloadManifest, LDOCatalog]] = None,
+    vorige: Optional[zipfile.ZipFile] = None,
+) -> Union[tuple[int, str], Done]:
+    """Eerste stap van de download pipeline met `stream_to_zip`, zie `resolve_layer`
+
+    Een laag die volgens het `manifest` is gedownload, met dezelfde grootte in het `vorige` archief staat en
+    ongewijzigd is in het LDO, wordt niet opnieuw gedownload: deze wordt aan het eind uit het vorige archief
+    overgenomen (`neem_vorige_over`).
+    """
+    entry = manifest.get(scenario_id, file_name) if manifest is not None else None
+    downloaded = False
+    if entry is not None and vorige is not None:
+        try:
+            info = vorige.getinfo(zip_entry_name(scenario_id, file_name))
+            downloaded = info.file_size == entry["size"]
+        except KeyError:
+            pass
+    status_code, url = resolve_layer_url(scenario_id, file_name, headers)
+    if status_code != 200:
+        return Done((scenario_id, file_name, False, url))
+    if downloaded and _ongewijzigd(url, manifest, scenario_id, file_name):
+        return Done((scenario_id, file_name, True, "al gedownload"))
+    return status_code, url
+
+
+def neem_vorige_over(vorige: zipfile.ZipFile, output_archive: zipfile.ZipFile) -> int:
+    """neem de entries uit het vorige archief over die (nog) niet in het nieuwe staan, geeft het aantal terug
+
+    Dat zijn de ongewijzigde lagen, en de lagen van scenarios die deze run niet zijn opgehaald (net als in
+    `downloaded_tiffs/`). De bestanden in `BOOKKEEPING_NAMES` worden elke run opnieuw geschreven.
+    """
+    geschreven = set(output_archive.namelist())
+    overgenomen = 0
+    for item in vorige.infolist():
+        if item.filename in geschreven or item.filename in BOOKKEEPING_NAMES:
+            continue
+        kopieer_entry(vorige, output_archive, item)
+        overgenomen += 1
+    return overgenomen
+
+
+def download_with_fresh_url(
+    scenario_id: int,
+    file_name: str,
+    headers: dict,
+    resolved: tuple[int, str],
+    download,
+) -> tuple[bool, str, Optional[dict]]:
+    """Download met `download(url)` en houd de gesigneerde url geldig, geeft (gelukt, url of fout, info) terug
+
+    Een url die binnen `URL_EXPIRY_MARGIN` verloopt wordt vooraf vernieuwd, een url die door de object storage
+    wordt geweigerd (`UrlExpiredError`) wordt tot `MAX_URL_RESOLVES` keer opnieuw opgevraagd. Een ConnectionError
+    wordt nog één keer geprobeerd.
+    """
+    status_code, url = resolved
+    resolves = 0
+    retried = False
+    while status_code == 200:
+        expiry = url_expiry(url)
+        # alleen de url uit de wachtrij wordt vooraf vernieuwd, een net opgevraagde url is zo vers als het kan
+        verloopt = expiry is not None and expiry - time.time() < URL_EXPIRY_MARGIN
+        if not verloopt or resolves > 0:
+            try:
+                return True, url, download(url)
+            except UrlExpiredError as e:
+                if resolves >= MAX_URL_RESOLVES:
+                    logger.error(f"{e}, ook na {resolves} nieuwe urls ({scenario_id})")
+                    return False, str(e), None
+                logger.info(f"{e}, nieuwe url voor {file_name} ({scenario_id})")
+            except ConnectionError as e:
+                if retried:
+                    logger.error(
+                        f"Connection error during download (2nd try): {e}, {url}, {scenario_id}"
+                    )
+                    return False, str(e), None
+                logger.error(f"Connection error during download: {e}")
+                # try again, met dezelfde url
+                retried = True
+                continue
+        resolves += 1
+        status_code, url = resolve_layer_url(scenario_id, file_name, headers)
+    return False, url, None
+
+
+def download_layer(
+    scenario_id: int,
+    file_name: str,
+    headers: dict,
+    export_dir: Path,
+    manifest: Optional[Union[DownloadManifest, LDOCatalog]] = None,
+    resolved: Optional[tuple[int, str]] = None,
+) -> tuple[int, str, bool, str]:
+    """Haal de download url van een laag op en download deze, geeft (scenario_id, file_name, gelukt, url) terug
+
+    Staat de laag al ongewijzigd in het `manifest`, dan wordt er niets opgevraagd. Met `resolved` (van
+    `resolve_layer`) is de url al opgevraagd en wordt alleen gedownload.
+    """
+    if resolved is None:
+        resolved = resolve_layer(scenario_id, file_name, headers, export_dir, manifest)
+        if isinstance(resolved, Done):
+            return resolved.result
+    with tracer.span("download_tif", scenario_id=scenario_id, layer=file_name) as span:
+        # een eventueel .part bestand wordt hervat, ook met een nieuwe url
+        success, url, info = download_with_fresh_url(
+            scenario_id,
+            file_name,
+            headers,
+            resolved,
+            lambda url: download_tif(url, file_name, scenario_id, export_dir),
+        )
+        span.set(bytes=info["size"] if success else None)
+    if not success:
+        return scenario_id, file_name, False, url
+    if manifest is not None:
+        manifest.record(scenario_id, file_name, info)
+    return scenario_id, file_name, True, url
+
+
+def download_layer_to_zip(
+    scenario_id: int,
+    file_name: str,
+    headers: dict,
+    writer: ZipStreamWriter,
+    spool_dir: Path,
+    manifest: Optional[Union[DownloadManifest, LDOCatalog]] = None,
+    resolved: Optional[tuple[int, str]] = None,
+) -> tuple[int, str, bool, str]:
+    """Haal de download url van een laag op en stream deze naar het zip archief
+
+    Bestanden tot `SPOOL_SIZE` gaan via een buffer in het geheugen, zodat de downloads parallel blijven lopen.
+    Grotere bestanden gaan op de schrijf thread direct van de response in de zip (`ZipStreamWriter.add_direct`),
+    een voor een en zonder tijdelijk bestand. Zonder Content-Length (of als `add_direct` niet kan) loopt een groot
+    bestand via een tijdelijk bestand in `spool_dir`.
+    Een geslaagde download wordt in het `manifest` (of de catalogus) vastgelegd.
+    Geeft (scenario_id, file_name, gelukt, url) terug, net als `download_layer`.
+    """
+    if resolved is None:
+        resolved = resolve_layer_to_zip(scenario_id, file_name, headers, manifest)
+        if isinstance(resolved, Done):
+            return resolved.result
+    arcname = zip_entry_name(scenario_id, file_name)
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, dir=spool_dir)
+    direct = False
+
+    def download(url: str) -> dict:
+        nonlocal direct
+        response, expected = open_download(url)
+        try:
+            direct = (
+                expected is not None and expected > SPOOL_SIZE and writer.kan_direct
+            )
+            if direct:
+                return writer.add_direct(
+                    arcname,
+                    lambda dst: receive_download(url, response, expected, dst),
+                    expected,
+                )
+        except BaseException:
+            response.close()
+            raise
+        # elke poging begint met een lege buffer
+        buffer.seek(0)
+        buffer.truncate()
+        return receive_download(url, response, expected, buffer)
+
+    try:
+        with tracer.span(
+            "download_tif", scenario_id=scenario_id, layer=file_name
+        ) as span:
+            success, url, info = download_with_fresh_url(
+                scenario_id, file_name, headers, resolved, download
+            )
+            span.set(bytes=info["size"] if success else None)
+        if not success:
+            buffer.close()
+            return scenario_id, file_name, False, url
+        if direct:
+            buffer.close()  # al in de zip
+        else:
+            # wacht (met `max_pending`) tot de writer het bestand heeft aangenomen
+            with tracer.span("zip_add", scenario_id=scenario_id, layer=file_name):
+                writer.add(arcname, buffer)
+    except BaseException:
+        buffer.close()
+        raise
+    if manifest is not None:
+        manifest.record(scenario_id, file_name, info)
+    return scenario_id, file_name, True, url
+
+
+@tracer.traced()
 def export_uit_LDO_custom(
-    df_layer_names: pd.DataFrame, work_dir: Path, headers: dict, endings_to_skip=None
+    df_layer_names: "Union[pd.DataFrame, Iterable[tuple[int, list]]]",
+    work_dir: Path,
+    headers: dict,
+    endings_to_skip=None,
+    max_workers: int = 8,
+    use_manifest: bool = True,
+    stream_to_zip: bool = False,
+    catalog: Optional[LDOCatalog] = None,
+    resolve_workers: Optional[int] = None,
 ) -> None:
+    """Download de lagen van de scenarios parallel met maximaal `max_workers` gelijktijdige downloads
+
+    `df_layer_names` is een DataFrame van `get_layer_names_from_scenario` of een iterable met
+    (scenario_id, namen), bijvoorbeeld van `iter_layer_names_from_scenario`: downloads starten dan
+    al terwijl de overige scenarios nog worden opgevraagd.
+    Met `use_manifest` wordt in `downloaded_tiffs/manifest.json` bijgehouden wat al is gedownload,
+    bij een volgende run worden die lagen overgeslagen.
+    Met `stream_to_zip` gaan de downloads direct in `downloaded_tiffs.zip` in plaats van eerst naar
+    `downloaded_tiffs/`, zodat elk bestand maar één keer naar schijf gaat. Het manifest staat dan naast het archief
+    (`downloaded_tiffs_manifest.json`); het bestaande archief wordt eerst `downloaded_tiffs.vorige.zip` en wat daarin
+    al actueel is, wordt aan het eind zonder download overgenomen (`neem_vorige_over`).
+    Met een `catalog` wordt de download status per bestand in de catalogus bijgehouden, deze vervangt dan het manifest.
+    De download urls worden door `resolve_workers` threads (standaard `max_workers`) vooruit opgevraagd
+    (`ResolveTransferPipeline`), zodat de downloads niet op de API wachten. Een verlopen url wordt opnieuw opgevraagd, zie `download_with_fresh_url`.
+    """
+    import pandas as pd
+    from tqdm import tqdm
+
     export_dir = work_dir / "downloaded_tiffs"
-    export_dir.mkdir(exist_ok=True)
+    zip_path = work_dir / "downloaded_tiffs.zip"
+    vorige_path = zip_path.with_name(zip_path.stem + ".vorige.zip")
+    vorige = None
     missing_values = {}
     error = None
     if endings_to_skip is None:
         endings_to_skip = []
-    try:
-        for scenario_id, row in tqdm(df_layer_names.iterrows()):
-            for file_name in row.tolist():
-                # valid_name = validate_file_name(file_name)
-                if isinstance(file_name, float) or file_name is None or file_name == "":
-                    continue
-                elif file_name.split(".")[-1].lower() in endings_to_skip:
-                    continue
-                # Check if the file name is valid
-                status_code, url = get_file_url(scenario_id, file_name, headers)
-                if status_code == 200:
+    if isinstance(df_layer_names, pd.DataFrame):
+        layer_rows = (
+            (scenario_id, row.tolist())
+            for scenario_id, row in df_layer_names.iterrows()
+        )
+    else:
+        layer_rows = df_layer_names
+    scenario_ids = []
+
+    with ExitStack() as stack:
+        if stream_to_zip:
+            if catalog is not None:
+                manifest = catalog
+            elif use_manifest:
+                manifest = DownloadManifest(
+                    zip_path.with_name(f"{zip_path.stem}_{MANIFEST_NAME}")
+                )
+            else:
+                manifest = None
+            if manifest is not None:
+                # het bestaande archief bewaren tot het nieuwe compleet is (na een afgebroken run staat het er al)
+                if zip_path.exists() and not vorige_path.exists():
+                    os.replace(zip_path, vorige_path)
+                if vorige_path.exists():
                     try:
-                        download_tif(url, file_name, scenario_id, export_dir)
-                        time.sleep(0.01)  # om niet te snel te gaan
-                    except ConnectionError as e:
-                        logger.error(f"Connection error during download: {e}")
-                        # try again
-                        try:
-                            download_tif(url, file_name, scenario_id, export_dir)
-                            time.sleep(0.05)
-                        except ConnectionError as e:
-                            logger.error(
-                                f"Connection error during download (2nd try): {e}, {url}, {scenario_id}"
-                            )
+                        vorige = stack.enter_context(zipfile.ZipFile(vorige_path))
+                    except zipfile.BadZipFile as e:
+                        logger.warning(
+                            f"Vorig archief {vorige_path} niet leesbaar: {e}"
+                        )
+            # tijdelijke map voor grote downloads en de metadata, naast het archief
+            export_dir = Path(
+                stack.enter_context(tempfile.TemporaryDirectory(dir=work_dir))
+            )
+            writer = stack.enter_context(
+                ZipStreamWriter(zip_path, max_pending=max_workers)
+            )
+            download_args = (writer, export_dir, manifest)
+            download_func = download_layer_to_zip
+        else:
+            export_dir.mkdir(exist_ok=True)
+            if catalog is not None:
+                manifest = catalog
+            elif use_manifest:
+                manifest = DownloadManifest(export_dir / MANIFEST_NAME)
+            else:
+                manifest = None
+            download_args = (export_dir, manifest)
+            download_func = download_layer
+
+        if stream_to_zip:
+            resolve_func = partial(
+                resolve_layer_to_zip, headers=headers, manifest=manifest, vorige=vorige
+            )
+        else:
+            resolve_func = partial(
+                resolve_layer, headers=headers, export_dir=export_dir, manifest=manifest
+            )
+
+        try:
+            with (
+                tracer.stage("downloads") as downloads,
+                ResolveTransferPipeline(
+                    resolve_func,
+                    lambda scenario_id, file_name, resolved: download_func(
+                        scenario_id, file_name, headers, *download_args, resolved
+                    ),
+                    resolve_workers=resolve_workers or max_workers,
+                    transfer_workers=max_workers,
+                    # een beperkte voorraad urls, zodat deze niet verlopen voor de download begint
+                    queue_size=2 * max_workers,
+                ) as pipeline,
+            ):
+                for scenario_id, file_names in layer_rows:
+                    scenario_ids.append(scenario_id)
+                    for file_name in file_names:
+                        # valid_name = validate_file_name(file_name)
+                        if (
+                            isinstance(file_name, float)
+                            or file_name is None
+                            or file_name == ""
+                        ):
+                            continue
+                        elif file_name.split(".")[-1].lower() in endings_to_skip:
                             continue
-                else:
-                    logger.info(
-                        f"Failed to download {file_name} for scenario {scenario_id}: {url}"
+                        pipeline.submit(scenario_id, file_name)
+                try:
+                    for index, result in enumerate(
+                        tqdm(pipeline.results(), total=len(pipeline))
+                    ):
+                        scenario_id, file_name, success, url = result
+                        if manifest is not None and index % 100 == 99:
+                            manifest.save()  # tussentijds, voor als de run wordt afgebroken
+                        if not success:
+                            logger.info(
+                                f"Failed to download {file_name} for scenario {scenario_id}: {url}"
+                            )
+                            if scenario_id in missing_values:
+                                missing_values[scenario_id].append(file_name)
+                            else:
+                                missing_values[scenario_id] = [file_name]
+                            if catalog is not None:
+                                catalog.record_missing(scenario_id, file_name, url)
+                finally:
+                    if manifest is not None:
+                        manifest.save()
+                    downloads.set(
+                        scenarios=len(scenario_ids),
+                        layers=len(pipeline),
+                        missing=sum(len(v) for v in missing_values.values()),
                     )
-                    if scenario_id in missing_values:
-                        missing_values[scenario_id].append(file_name)
-                    else:
-                        missing_values[scenario_id] = [file_name]
-
-        error = get_all_metadata(
-            scenario_ids=df_layer_names.index.tolist(),
-            fname=export_dir / "metadata.xlsx",
-            headers=headers,
-        )
-    except Exception as e:
-        logger.error(f"Error during download: {e} {error}")
 
-    # still write the missing values to a csv & zip
-    missing_values_df = pd.DataFrame.from_dict(missing_values, orient="index")
-    missing_values_df.to_csv(export_dir / "missing_values.csv")
-    with zipfile.ZipFile(work_dir / "downloaded_tiffs.zip", "w") as zipf:
+            with tracer.stage("get_all_metadata", scenarios=len(scenario_ids)):
+                error = get_all_metadata(
+                    scenario_ids=scenario_ids,
+                    fname=export_dir / "metadata.xlsx",
+                    headers=headers,
+                )
+        except Exception as e:
+            logger.error(f"Error during download: {e} {error}")
+
+        # still write the missing values to a csv & zip
+        missing_values_df = pd.DataFrame.from_dict(missing_values, orient="index")
+        missing_values_df.to_csv(export_dir / "missing_values.csv")
+        if stream_to_zip:
+            if vorige is not None:
+                overgenomen = writer.run(lambda zf: neem_vorige_over(vorige, zf))
+                logger.info(f"{overgenomen} bestanden overgenomen uit {vorige_path}")
+            # metadata en missing values als laatste aan het archief toevoegen
+            for name in BOOKKEEPING_NAMES:
+                if (export_dir / name).exists():
+                    writer.add_file(export_dir / name, name)
+
+    if stream_to_zip:
+        if vorige_path.exists():
+            vorige_path.unlink()
+        return
+
+    with tracer.stage("zip"), zipfile.ZipFile(zip_path, "w") as zipf:
         for folder in export_dir.iterdir():
+            if (
+                folder.name == MANIFEST_NAME
+                or ".parts" in folder.name
+                or folder.suffix == ".part"
+            ):
+                # manifest, batches (`metadata.xlsx.parts-<hash>/`) en .part bestanden van een onvolledige export
+                continue
             zipf.write(folder, folder.name)
             if folder.is_dir():
                 for file in folder.iterdir():
+                    if file.suffix == ".part":
+                        continue  # onvolledige download
                     zipf.write(file, folder.name + "/" + file.name)
-
-
-def voeg_zips_samen_verwijder_ouder(
-    lst_zips_nieuwe_export: list,
-    verwijderde_scenarios: list,
-    df_current_local_LDO: pd.DataFrame,
-    current_archive: Path,
-    new_archive: Path,
-) -> None:
-    """
-    Lees de nieuwe metadata in, combineer deze en schrijf naar een excel.
-    Vervolgens worden de nieuwe scenarios toegevoegd en als laatste worden indien nodig scenarios verwijderd.
-    Het nieuwe meta data bestand wordt dan toegevoegd.
-    """
-    skip_rows = [2, 3]
-    lst_dfs_new_scenarios = []
-    # open de metedata van de nieuwe scenarios
-    for file in lst_zips_nieuwe_export:
-        with zipfile.ZipFile(file, "r") as archive:
-            name_list = archive.namelist()
-            file_extensions = [name.split(".")[-1] for name in name_list]
-            excel_file = name_list[file_extensions.index("xlsx")]
-            with archive.open(excel_file) as f_open:
-                df_new_scenarios = pd.read_excel(
-                    f_open, header=1, skiprows=skip_rows, index_col=0
-                )
-                lst_dfs_new_scenarios.append(df_new_scenarios)
-
-    # stel de nieuwe meta data samen
-    df_new_scenarios = pd.concat(lst_dfs_new_scenarios, axis=0)
-    df_final = pd.concat([df_current_local_LDO, df_new_scenarios], axis=0)
-
-    df_final = df_final.drop(index=verwijderde_scenarios)
-    temp_excel_output_name = "merged_excel_temp_update.xlsx"
-    excel_name_in_zip = "merged_excel.xlsx"
-    excel_output_dir = current_archive.parent / temp_excel_output_name
-    df_final.to_excel(temp_excel_output_name)
-    if not new_archive.exists():
-        shutil.copy(current_archive, new_archive)
-
-    # voeg de nieuwe zips toe aan de bestaande scenarios
-    with zipfile.ZipFile(new_archive, "a") as output_archive:
-        for zip_name in lst_zips_nieuwe_export:
-            with zipfile.ZipFile(zip_name, "r") as input_archive:
-                name_list = input_archive.namelist()
-                file_extensions = [name.split(".")[-1] for name in name_list]
-                excel_file = name_list[file_extensions.index("xlsx")]
-                name_list.remove(excel_file)
-                for file in name_list:
-                    output_archive.writestr(file, input_archive.open(file).read())
-
-    # verwijder de verwijderde scenarios indien nodig: dit doen we met een tijdelijke zip
-    verwijderde_scenario_names = [f"scenario_{id}" for id in verwijderde_scenarios]
-    # oude meta data excel moet er uit gehaald worden
-    # TODO: meta data bestand kan ook naast de zip worden bewaard: dit zou een stuk sneller zijn
-    temp_zip_file = new_archive.with_suffix(".temp.zip")
-    with (
-        zipfile.ZipFile(new_archive, "r") as input_archive,
-        zipfile.ZipFile(temp_zip_file, "w") as output_archive,
-    ):
-        for item in input_archive.infolist():
-            if (
-                item.filename.split("/")[0] not in verwijderde_scenario_names
-                and item.filename.split(".")[-1] != "xlsx"
-            ):
-                # verplaats alles naar de nieuwe zip
-                output_archive.writestr(item, input_archive.read(item.filename))
-
-    # klaar: verwijder de oude zip
-    temp_zip_file.replace(new_archive)
-
-    with zipfile.ZipFile(new_archive, "a") as output_archive:
-        # als laaste voeg de meta data weer toe
-        output_archive.write(excel_output_dir, arcname=excel_name_in_zip)
@@ -8,16 +8,26 @@ Download de bulk export en voegt dit toe aan een bestaande export.
 
 """
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import logging
 from pathlib import Path
-import zipfile
+from typing import Optional
+import warnings
 from LDO_API.export_LDO import (
+    ExportPoller,
+    ExportTooLargeError,
     get_scenario_list,
     combine_functions_start_export,
-    combine_functions_download_export,
+    download_finished_export,
+)
+from LDO_API.catalog_LDO import LDOCatalog
+from LDO_API.tracing_LDO import submit, tracer
+from LDO_API.token_LDO import haal_token_op  # noqa: F401 (ook via deze module te importeren)
+from LDO_API.archive_LDO import (  # noqa: F401 (ook via deze module te importeren)
+    vergelijke_nieuwe_en_huidige,
+    voeg_zips_samen_verwijder_ouder,
+    werk_gesharde_archief_bij,
 )
-import pandas as pd
-import requests
-import shutil
 
 """
 Stappen plan voor het aanmaken van een api key.
@@ -61,150 +71,106 @@ meer informatie staat onderaan of op de docs: https://ldo.overstromingsinformati
 """
 
 
-def haal_token_op(api_key: str, tenant: int) -> dict:
-    """Haal de access token op voor www.ldo.overstromingsinformatie.nl gegeven de api key"""
-    url_auth = "https://ldo.overstromingsinformatie.nl/auth/v1/token/"
-    headers = {"accept": "application/json", "Content-Type": "application/json"}
-    response = requests.post(
-        url=url_auth,
-        headers=headers,
-        json={"tenant": tenant},
-        auth=("__key__", api_key),
-    )
-    try:
-        id_token = response.json()["access"]
-    except KeyError:
-        raise UserWarning(f"Failed to retrieve access token: {response.text}")
-    headers = {
-        "accept": "application/json",
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {id_token}",
-    }
-    return headers
-
-
-def haal_scenarios_op(maximum: int, headers: dict) -> list:
-    """ "Haal de scenario ids op"""
+logger = logging.getLogger(__name__)
+
+# aantal scenarios per bulk-export, minder exports betekent minder taken, polls en zips
+BULK_BATCH_SIZE = 50
+
+
+def haal_scenarios_op(
+    maximum: Optional[int], headers: dict, catalog: Optional[LDOCatalog] = None
+) -> list:
+    """Haal de scenario ids op, met `maximum=None` worden alle scenarios opgehaald"""
     limit_per_request = 100
     offset = 0
-    beschikbare_scenario_ids = get_scenario_list(
-        offset, limit_per_request, maximum, headers
-    )
+    with tracer.stage("haal_scenarios_op", maximum=maximum) as span:
+        beschikbare_scenario_ids = get_scenario_list(
+            offset, limit_per_request, maximum, headers
+        )
+        span.set(scenarios=len(beschikbare_scenario_ids))
+    if catalog is not None:
+        catalog.record_scenarios(beschikbare_scenario_ids, full_listing=maximum is None)
     return beschikbare_scenario_ids
 
 
-def vergelijke_nieuwe_en_huidige(
-    combined_file: Path, beschikbare_scenario_ids: list
-) -> tuple[list, list, pd.DataFrame]:
-    """Open de map Combined file, lees het huidige meta data bestand uit en vergelijk de ids hier in met de opgehaalde lijst"""
-    with zipfile.ZipFile(combined_file, "r") as archive:
-        name_list = archive.namelist()
-        file_extensions = [name.split(".")[-1] for name in name_list]
-        excel_file = name_list[file_extensions.index("xlsx")]
-        with archive.open(excel_file) as f_open:
-            df_current_local_LDO = pd.read_excel(f_open, index_col=0)
-
-    huidige_scenarios = set(df_current_local_LDO.index)
-    nieuwe_scenarios = list(set(beschikbare_scenario_ids).difference(huidige_scenarios))
-    verwijderde_scenarios = list(
-        set(huidige_scenarios).difference(beschikbare_scenario_ids)
-    )
-    return verwijderde_scenarios, nieuwe_scenarios, df_current_local_LDO
+def splits_batch(batch: list) -> list:
+    """splits een batch met scenario ids in twee helften"""
+    midden = len(batch) // 2
+    return [batch[:midden], batch[midden:]]
 
 
+@tracer.traced()
 def export_uit_LDO_bulk(
-    nieuwe_scenarios: list, headers: dict, current_dir: Path = Path(__file__).parent
-) -> tuple[list, dict, pd.DataFrame]:
-    """Haal de nieuwe scenarios op uit het LDO, geef een lijst met de paden naar de gedownloade zips terug"""
-    # Start the exports
-    list_args = []  # tuple met (export_id, status, export_body) doorgeven van een functie naar de volgende
-    for index, id in enumerate(nieuwe_scenarios):
-        list_args.append(combine_functions_start_export(headers, index, [id]))
-
-    # zodra alle exports zijn gestart, download ze.
-    for index, id_list in enumerate(nieuwe_scenarios):
-        combine_functions_download_export(headers, *list_args[index])
-
-    #  Met de export-id's, haal de metadata dataframes van de nieuwe scenario's op
-    nieuwe_scenarios_export_ids = [args[0] for args in list_args]
-    return [
-        current_dir / f"export_{export_id}.zip"
-        for export_id in nieuwe_scenarios_export_ids
-    ]
-
-
-def voeg_zips_samen_verwijder_ouder(
-    lst_zips_nieuwe_export: list,
-    verwijderde_scenarios: list,
-    df_current_local_LDO: pd.DataFrame,
-    current_archive: Path,
-    new_archive: Path,
-) -> None:
-    """
-    Lees de nieuwe metadata in, combineer deze en schrijf naar een excel.
-    Vervolgens worden de nieuwe scenarios toegevoegd en als laatste worden indien nodig scenarios verwijderd.
-    Het nieuwe meta data bestand wordt dan toegevoegd.
+    nieuwe_scenarios: list,
+    headers: dict,
+    current_dir: Path = Path(__file__).parent,
+    batch_size: int = BULK_BATCH_SIZE,
+    max_downloads: int = 4,
+    poll_interval: float = 2,
+) -> list:
+    """Haal de nieuwe scenarios op uit het LDO, geef een lijst met de paden naar de gedownloade zips terug
+
+    De scenarios gaan in batches van `batch_size` per bulk-export. Weigert de server een batch omdat deze te groot
+    is, of mislukt de export, dan wordt de batch in tweeën gesplitst en opnieuw geprobeerd. Een enkel scenario
+    dat mislukt wordt overgeslagen met een waarschuwing.
+    Alle exports worden tegelijk gevolgd met een `ExportPoller`, elke export wordt gedownload (maximaal
+    `max_downloads` tegelijk) zodra deze klaar is, ongeacht de volgorde. `poll_interval` is de eerste wachttijd
+    voor het opvragen van de status, daarna loopt deze op.
     """
-    skip_rows = [2, 3]
-    lst_dfs_new_scenarios = []
-    # open de metedata van de nieuwe scenarios
-    for file in lst_zips_nieuwe_export:
-        with zipfile.ZipFile(file, "r") as archive:
-            name_list = archive.namelist()
-            file_extensions = [name.split(".")[-1] for name in name_list]
-            excel_file = name_list[file_extensions.index("xlsx")]
-            with archive.open(excel_file) as f_open:
-                df_new_scenarios = pd.read_excel(
-                    f_open, header=1, skiprows=skip_rows, index_col=0
+    poller = ExportPoller(headers, min_interval=poll_interval)
+    gestart = {}  # export_id: (batch, export_body)
+    index = 0
+
+    def start(batch: list) -> None:
+        nonlocal index
+        index += 1
+        try:
+            with tracer.span("start_export", scenarios=len(batch)):
+                export_id, status, export_body = combine_functions_start_export(
+                    headers, index, batch
+                )
+        except ExportTooLargeError as e:
+            if len(batch) == 1:
+                warnings.warn(f"Scenario {batch[0]} te groot voor een export: {e}")
+                return
+            logger.info(f"Batch van {len(batch)} scenarios te groot, wordt gesplitst")
+            for helft in splits_batch(batch):
+                start(helft)
+            return
+        gestart[export_id] = (batch, export_body)
+        poller.add(export_id, status)
+
+    for i in range(0, len(nieuwe_scenarios), batch_size):
+        start(nieuwe_scenarios[i : i + batch_size])
+
+    lst_zips = []
+    with ThreadPoolExecutor(max_workers=max_downloads) as executor:
+        downloads = {}
+        for export_id, status in poller:
+            batch, export_body = gestart.pop(export_id)
+            if status != "error":
+                future = submit(
+                    executor,
+                    tracer.traced("download_export", kind="item")(
+                        download_finished_export
+                    ),
+                    headers,
+                    export_id,
+                    export_body,
+                    current_dir,
                 )
-                lst_dfs_new_scenarios.append(df_new_scenarios)
-
-    # stel de nieuwe meta data samen
-    df_new_scenarios = pd.concat(lst_dfs_new_scenarios, axis=0)
-    df_final = pd.concat([df_current_local_LDO, df_new_scenarios], axis=0)
-
-    df_final = df_final.drop(index=verwijderde_scenarios)
-    temp_excel_output_name = "merged_excel_temp_update.xlsx"
-    excel_name_in_zip = "merged_excel.xlsx"
-    excel_output_dir = current_archive.parent / temp_excel_output_name
-    df_final.to_excel(temp_excel_output_name)
-    if not new_archive.exists():
-        shutil.copy(current_archive, new_archive)
-
-    # voeg de nieuwe zips toe aan de bestaande scenarios
-    with zipfile.ZipFile(new_archive, "a") as output_archive:
-        for zip_name in lst_zips_nieuwe_export:
-            with zipfile.ZipFile(zip_name, "r") as input_archive:
-                name_list = input_archive.namelist()
-                file_extensions = [name.split(".")[-1] for name in name_list]
-                excel_file = name_list[file_extensions.index("xlsx")]
-                name_list.remove(excel_file)
-                for file in name_list:
-                    output_archive.writestr(file, input_archive.open(file).read())
-
-    # verwijder de verwijderde scenarios indien nodig: dit doen we met een tijdelijke zip
-    verwijderde_scenario_names = [f"scenario_{id}" for id in verwijderde_scenarios]
-    # oude meta data excel moet er uit gehaald worden
-    # TODO: meta data bestand kan ook naast de zip worden bewaard: dit zou een stuk sneller zijn
-    temp_zip_file = new_archive.with_suffix(".temp.zip")
-    with (
-        zipfile.ZipFile(new_archive, "r") as input_archive,
-        zipfile.ZipFile(temp_zip_file, "w") as output_archive,
-    ):
-        for item in input_archive.infolist():
-            if (
-                item.filename.split("/")[0] not in verwijderde_scenario_names
-                and item.filename.split(".")[-1] != "xlsx"
-            ):
-                # verplaats alles naar de nieuwe zip
-                output_archive.writestr(item, input_archive.read(item.filename))
-
-    # klaar: verwijder de oude zip
-    temp_zip_file.replace(new_archive)
-
-    with zipfile.ZipFile(new_archive, "a") as output_archive:
-        # als laaste voeg de meta data weer toe
-        output_archive.write(excel_output_dir, arcname=excel_name_in_zip)
+                downloads[future] = export_id
+            elif len(batch) > 1:
+                logger.info(f"Export {export_id} mislukt, batch wordt gesplitst")
+                for helft in splits_batch(batch):
+                    start(helft)
+            else:
+                warnings.warn(f"Export van scenario {batch[0]} mislukt")
+
+        for future in as_completed(downloads):
+            if future.result():
+                lst_zips.append(current_dir / f"export_{downloads[future]}.zip")
+    return lst_zips
 
 
 # if __name__ == "__main__":
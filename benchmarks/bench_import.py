@@ -0,0 +1,102 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Meet de import tijd van de `LDO_API` modules, elke import in een nieuw python proces (mediaan van `--repeat` keer).
+Controleert ook dat een import geen zware packages (pandas, pyarrow, tqdm, openpyxl) laadt en geen sessie aanmaakt.
+Het script geeft exit code 1 bij een zware import of een sessie, met `--max-ms` ook als een module over het budget
+gaat; te gebruiken als controle op regressies.
+
+gebruik: python benchmarks/bench_import.py --repeat 7 --max-ms 50
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+MODULES = (
+    "LDO_API",
+    "LDO_API.export_LDO",
+    "LDO_API.token_LDO",
+    "LDO_API.update_local_LDO_custom",
+    "LDO_API.update_local_bulk_LDO",
+    "LDO_API.export_SSM_metadata",
+    "LDO_API.archive_LDO",
+)
+# mogen pas bij gebruik worden geïmporteerd
+HEAVY = ("pandas", "pyarrow", "tqdm", "openpyxl")
+
+# draait in het nieuwe proces: import tijd, geladen zware packages en of de sessie is aangemaakt
+_PROBE = """
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module({module!r})
+seconds = time.perf_counter() - start
+export_LDO = sys.modules.get("LDO_API.export_LDO")
+# een gewone `requests.Session` (zonder `_LazySession`) telt als aangemaakt
+session = export_LDO is not None and getattr(export_LDO._session, "_session", True) is not None
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps(dict(seconds=seconds, heavy=heavy, session=session)))
+"""
+
+
+def meet(module: str) -> dict:
+    """import `module` in een nieuw proces"""
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def baseline_ms(repeat: int) -> float:
+    """import tijd van `requests`, de ondergrens voor de modules die http doen"""
+    return 1000 * statistics.median(meet("requests")["seconds"] for _ in range(repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("# DOEL")[-1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=None,
+        help="budget per module bovenop de import tijd van requests",
+    )
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    args = parser.parse_args()
+
+    requests_ms = baseline_ms(args.repeat)
+    print(f"{'requests (ondergrens)':<34} {requests_ms:8.1f} ms")
+    problemen = []
+    for module in args.modules:
+        runs = [meet(module) for _ in range(args.repeat)]
+        ms = 1000 * statistics.median(run["seconds"] for run in runs)
+        heavy = sorted(set().union(*(run["heavy"] for run in runs)))
+        session = any(run["session"] for run in runs)
+        print(
+            f"{module:<34} {ms:8.1f} ms  zwaar: {', '.join(heavy) or '-'}"
+            f"  sessie: {'ja' if session else 'nee'}"
+        )
+        if heavy:
+            problemen.append(f"{module} importeert {', '.join(heavy)}")
+        if session:
+            problemen.append(f"{module} maakt bij import een sessie aan")
+        if args.max_ms is not None and ms > requests_ms + args.max_ms:
+            problemen.append(
+                f"{module} {ms:.1f} ms > {requests_ms:.1f} + {args.max_ms:.1f} ms"
+            )
+
+    for probleem in problemen:
+        print(f"REGRESSIE: {probleem}")
+    if problemen:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+End-to-end benchmark van de custom, bulk en ssm pipelines tegen de lokale stand-in server (`ldo_standin.py`),
+zodat het effect van een wijziging op de doorvoer zonder de echte LDO server te meten is.
+
+gebruik: python benchmarks/bench_pipelines.py --scenarios 200 --latency-ms 30 --pipelines custom bulk ssm
+"""
+
+import argparse
+import json
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+from ldo_standin import StandInLDO, add_config_arguments, config_from_arguments
+
+from LDO_API import export_LDO
+from LDO_API.export_SSM_metadata import haal_ssm_op
+from LDO_API.metrics_LDO import metrics
+from LDO_API.token_LDO import haal_token_op
+from LDO_API.update_local_bulk_LDO import export_uit_LDO_bulk
+from LDO_API.update_local_LDO_custom import (
+    export_uit_LDO_custom,
+    haal_scenarios_op,
+    iter_layer_names_from_scenario,
+)
+
+
+def bench_custom(headers, scenario_ids: list, work_dir: Path, args) -> dict:
+    """lagen ophalen en downloaden per bestand, met of zonder `stream_to_zip`"""
+    export_uit_LDO_custom(
+        iter_layer_names_from_scenario(scenario_ids, headers, args.workers),
+        work_dir=work_dir,
+        headers=headers,
+        max_workers=args.workers,
+        stream_to_zip=args.stream_to_zip,
+    )
+    return {"bytes": (work_dir / "downloaded_tiffs.zip").stat().st_size}
+
+
+def bench_bulk(headers, scenario_ids: list, work_dir: Path, args) -> dict:
+    """bulk-exports in batches, gevolgd door één poller"""
+    zips = export_uit_LDO_bulk(
+        scenario_ids,
+        headers,
+        current_dir=work_dir,
+        batch_size=args.batch_size,
+        poll_interval=0.2,
+    )
+    return {"bytes": sum(z.stat().st_size for z in zips), "exports": len(zips)}
+
+
+def bench_ssm(headers, scenario_ids: list, work_dir: Path, args) -> dict:
+    """ssm metadata van alle scenarios"""
+    records, mislukt = haal_ssm_op(scenario_ids, headers, max_workers=args.workers)
+    return {"records": len(records), "mislukt": len(mislukt)}
+
+
+PIPELINES = {"custom": bench_custom, "bulk": bench_bulk, "ssm": bench_ssm}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("# DOEL")[-1])
+    add_config_arguments(parser)
+    parser.add_argument("--pipelines", nargs="+", default=list(PIPELINES))
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--stream-to-zip", action="store_true")
+    parser.add_argument("--json", type=Path, help="schrijf de resultaten ook als json")
+    parser.add_argument(
+        "--http-report", type=Path, help="schrijf de http meetwaarden als json"
+    )
+    args = parser.parse_args()
+
+    results = {}
+    with StandInLDO(config_from_arguments(args)) as ldo:
+        export_LDO.server = ldo.url
+        headers = haal_token_op("stand-in", tenant=1)
+        for name in args.pipelines:
+            start = time.perf_counter()
+            scenario_ids = haal_scenarios_op(maximum=None, headers=headers)
+            with tempfile.TemporaryDirectory() as temp_dir, warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                result = PIPELINES[name](headers, scenario_ids, Path(temp_dir), args)
+            seconds = time.perf_counter() - start
+            result.update(
+                seconds=round(seconds, 3),
+                scenarios_per_s=round(len(scenario_ids) / seconds, 1),
+            )
+            if "bytes" in result:
+                result["mb_per_s"] = round(result["bytes"] / 1e6 / seconds, 1)
+            results[name] = result
+        results["server"] = dict(ldo.stats)
+
+    for name, result in results.items():
+        print(f"{name:<8} {result}")
+    if args.json is not None:
+        args.json.write_text(json.dumps(results, indent=2))
+    if args.http_report is not None:
+        metrics.write_report(args.http_report, args.http_report.with_suffix(".prom"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Micro-benchmark van het wegschrijven van downloads: de oude `iter_content(chunk_size=512)` loop tegen
+`stream_response` met grote buffers, met een lokale http server zodat het netwerk geen rol speelt.
+
+gebruik: python benchmarks/bench_streaming.py --size-mb 256 --repeat 3
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from LDO_API.export_LDO import _session, stream_response
+
+
+def start_server(payload: bytes) -> tuple[ThreadingHTTPServer, str]:
+    """start een lokale http server die `payload` teruggeeft"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "image/tiff")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            view = memoryview(payload)
+            for start in range(0, len(payload), 4 * 1024 * 1024):
+                self.wfile.write(view[start : start + 4 * 1024 * 1024])
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/raster.tif"
+
+
+def old_loop(url: str, fname: Path) -> None:
+    """de oorspronkelijke manier van downloaden"""
+    response = _session.get(url, stream=True)
+    try:
+        with open(fname, "wb") as f:
+            for chunk in response.iter_content(chunk_size=512):
+                if chunk:  # filter out keep-alive new chunks
+                    f.write(chunk)
+    finally:
+        response.close()
+
+
+def new_writer(url: str, fname: Path, chunk_size: int) -> None:
+    """`stream_response` met de opgegeven buffer grootte"""
+    response = _session.get(url, stream=True)
+    try:
+        with open(fname, "wb") as f:
+            stream_response(response, f, chunk_size=chunk_size)
+    finally:
+        response.close()
+
+
+def best_of(repeat: int, func, *args) -> float:
+    """snelste tijd in seconden over `repeat` runs"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("# DOEL")[-1])
+    parser.add_argument("--size-mb", type=int, default=128)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    server, url = start_server(bytes(size))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fname = Path(temp_dir) / "raster.tif"
+        results = {"iter_content(512)": best_of(args.repeat, old_loop, url, fname)}
+        for chunk_size in (64 * 1024, 1024 * 1024, 4 * 1024 * 1024):
+            results[f"stream_response({chunk_size // 1024} KiB)"] = best_of(
+                args.repeat, new_writer, url, fname, chunk_size
+            )
+    server.shutdown()
+
+    baseline = results["iter_content(512)"]
+    print(f"{args.size_mb} MiB, beste van {args.repeat}")
+    for name, seconds in results.items():
+        print(
+            f"{name:<28} {seconds:8.3f} s {size / 1e6 / seconds:9.1f} MB/s {baseline / seconds:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Micro-benchmark van het samenvoegen van zips: de oude `writestr(item, read(...))` (uitpakken en opnieuw comprimeren
+in het geheugen) tegen `kopieer_entry`, die de gecomprimeerde bytes ongewijzigd kopieert. Meet tijd en piekgeheugen.
+
+gebruik: python benchmarks/bench_zip_merge.py --files 8 --size-mb 64
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+
+from LDO_API.archive_LDO import kopieer_entry
+
+
+def maak_zip(fname: Path, files: int, size: int) -> None:
+    """zip met rasters die deels comprimeerbaar zijn, zoals de tiffs uit het LDO"""
+    with zipfile.ZipFile(fname, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for i in range(files):
+            with archive.open(f"scenario_{i}/raster.tif", "w") as f:
+                for _ in range(size // (1024 * 1024)):
+                    f.write(os.urandom(256 * 1024) + bytes(768 * 1024))
+
+
+def oud(input_file: Path, output_file: Path) -> None:
+    """de oorspronkelijke kopie"""
+    with (
+        zipfile.ZipFile(input_file, "r") as input_archive,
+        zipfile.ZipFile(output_file, "w") as output_archive,
+    ):
+        for item in input_archive.infolist():
+            output_archive.writestr(item, input_archive.read(item.filename))
+
+
+def nieuw(input_file: Path, output_file: Path) -> None:
+    with (
+        zipfile.ZipFile(input_file, "r") as input_archive,
+        zipfile.ZipFile(output_file, "w") as output_archive,
+    ):
+        for item in input_archive.infolist():
+            kopieer_entry(input_archive, output_archive, item)
+
+
+def meet(func, *args) -> tuple[float, int]:
+    """(seconden, piekgeheugen in bytes)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("# DOEL")[-1])
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--size-mb", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_file = Path(temp_dir) / "export.zip"
+        maak_zip(input_file, args.files, args.size_mb * 1024 * 1024)
+        size = input_file.stat().st_size
+        print(f"{args.files} bestanden van {args.size_mb} MiB, zip {size / 1e6:.0f} MB")
+        for name, func in (("writestr(read())", oud), ("kopieer_entry", nieuw)):
+            output_file = Path(temp_dir) / f"{func.__name__}.zip"
+            seconds, peak = meet(func, input_file, output_file)
+            with zipfile.ZipFile(output_file) as archive:
+                assert archive.testzip() is None
+            print(
+                f"{name:<18} {seconds:8.2f} s {size / 1e6 / seconds:8.1f} MB/s piek {peak / 1e6:8.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,549 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Lokale stand-in van de LDO server, voor benchmarks en om de code zonder de echte server te draaien.
+
+Bevat de endpoints die `export_LDO` gebruikt: token, scenarios (met paginering en `last_modified__gte`),
+scenario details, download urls met gesigneerde (verlopende) links naar de bestanden, external-processings,
+scenarios/export en de levenscyclus van bulk-exports. Vertraging, bandbreedte, fouten (500) en 429's zijn instelbaar.
+
+gebruik: python benchmarks/ldo_standin.py --port 8000 --scenarios 500 --latency-ms 50
+en dan `LDO_SERVER=http://127.0.0.1:8000` voor de scripts.
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import zipfile
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+# urls die niet onder de latency/fout/429 injectie vallen (de "object storage")
+BLOB_PREFIX = "/blob/"
+
+
+@dataclass
+class StandInConfig:
+    """instellingen van de stand-in server"""
+
+    scenarios: int = 250
+    layers_per_scenario: int = 4
+    file_size: int = 256 * 1024  # bytes per laag
+    latency: float = 0.0  # seconden per API call
+    # bytes per seconde per download, None = onbeperkt
+    bandwidth: Optional[float] = None
+    failure_rate: float = 0.0  # kans op een 500 per API call
+    throttle_rate: float = 0.0  # kans op een 429 per API call
+    retry_after: int = 1  # seconden in de Retry-After header bij een 429
+    token_ttl: int = 3600  # levensduur van een access token in seconden
+    require_auth: bool = True
+    presign_ttl: int = 300  # geldigheid van een download url in seconden
+    etags: bool = True  # ETag en 304 bij GET requests naar de API
+    export_seconds: float = 1.0  # duur van een bulk-export
+    max_bulk_size: int = 100  # meer scenarios in een bulk-export geeft een 400
+    seed: int = 0
+
+
+class StandInLDO:
+    """Stand-in LDO server in een achtergrond thread
+
+    ```python
+    with StandInLDO(StandInConfig(latency=0.05)) as ldo:
+        export_LDO.server = ldo.url
+        ...
+    ```
+    """
+
+    def __init__(self, config: Optional[StandInConfig] = None, port: int = 0):
+        self.config = config or StandInConfig()
+        self.port = port
+        self.url = None
+        self.stats = {
+            "requests": 0,
+            "throttled": 0,
+            "failed": 0,
+            "not_modified": 0,
+            "bytes": 0,
+        }
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._tokens = {}  # token: verloopt om
+        self._exports = {}
+        self._export_ids = itertools.count(1)
+        self._payload = bytes(self.config.file_size)
+        self._modified = {}  # scenario_id: iso tijd, voor het testen van een delta sync
+        self._versions = {}  # scenario_id: aantal keer gewijzigd
+        self._server = None
+
+    # levenscyclus
+    def start(self) -> str:
+        handler = type("Handler", (_Handler,), {"ldo": self})
+        server_class = type(
+            "Server", (ThreadingHTTPServer,), {"request_queue_size": 1024}
+        )
+        self._server = server_class(("127.0.0.1", self.port), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        return self.url
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self) -> "StandInLDO":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def touch(self, scenario_id: int) -> None:
+        """markeer een scenario als gewijzigd (voor een delta sync), de lagen krijgen nieuwe inhoud van dezelfde grootte"""
+        with self._lock:
+            self._versions[scenario_id] = self._versions.get(scenario_id, 0) + 1
+        self._modified[scenario_id] = _iso(time.time())
+
+    def layer_payload(self, scenario_id: int) -> tuple[bytes, str]:
+        """(inhoud, ETag) van de lagen van een scenario"""
+        version = self._versions.get(scenario_id, 0)
+        payload = self._payload
+        if version > 0:
+            payload = (version.to_bytes(4, "big") + payload)[: len(payload)]
+        return payload, f'"{scenario_id}-{version}"'
+
+    # hulpfuncties
+    def count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += n
+
+    def inject(self) -> Optional[int]:
+        """429 of 500 volgens de ingestelde kansen, of None"""
+        with self._lock:
+            draw = self._random.random()
+        if draw < self.config.throttle_rate:
+            return 429
+        if draw < self.config.throttle_rate + self.config.failure_rate:
+            return 500
+        return None
+
+    def new_token(self) -> str:
+        expires = int(time.time()) + self.config.token_ttl
+        header = _b64({"alg": "none", "typ": "JWT"})
+        token = f"{header}.{_b64({'exp': expires, 'jti': self._random.random()})}.x"
+        with self._lock:
+            self._tokens[token] = expires
+        return token
+
+    def token_valid(self, authorization: Optional[str]) -> bool:
+        if not self.config.require_auth:
+            return True
+        token = (authorization or "").removeprefix("Bearer ")
+        return self._tokens.get(token, 0) > time.time()
+
+    def sign(self, path: str) -> str:
+        expires = int(time.time()) + self.config.presign_ttl
+        signature = hashlib.sha256(f"{path}{expires}".encode()).hexdigest()[:16]
+        return f"{self.url}{path}?expires={expires}&signature={signature}"
+
+    def signature_valid(self, path: str, query: dict) -> bool:
+        try:
+            expires = int(query["expires"][0])
+            signature = query["signature"][0]
+        except (KeyError, ValueError):
+            return False
+        expected = hashlib.sha256(f"{path}{expires}".encode()).hexdigest()[:16]
+        return signature == expected and expires > time.time()
+
+    def scenario_items(self) -> list:
+        return [
+            {
+                "id": scenario_id,
+                "name": f"scenario {scenario_id}",
+                "status": "quality_checked",
+                "last_modified": self._modified.get(scenario_id, "2025-01-01T00:00:00"),
+            }
+            for scenario_id in range(1, self.config.scenarios + 1)
+        ]
+
+    def layer_names(self, scenario_id: int) -> list:
+        return [
+            f"scenario_{scenario_id}_layer_{i}.tif"
+            for i in range(self.config.layers_per_scenario)
+        ]
+
+    def metadata_xlsx(self, scenario_ids: list) -> bytes:
+        """metadata excel met dezelfde opbouw als de echte export: titel, kolomnamen, twee rijen toelichting en
+        dan de scenarios (lezen met `header=1, skiprows=[2, 3]`)"""
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.title = "scenarios"
+        sheet.append(["Metadata export"])
+        sheet.append(["Scenario ID", "Naam", "Doorbraaklocatie"])
+        sheet.append(["", "", ""])
+        sheet.append(["int", "str", "str"])
+        for i in scenario_ids:
+            sheet.append([i, f"scenario {i}", f"breach {i}"])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        return buffer.getvalue()
+
+    def export_zip(self, export: dict) -> bytes:
+        """zip van een bulk-export zoals de echte: de metadata excel en een map `scenario_<id>/` per scenario"""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zf:
+            zf.writestr("metadata.xlsx", self.metadata_xlsx(export["scenario_ids"]))
+            for scenario_id in export["scenario_ids"]:
+                for name in self.layer_names(scenario_id):
+                    zf.writestr(f"scenario_{scenario_id}/{name}", self._payload)
+        return buffer.getvalue()
+
+
+def _b64(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+
+def _iso(timestamp: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    ldo: StandInLDO = None
+
+    def log_message(self, *args):
+        pass
+
+    # antwoorden
+    def send_json(self, data, status: int = 200, headers: Optional[dict] = None):
+        body = json.dumps(data).encode()
+        if self.command == "GET" and status == 200 and self.ldo.config.etags:
+            # conditionele requests, voor de http cache
+            etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+            headers = dict(headers or {}, ETag=etag)
+            if self.headers.get("If-None-Match") == etag:
+                self.ldo.count("not_modified")
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_bytes(self, payload: bytes, content_type: str, etag: Optional[str] = None):
+        """stuur een bestand, met Range ondersteuning, ETag/If-None-Match en de ingestelde bandbreedte"""
+        if etag is not None and self.headers.get("If-None-Match") == etag:
+            self.ldo.count("not_modified")
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start = 0
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if match:
+            start = int(match[1])
+            if start >= len(payload):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(payload)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(payload) - 1}/{len(payload)}"
+            )
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(payload) - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        view = memoryview(payload)[start:]
+        block = 256 * 1024
+        bandwidth = self.ldo.config.bandwidth
+        begin = time.perf_counter()
+        for offset in range(0, len(view), block):
+            self.wfile.write(view[offset : offset + block])
+            if bandwidth:
+                ahead = (offset + block) / bandwidth - (time.perf_counter() - begin)
+                if ahead > 0:
+                    time.sleep(ahead)
+        self.ldo.count("bytes", len(view))
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    # verdeling
+    def handle_api(self, method: str):
+        body = self.read_body()
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        ldo = self.ldo
+        ldo.count("requests")
+
+        if url.path.startswith(BLOB_PREFIX):
+            return self.blob(url.path, query)
+
+        if ldo.config.latency:
+            time.sleep(ldo.config.latency)
+        status = ldo.inject()
+        if status == 429:
+            ldo.count("throttled")
+            return self.send_json(
+                {"detail": "Too many requests"},
+                429,
+                {"Retry-After": str(ldo.config.retry_after)},
+            )
+        if status == 500:
+            ldo.count("failed")
+            return self.send_json({"detail": "Internal server error"}, 500)
+
+        if method == "POST" and url.path == "/auth/v1/token/":
+            return self.send_json({"access": ldo.new_token(), "refresh": "-"})
+        if not ldo.token_valid(self.headers.get("Authorization")):
+            return self.send_json({"detail": "Token is invalid or expired"}, 401)
+
+        for pattern, name in _ROUTES:
+            match = re.fullmatch(pattern, url.path)
+            if match and name.startswith(method.lower() + "_"):
+                return getattr(self, name)(*match.groups(), query=query, body=body)
+        return self.send_json({"detail": "Not found."}, 404)
+
+    def do_GET(self):
+        self.handle_api("GET")
+
+    def do_POST(self):
+        self.handle_api("POST")
+
+    def do_PATCH(self):
+        self.handle_api("PATCH")
+
+    def do_DELETE(self):
+        self.handle_api("DELETE")
+
+    # scenarios
+    def get_scenarios(self, query: dict, body: bytes):
+        limit = int(query.get("limit", [100])[0])
+        offset = int(query.get("offset", [0])[0])
+        items = self.ldo.scenario_items()
+        if "last_modified__gte" in query:
+            since = query["last_modified__gte"][0][:19]
+            items = [item for item in items if item["last_modified"] >= since]
+        self.send_json(
+            {
+                "items": items[offset : offset + limit],
+                "total": len(items),
+                "limit": limit,
+                "offset": offset,
+            }
+        )
+
+    def get_scenario(self, scenario_id: str, query: dict, body: bytes):
+        scenario_id = int(scenario_id)
+        if not 1 <= scenario_id <= self.ldo.config.scenarios:
+            return self.send_json({"detail": "Not found."}, 404)
+        files = {name: {} for name in self.ldo.layer_names(scenario_id)}
+        self.send_json({"id": scenario_id, "files": files})
+
+    def get_file_download(self, scenario_id: str, name: str, query: dict, body: bytes):
+        if name not in self.ldo.layer_names(int(scenario_id)):
+            return self.send_json({"detail": "Not found."}, 404)
+        self.send_json({"url": self.ldo.sign(f"{BLOB_PREFIX}{scenario_id}/{name}")})
+
+    def get_external_processings(self, scenario_id: str, query: dict, body: bytes):
+        item = {
+            "id": int(scenario_id),
+            "status": "finished",
+            "scenario_id": int(scenario_id),
+            "config": {"model": "stand-in"},
+            "meta_data": {"breach": f"breach {scenario_id}"},
+            "raster_types": ["max_waterdepth", "arrival_time"],
+            "errors": [],
+        }
+        self.send_json({"items": [item]})
+
+    def post_scenarios_export(self, query: dict, body: bytes):
+        ids = json.loads(body or b"{}").get("id", [])
+        self.send_bytes(
+            self.ldo.metadata_xlsx(ids),
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+
+    # bulk exports
+    def post_bulk_exports(self, query: dict, body: bytes):
+        data = json.loads(body)
+        export_id = next(self.ldo._export_ids)
+        export = dict(
+            data, id=export_id, status="created", scenario_ids=[], files=[], errors=[]
+        )
+        self.ldo._exports[export_id] = export
+        self.send_json(export, 201)
+
+    def get_bulk_exports(self, query: dict, body: bytes):
+        limit = int(query.get("limit", [100])[0])
+        offset = int(query.get("offset", [0])[0])
+        items = list(self.ldo._exports.values())
+        self.send_json(
+            {
+                "items": [_public(e) for e in items[offset : offset + limit]],
+                "total": len(items),
+                "limit": limit,
+                "offset": offset,
+            }
+        )
+
+    def get_bulk_export(self, export_id: str, query: dict, body: bytes):
+        export = self.ldo._exports.get(int(export_id))
+        if export is None:
+            return self.send_json({"detail": "Not found."}, 404)
+        if export["status"] == "submitted" and time.time() >= export["ready_at"]:
+            export["status"] = "finished"
+            export["files"] = [f"export_{export_id}.zip"]
+        self.send_json(_public(export))
+
+    def patch_bulk_export(self, export_id: str, query: dict, body: bytes):
+        export = self.ldo._exports.get(int(export_id))
+        if export is None:
+            return self.send_json({"detail": "Not found."}, 404)
+        data = json.loads(body)
+        if len(data.get("scenario_ids", [])) > self.ldo.config.max_bulk_size:
+            return self.send_json(
+                {
+                    "detail": f"Too many scenarios, maximum is {self.ldo.config.max_bulk_size}"
+                },
+                400,
+            )
+        if data.get("status") == "submitted":
+            export["ready_at"] = time.time() + self.ldo.config.export_seconds
+        export.update(data)
+        self.send_json(_public(export))
+
+    def delete_bulk_export(self, export_id: str, query: dict, body: bytes):
+        if self.ldo._exports.pop(int(export_id), None) is None:
+            return self.send_json({"detail": "Not found."}, 404)
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def delete_bulk_export_errors(self, export_id: str, query: dict, body: bytes):
+        export = self.ldo._exports.get(int(export_id))
+        if export is None:
+            return self.send_json({"detail": "Not found."}, 404)
+        export["errors"] = []
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def get_bulk_export_download(self, export_id: str, query: dict, body: bytes):
+        export = self.ldo._exports.get(int(export_id))
+        if export is None or export["status"] != "finished":
+            return self.send_json({"detail": "Not found."}, 404)
+        self.send_json({"url": self.ldo.sign(f"{BLOB_PREFIX}export/{export_id}")})
+
+    # object storage
+    def blob(self, path: str, query: dict):
+        if not self.ldo.signature_valid(path, query):
+            return self.send_json({"detail": "Request has expired"}, 403)
+        match = re.fullmatch(rf"{BLOB_PREFIX}export/(\d+)", path)
+        if match:
+            payload = self.ldo.export_zip(self.ldo._exports[int(match[1])])
+            return self.send_bytes(payload, "application/zip")
+        scenario_id = int(path[len(BLOB_PREFIX) :].split("/")[0])
+        payload, etag = self.ldo.layer_payload(scenario_id)
+        self.send_bytes(payload, "image/tiff", etag=etag)
+
+
+def _public(export: dict) -> dict:
+    return {key: value for key, value in export.items() if key != "ready_at"}
+
+
+_ROUTES = [
+    (r"/api/v1/scenarios", "get_scenarios"),
+    (r"/api/v1/scenarios/export", "post_scenarios_export"),
+    (r"/api/v1/scenarios/(\d+)", "get_scenario"),
+    (r"/api/v1/scenarios/(\d+)/files/(.+)/download", "get_file_download"),
+    (r"/api/v1/scenarios/(\d+)/external-processings", "get_external_processings"),
+    (r"/api/v1/bulk-exports", "post_bulk_exports"),
+    (r"/api/v1/bulk-exports", "get_bulk_exports"),
+    (r"/api/v1/bulk-exports/(\d+)", "get_bulk_export"),
+    (r"/api/v1/bulk-exports/(\d+)", "patch_bulk_export"),
+    (r"/api/v1/bulk-exports/(\d+)", "delete_bulk_export"),
+    (r"/api/v1/bulk-exports/(\d+)/errors", "delete_bulk_export_errors"),
+    (
+        r"/api/v1/bulk-exports/(\d+)/files/export_\d+\.zip/download",
+        "get_bulk_export_download",
+    ),
+]
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    """command line opties voor de `StandInConfig`, gedeeld met de benchmarks"""
+    parser.add_argument("--scenarios", type=int, default=StandInConfig.scenarios)
+    parser.add_argument("--layers", type=int, default=StandInConfig.layers_per_scenario)
+    parser.add_argument("--file-kb", type=int, default=StandInConfig.file_size // 1024)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--bandwidth-mbps", type=float, default=None)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    parser.add_argument(
+        "--export-seconds", type=float, default=StandInConfig.export_seconds
+    )
+    parser.add_argument("--token-ttl", type=int, default=StandInConfig.token_ttl)
+    parser.add_argument("--presign-ttl", type=int, default=StandInConfig.presign_ttl)
+
+
+def config_from_arguments(args: argparse.Namespace) -> StandInConfig:
+    return StandInConfig(
+        scenarios=args.scenarios,
+        layers_per_scenario=args.layers,
+        file_size=args.file_kb * 1024,
+        latency=args.latency_ms / 1000,
+        bandwidth=args.bandwidth_mbps * 1e6 / 8 if args.bandwidth_mbps else None,
+        failure_rate=args.failure_rate,
+        throttle_rate=args.throttle_rate,
+        export_seconds=args.export_seconds,
+        token_ttl=args.token_ttl,
+        presign_ttl=args.presign_ttl,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("# DOEL")[-1])
+    parser.add_argument("--port", type=int, default=8000)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    ldo = StandInLDO(config_from_arguments(args), port=args.port)
+    print(f"stand-in LDO op {ldo.start()}, stop met ctrl+c")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        ldo.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,17 @@ Jun, 2025
 import logging
 from pathlib import Path
 import dotenv
+from LDO_API import export_LDO
+from LDO_API.catalog_LDO import LDOCatalog
+from LDO_API.metrics_LDO import metrics
+from LDO_API.tracing_LDO import tracer
 from LDO_API.update_local_LDO_custom import (
-    get_layer_names_from_scenario,
+    iter_layer_names_from_scenario,
     haal_scenarios_op,
+    haal_gewijzigde_scenarios_op,
     haal_token_op,
     export_uit_LDO_custom,
+    rond_delta_sync_af,
 )
 
 """
@@ -70,6 +76,10 @@ def main():
 
     # geef de scenarios op om te exporteren:
     export_scenarios = [345, 346]
+    # True: negeer export_scenarios en haal alleen op wat sinds de vorige run in het LDO is gewijzigd
+    delta_sync = False
+    # True: bewaar de antwoorden van de alleen-lezen API calls, een volgende run krijgt dan vooral goedkope 304's
+    http_cache = False
 
     # zet de LDO api key in de .env file
     if dotenv.load_dotenv():
@@ -78,35 +88,63 @@ def main():
         TENANT = int(environmental_variables.get("TENANT", 1))
 
     headers = haal_token_op(LDO_api_key, tenant=TENANT)
+    if http_cache:
+        export_LDO.enable_http_cache(current_dir / "ldo_http_cache.sqlite")
 
-    logger.info("haal scenarios op")
-    beschikbare_scenario_ids = haal_scenarios_op(
-        maximum=12_000, headers=headers
-    )  # misschien later meer dan 10_000?
+    # lokale catalogus: bekende lagen en gedownloade bestanden worden niet opnieuw opgehaald
+    catalog = LDOCatalog(current_dir / "ldo_catalog.sqlite")
 
-    logger.info("Vergelijk scenarios")
-    overlap_scenarios = list(
-        set(export_scenarios).intersection(beschikbare_scenario_ids)
-    )
-    niet_gevonden_scenarios = list(
-        set(export_scenarios).difference(beschikbare_scenario_ids)
-    )
-    if len(niet_gevonden_scenarios) > 0:
-        logger.warning(
-            f"{len(niet_gevonden_scenarios)} scenarios niet gevonden in LDO: {niet_gevonden_scenarios}"
+    if delta_sync:
+        logger.info("haal gewijzigde scenarios op")
+        overlap_scenarios = haal_gewijzigde_scenarios_op(headers, catalog)
+    else:
+        logger.info("haal scenarios op")
+        beschikbare_scenario_ids = haal_scenarios_op(
+            maximum=None, headers=headers, catalog=catalog
         )
 
-    df_layer_names = get_layer_names_from_scenario(
+        logger.info("Vergelijk scenarios")
+        overlap_scenarios = list(
+            set(export_scenarios).intersection(beschikbare_scenario_ids)
+        )
+        niet_gevonden_scenarios = list(
+            set(export_scenarios).difference(beschikbare_scenario_ids)
+        )
+        if len(niet_gevonden_scenarios) > 0:
+            logger.warning(
+                f"{len(niet_gevonden_scenarios)} scenarios niet gevonden in LDO: {niet_gevonden_scenarios}"
+            )
+
+    # de bestandsnamen worden gelijktijdig opgehaald en gaan direct door naar de downloads
+    layer_names = iter_layer_names_from_scenario(
         overlap_scenarios,
         headers=headers,
+        catalog=catalog,
     )
 
     logger.info("Start export scenarios")
     lst_zips_nieuwe_export = export_uit_LDO_custom(
-        df_layer_names=df_layer_names,
+        df_layer_names=layer_names,
         work_dir=current_dir,
         headers=headers,
+        stream_to_zip=False,  # True: direct in de zip, zonder eerst downloaded_tiffs/
+        catalog=catalog,
+    )
+    if delta_sync:
+        openstaand = rond_delta_sync_af(catalog, overlap_scenarios)
+        if len(openstaand) > 0:
+            logger.warning(
+                f"{len(openstaand)} scenarios niet volledig gesynchroniseerd, worden de volgende run opnieuw geprobeerd"
+            )
+    catalog.close()
+
+    # overzicht van alle http requests van deze run (json en Prometheus text-file)
+    report = metrics.write_report(
+        current_dir / "ldo_run_report.json", current_dir / "ldo_run_report.prom"
     )
+    logger.info(f"http requests: {report['totals']}")
+    # spans (LDO_TRACE) wegschrijven en de sinks sluiten
+    tracer.close()
     lst_zips_nieuwe_export
 
 
@@ -3,10 +3,16 @@ gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
 Jun, 2025
 """
 
+import logging
+from pathlib import Path
 import pandas as pd
 import dotenv
 from LDO_API.update_local_LDO_custom import haal_scenarios_op, haal_token_op
-from LDO_API import get_ssm
+from LDO_API.export_SSM_metadata import SSM_MAX_AGE, haal_ssm_op
+from LDO_API import export_LDO
+from LDO_API.catalog_LDO import LDOCatalog
+from LDO_API.metrics_LDO import metrics
+from LDO_API.tracing_LDO import tracer
 
 """
 Stappen plan voor het aanmaken van een api key.
@@ -50,6 +56,13 @@ meer informatie staat onderaan of op de docs: https://ldo.overstromingsinformati
   ...
 """
 if __name__ == "__main__":
+    logging.basicConfig(
+        filename=Path.cwd() / "log_ssm.txt",
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    logger = logging.getLogger()
+
     # haal de API key op uit de .env file
     if dotenv.load_dotenv():
         environmental_variables = dotenv.dotenv_values()
@@ -58,11 +71,33 @@ if __name__ == "__main__":
     # LDO_api_key = "abcd"
     TENANT: int = 1  # 0, 1, 2 ...
     headers = haal_token_op(LDO_api_key, tenant=TENANT)
+    # optioneel: bewaar de antwoorden van de alleen-lezen API calls voor een volgende run
+    http_cache = False
+    if http_cache:
+        export_LDO.enable_http_cache(Path("ldo_http_cache.sqlite"))
 
-    maximum = 10_000
-    beschikbare_scenario_ids = haal_scenarios_op(maximum, headers)
+    catalog = LDOCatalog(Path("ldo_catalog.sqlite"))
+    # ssm metadata uit de catalogus die jonger is dan dit (seconden) wordt niet opnieuw opgehaald, 0: alles ophalen
+    catalog_max_age = SSM_MAX_AGE
+    maximum = None  # None: alle scenarios, het totaal komt van de server
+    beschikbare_scenario_ids = haal_scenarios_op(maximum, headers, catalog=catalog)
 
-    lst_json = [get_ssm(scenario, headers) for scenario in beschikbare_scenario_ids]
+    # resultaten worden tussentijds weggeschreven, na een afgebroken run gaat het verder waar het was.
+    # Het voortgangsbestand wordt verwijderd als alles gelukt is.
+    lst_json, mislukt = haal_ssm_op(
+        beschikbare_scenario_ids,
+        headers,
+        max_workers=16,
+        output_file=Path("metadata_ssm_voortgang.jsonl"),
+        catalog=catalog,
+        max_age=catalog_max_age,
+    )
+    catalog.close()
+    if len(mislukt) > 0:
+        logger.warning(
+            f"{len(mislukt)} scenarios zonder ssm metadata, zie metadata_ssm_mislukt.csv"
+        )
+        pd.Series(mislukt, name="error").to_csv("metadata_ssm_mislukt.csv")
     df_metadata = pd.DataFrame(lst_json)
     df_metadata.set_index("scenario_id", inplace=True)
     df_metadata.sort_index(inplace=True)
@@ -71,3 +106,5 @@ if __name__ == "__main__":
     filled_scenarios = df_metadata.dropna(subset=["raster_types"])
     df_metadata.to_excel("metadata_ssm.xlsx")
     filled_scenarios.to_excel("metadata_ssm_filled.xlsx")
+    metrics.write_report(Path("ldo_run_report.json"), Path("ldo_run_report.prom"))
+    tracer.close()
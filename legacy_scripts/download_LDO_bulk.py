@@ -6,6 +6,8 @@ Jun, 2025
 import logging
 from pathlib import Path
 import dotenv
+from LDO_API.metrics_LDO import metrics
+from LDO_API.tracing_LDO import tracer
 from LDO_API.update_local_bulk_LDO import (
     haal_scenarios_op,
     haal_token_op,
@@ -81,9 +83,7 @@ if __name__ == "__main__":
     headers = haal_token_op(LDO_api_key, tenant=TENANT)
 
     logger.info("haal scenarios op")
-    beschikbare_scenario_ids = haal_scenarios_op(
-        maximum=10_000, headers=headers
-    )  # misschien later meer dan 10_000?
+    beschikbare_scenario_ids = haal_scenarios_op(maximum=None, headers=headers)
 
     logger.info("Vergelijk scenarios")
     overlap_scenarios = list(
@@ -102,3 +102,9 @@ if __name__ == "__main__":
         nieuwe_scenarios=overlap_scenarios,
         headers=headers,
     )
+
+    # overzicht van alle http requests (json en Prometheus text-file) en de spans (LDO_TRACE) van deze run
+    metrics.write_report(
+        current_dir / "ldo_run_report.json", current_dir / "ldo_run_report.prom"
+    )
+    tracer.close()
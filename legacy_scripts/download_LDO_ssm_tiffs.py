@@ -11,6 +11,8 @@ from LDO_API.export_LDO import (
     get_file_url,
     download_tif,
 )
+from LDO_API.metrics_LDO import metrics
+from LDO_API.tracing_LDO import tracer
 from LDO_API.update_local_bulk_LDO import haal_scenarios_op, haal_token_op
 import pandas as pd
 import dotenv
@@ -105,7 +107,7 @@ if __name__ == "__main__":
     headers = haal_token_op(LDO_api_key, tenant=TENANT)
 
     logger.info("haal scenarios op")
-    beschikbare_scenario_ids = haal_scenarios_op(maximum=10_000, headers=headers)
+    beschikbare_scenario_ids = haal_scenarios_op(maximum=None, headers=headers)
 
     # geef de scenarios op om te exporteren:
     export_scenarios = [345, 346]
@@ -129,3 +131,9 @@ if __name__ == "__main__":
         current_dir,
         headers=headers,
     )
+
+    # overzicht van alle http requests (json en Prometheus text-file) en de spans (LDO_TRACE) van deze run
+    metrics.write_report(
+        current_dir / "ldo_run_report.json", current_dir / "ldo_run_report.prom"
+    )
+    tracer.close()
@@ -0,0 +1,35 @@
+"""
+gemaakt voor LIWO door David Haasnoot (d.haasnoot@hkv.nl)
+Oktober, 2026
+
+# DOEL
+Gedeelde fixtures: de lokale stand-in van de LDO server (`benchmarks/ldo_standin.py`).
+"""
+
+import pytest
+from ldo_standin import StandInConfig, StandInLDO
+
+from LDO_API import export_LDO
+
+
+@pytest.fixture
+def standin(monkeypatch):
+    """start een stand-in server met de gegeven instellingen en laat `export_LDO` ernaar wijzen
+
+    ```python
+    def test_iets(standin):
+        ldo = standin(scenarios=10, latency=0.01)
+    ```
+    """
+    servers = []
+
+    def start(**config) -> StandInLDO:
+        ldo = StandInLDO(StandInConfig(**config))
+        ldo.start()
+        servers.append(ldo)
+        monkeypatch.setattr(export_LDO, "server", ldo.url)
+        return ldo
+
+    yield start
+    for ldo in servers:
+        ldo.stop()
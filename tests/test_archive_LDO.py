@@ -0,0 +1,240 @@
+import contextlib
+import io
+import zipfile
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+from LDO_API import archive_LDO
+from LDO_API.metadata_LDO import (
+    exporteer_metadata_excel,
+    lees_metadata,
+    lees_metadata_ids,
+    metadata_sidecar,
+)
+
+
+def maak_archief(path, ids, tifs=False):
+    """gecombineerde zip met (met `tifs` eerst de scenarios en daarna) de metadata excel, zoals een bestaand archief"""
+    df = pd.DataFrame(
+        {"Naam": [f"scenario {i}" for i in ids], "Doorbraak": [i * 1.5 for i in ids]},
+        index=pd.Index(ids, name="Scenario ID"),
+    )
+    excel = path.parent / "metadata.xlsx"
+    df.to_excel(excel)
+    with zipfile.ZipFile(path, "w") as archive:
+        for i in ids if tifs else []:
+            archive.writestr(f"scenario_{i}/max_waterdepth.tif", bytes(1000 * i))
+        archive.write(excel, archive_LDO.METADATA_NAME)
+    return df
+
+
+def test_vergelijken_schrijft_niets(tmp_path):
+    archive = tmp_path / "LDO.zip"
+    df = maak_archief(archive, [1, 2, 3])
+
+    verwijderd, nieuw, df_current = archive_LDO.vergelijke_nieuwe_en_huidige(
+        archive, [2, 3, 4]
+    )
+    assert verwijderd == [1] and nieuw == [4]
+    assert not metadata_sidecar(archive).exists()
+    pd.testing.assert_frame_equal(df_current, df)
+
+    # na het omzetten komt hetzelfde DataFrame uit de metadata map
+    assert archive_LDO.migreer_metadata(archive) == metadata_sidecar(archive)
+    df_sidecar = lees_metadata(metadata_sidecar(archive))
+    assert list(df_sidecar.columns) == list(df.columns)
+    assert df_sidecar.index.name == "Scenario ID"
+    assert df_sidecar.loc[2, "Naam"] == "scenario 2"
+
+
+def test_vergelijken_leest_alleen_ids(tmp_path, monkeypatch):
+    archive = tmp_path / "LDO.zip"
+    maak_archief(archive, [1, 2, 3])
+    archive_LDO.migreer_metadata(archive)
+    niet_lezen = mock.Mock(side_effect=AssertionError("metadata volledig gelezen"))
+    monkeypatch.setattr(archive_LDO, "lees_metadata", niet_lezen)
+    monkeypatch.setattr(archive_LDO, "lees_metadata_excel", niet_lezen)
+
+    verwijderd, nieuw, df_current = archive_LDO.vergelijke_nieuwe_en_huidige(
+        archive, [2, 3, 4]
+    )
+    assert verwijderd == [1] and nieuw == [4]
+    assert df_current is None
+
+
+def test_excel_export_houdt_naam_van_index(tmp_path):
+    archive = tmp_path / "LDO.zip"
+    maak_archief(archive, [1, 2])
+    sidecar = archive_LDO.migreer_metadata(archive)
+
+    assert lees_metadata(sidecar).index.name == "Scenario ID"
+    exporteer_metadata_excel(sidecar, tmp_path / "export.xlsx")
+    assert pd.read_excel(tmp_path / "export.xlsx").columns[0] == "Scenario ID"
+
+
+def maak_export(path, ids):
+    """zip van een nieuwe export: een map per scenario en de metadata excel met kop en toelichting"""
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Metadata export"])
+    sheet.append(["Scenario ID", "Naam", "Doorbraak"])
+    sheet.append(["", "", ""])
+    sheet.append(["int", "str", "float"])
+    for i in ids:
+        sheet.append([i, f"scenario {i}", i * 1.5])
+    excel = path.parent / "export.xlsx"
+    workbook.save(excel)
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.write(excel, "metadata.xlsx")
+        for i in ids:
+            archive.writestr(f"scenario_{i}/max_waterdepth.tif", bytes(1000 * i))
+    return path
+
+
+def voeg_samen(tmp_path, huidige_ids, nieuwe_ids, beschikbaar, **kwargs):
+    archive = tmp_path / "LDO.zip"
+    maak_archief(archive, huidige_ids, tifs=True)
+    verwijderd, _, df_current = archive_LDO.vergelijke_nieuwe_en_huidige(
+        archive, beschikbaar
+    )
+    export = maak_export(tmp_path / "export_1.zip", nieuwe_ids)
+    inode = archive.stat().st_ino
+    archive_LDO.voeg_zips_samen_verwijder_ouder(
+        [export], verwijderd, df_current, archive, archive, **kwargs
+    )
+    return archive, inode
+
+
+def controleer(archive, ids, excel_in_zip=False):
+    with zipfile.ZipFile(archive) as zf:
+        assert zf.testzip() is None
+        tifs = [name for name in zf.namelist() if name.endswith(".tif")]
+        assert tifs == [f"scenario_{i}/max_waterdepth.tif" for i in ids]
+        assert [name for name in zf.namelist() if name.endswith(".xlsx")] == (
+            [archive_LDO.METADATA_NAME] if excel_in_zip else []
+        )
+        assert zf.read(tifs[-1]) == bytes(1000 * ids[-1])
+    assert sorted(lees_metadata_ids(metadata_sidecar(archive))) == ids
+    if excel_in_zip:
+        assert list(archive_LDO.lees_metadata_excel(archive).index) == ids
+
+
+def test_zip_wordt_zonder_verwijderingen_aangevuld(tmp_path):
+    archive, inode = voeg_samen(tmp_path, [1, 2], [3], [1, 2, 3], excel_in_zip=True)
+    assert archive.stat().st_ino == inode  # niet herschreven
+    controleer(archive, [1, 2, 3], excel_in_zip=True)
+
+    # ook een tweede keer, nu staat de geschreven metadata excel achteraan
+    export = maak_export(tmp_path / "export_2.zip", [4])
+    *_, df_current = archive_LDO.vergelijke_nieuwe_en_huidige(archive, [1, 2, 3, 4])
+    archive_LDO.voeg_zips_samen_verwijder_ouder(
+        [export], [], df_current, archive, archive, excel_in_zip=True
+    )
+    assert archive.stat().st_ino == inode
+    controleer(archive, [1, 2, 3, 4], excel_in_zip=True)
+
+    # standaard zonder excel: de oude wordt weggehaald, de metadata staat in de metadata map
+    export = maak_export(tmp_path / "export_3.zip", [5])
+    archive_LDO.voeg_zips_samen_verwijder_ouder([export], [], None, archive, archive)
+    assert archive.stat().st_ino == inode
+    controleer(archive, [1, 2, 3, 4, 5])
+
+
+def test_zip_wordt_herschreven_bij_verwijderingen(tmp_path):
+    archive, inode = voeg_samen(tmp_path, [1, 2], [3], [2, 3])
+    assert archive.stat().st_ino != inode
+    controleer(archive, [2, 3])
+
+
+def test_zip_met_excel_vooraan_wordt_herschreven(tmp_path):
+    archive = tmp_path / "LDO.zip"
+    maak_archief(archive, [1])
+    with zipfile.ZipFile(archive, "a") as zf:
+        zf.writestr("scenario_1/max_waterdepth.tif", bytes(1000))
+    *_, df_current = archive_LDO.vergelijke_nieuwe_en_huidige(archive, [1, 2])
+    export = maak_export(tmp_path / "export_1.zip", [2])
+    inode = archive.stat().st_ino
+    archive_LDO.voeg_zips_samen_verwijder_ouder(
+        [export], [], df_current, archive, archive
+    )
+    assert archive.stat().st_ino != inode
+    controleer(archive, [1, 2])
+
+
+def maak_bron(path):
+    data = {
+        "scenario_1/": b"",
+        "scenario_1/max_waterdepth.tif": bytes(range(256)) * 2000,
+        "scenario_1/arrival_time.tif": b"x" * 5000,
+    }
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, payload in data.items():
+            archive.writestr(name, payload)
+        archive.writestr(
+            "scenario_1/stored.txt", b"niet gecomprimeerd", zipfile.ZIP_STORED
+        )
+    data["scenario_1/stored.txt"] = b"niet gecomprimeerd"
+    return data
+
+
+def kopieer_alles(tmp_path, tijdens_kopieren=contextlib.nullcontext()):
+    data = maak_bron(tmp_path / "bron.zip")
+    with (
+        zipfile.ZipFile(tmp_path / "bron.zip") as input_archive,
+        zipfile.ZipFile(tmp_path / "doel.zip", "w") as output_archive,
+    ):
+        offsets = [item.header_offset for item in input_archive.infolist()]
+        with tijdens_kopieren:
+            for item in input_archive.infolist():
+                archive_LDO.kopieer_entry(input_archive, output_archive, item)
+        bron = {item.filename: item for item in input_archive.infolist()}
+        # de ZipInfo van de bron is niet aangepast
+        assert [item.header_offset for item in bron.values()] == offsets
+
+    with zipfile.ZipFile(tmp_path / "doel.zip") as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == list(bron)
+        for item in archive.infolist():
+            assert archive.read(item) == data[item.filename]
+            assert item.CRC == bron[item.filename].CRC
+            assert item.compress_type == bron[item.filename].compress_type
+
+
+def test_kopieer_entry_zonder_uitpakken(tmp_path):
+    niet_uitpakken = mock.patch.object(
+        zipfile.ZipFile, "open", side_effect=AssertionError("entry uitgepakt")
+    )
+    kopieer_alles(tmp_path, niet_uitpakken)
+
+
+def test_kopieer_entry_zonder_interne_attributen(tmp_path, monkeypatch):
+    # een zipfile versie zonder de verwachte interne attributen: uitpakken en opnieuw schrijven
+    monkeypatch.setattr(archive_LDO, "_kan_ruw_kopieren", lambda *archives: False)
+    kopieer_alles(tmp_path)
+
+
+def test_add_direct_haalt_onvolledige_entry_weg(tmp_path):
+    path = tmp_path / "stream.zip"
+
+    def onderbroken(dst):
+        dst.write(b"x" * 5000)
+        raise ConnectionError("onderbroken")
+
+    with archive_LDO.ZipStreamWriter(path) as writer:
+        assert writer.kan_direct
+        writer.add("1/klein.tif", io.BytesIO(b"klein"))
+        with pytest.raises(ConnectionError):
+            writer.add_direct("1/groot.tif", onderbroken, 5000)
+        # opnieuw, zoals `download_with_fresh_url` doet
+        assert (
+            writer.add_direct("1/groot.tif", lambda dst: dst.write(b"y" * 6000)) == 6000
+        )
+
+    with zipfile.ZipFile(path) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ["1/", "1/klein.tif", "1/groot.tif"]
+        assert zf.read("1/groot.tif") == b"y" * 6000
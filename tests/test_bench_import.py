@@ -0,0 +1,33 @@
+import sys
+
+import bench_import
+import pytest
+
+
+def draai(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["bench_import.py", "--repeat", "1", *args])
+    bench_import.main()
+
+
+def test_lichte_import_slaagt(monkeypatch, capsys):
+    draai(monkeypatch, "--modules", "LDO_API.token_LDO")
+    assert "REGRESSIE" not in capsys.readouterr().out
+
+
+def test_zware_import_faalt_zonder_budget(monkeypatch, capsys):
+    # een module die een zwaar package laadt (hier het package zelf), zonder `--max-ms`
+    with pytest.raises(SystemExit) as exit_info:
+        draai(monkeypatch, "--modules", "tqdm")
+    assert exit_info.value.code == 1
+    assert "REGRESSIE: tqdm importeert tqdm" in capsys.readouterr().out
+
+
+def test_sessie_bij_import_faalt(monkeypatch, tmp_path, capsys):
+    (tmp_path / "gretige_module.py").write_text(
+        "from LDO_API import export_LDO\nexport_LDO._session.headers\n"
+    )
+    monkeypatch.setenv("PYTHONPATH", str(tmp_path))
+    with pytest.raises(SystemExit) as exit_info:
+        draai(monkeypatch, "--modules", "gretige_module")
+    assert exit_info.value.code == 1
+    assert "gretige_module maakt bij import een sessie aan" in capsys.readouterr().out
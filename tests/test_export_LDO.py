@@ -0,0 +1,245 @@
+import io
+from unittest import mock
+
+import pandas as pd
+import pytest
+import requests
+
+from LDO_API import export_LDO
+from LDO_API.token_LDO import haal_token_op
+
+
+def lees_ids(fname):
+    df = pd.read_excel(fname, header=1, skiprows=[2, 3], index_col=0)
+    return list(df.index)
+
+
+def test_metadata_standaard_in_een_request(standin, tmp_path):
+    ldo = standin(scenarios=12)
+    fname = tmp_path / "metadata.xlsx"
+    ids = list(range(1, 13))
+
+    assert export_LDO.get_all_metadata(ids, fname, haal_token_op("key", 1)) is None
+    assert ldo.stats["requests"] == 2  # token en één export
+    assert lees_ids(fname) == ids
+
+
+def test_metadata_in_batches_gaat_verder_na_fout(standin, tmp_path, monkeypatch):
+    standin(scenarios=12)
+    headers = haal_token_op("key", 1)
+    fname = tmp_path / "metadata.xlsx"
+    ids = list(range(1, 13))
+    post = export_LDO._post_metadata_export
+    batches = []
+    mislukt = [11]
+
+    def flaky(scenario_ids, fname, headers):
+        batches.append(scenario_ids)
+        if mislukt[0] in scenario_ids:
+            return 500, "onderbroken"
+        return post(scenario_ids, fname, headers)
+
+    monkeypatch.setattr(export_LDO, "_post_metadata_export", flaky)
+    monkeypatch.setattr(export_LDO.time, "sleep", lambda seconds: None)
+
+    with pytest.warns(UserWarning, match="batch 2"):
+        error = export_LDO.get_all_metadata(
+            ids, fname, headers, batch_size=5, max_attempts=1
+        )
+    assert error == (500, "onderbroken")
+    [parts_dir] = tmp_path.glob("metadata.xlsx.parts-*")
+    assert len(list(parts_dir.iterdir())) == 2
+
+    # een andere lijst gebruikt de batches niet
+    batches.clear()
+    mislukt[0] = None
+    assert (
+        export_LDO.get_all_metadata(ids[:11], tmp_path / "ander.xlsx", headers, 5)
+        is None
+    )
+    assert len(batches) == 3
+
+    batches.clear()
+    assert export_LDO.get_all_metadata(ids, fname, headers, batch_size=5) is None
+    assert batches == [[11, 12]]
+    assert lees_ids(fname) == ids
+    assert not parts_dir.exists()
+
+
+def test_download_hervat_part_bestand_met_range(standin, tmp_path):
+    ldo = standin(scenarios=1, layers_per_scenario=1, file_size=300_000)
+    headers = haal_token_op("key", 1)
+    [layer] = export_LDO.get_layer_names(1, headers)
+    status_code, url = export_LDO.get_file_url(1, layer, headers)
+    assert status_code == 200
+    payload, etag = ldo.layer_payload(1)
+
+    fname = tmp_path / layer
+    fname.with_name(fname.name + ".part").write_bytes(payload[:100_000])
+    info = export_LDO.download_file(url, fname)
+
+    assert fname.read_bytes() == payload
+    assert info["transfer"]["bytes"] == len(payload) - 100_000
+    assert not fname.with_name(fname.name + ".part").exists()
+
+
+def test_stream_response_leest_direct_van_socket(standin, tmp_path, monkeypatch):
+    ldo = standin(scenarios=1, layers_per_scenario=1, file_size=300_000)
+    headers = haal_token_op("key", 1)
+    [layer] = export_LDO.get_layer_names(1, headers)
+    _, url = export_LDO.get_file_url(1, layer, headers)
+
+    response = export_LDO._session.get(url, stream=True)
+    monkeypatch.setattr(response, "iter_content", None)  # niet gebruiken
+    with open(tmp_path / "direct.tif", "wb") as f:
+        transfer = export_LDO.stream_response(response, f, chunk_size=64 * 1024)
+    response.close()
+    payload, _ = ldo.layer_payload(1)
+    assert (tmp_path / "direct.tif").read_bytes() == payload
+    assert transfer["bytes"] == len(payload)
+
+
+def test_stream_response_zonder_readinto(tmp_path):
+    # een response zonder urllib3 (bijvoorbeeld van een andere adapter) gaat via iter_content
+    payload = bytes(range(256)) * 1000
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(payload)
+    with open(tmp_path / "fallback.bin", "wb") as f:
+        transfer = export_LDO.stream_response(response, f, chunk_size=64 * 1024)
+    assert (tmp_path / "fallback.bin").read_bytes() == payload
+    assert transfer["bytes"] == len(payload)
+
+
+class Klok:
+    """vervangt `time.monotonic` en `time.sleep`, zodat het poll schema zonder wachten te volgen is"""
+
+    def __init__(self):
+        self.nu = 0.0
+        self.polls = []
+
+    def monotonic(self):
+        return self.nu
+
+    def sleep(self, seconds):
+        self.nu += seconds
+
+
+def poller_met_klok(monkeypatch, statussen, **kwargs):
+    """ExportPoller waarvan de status requests per export de waarden uit `statussen` geven (None: een 503)"""
+    klok = Klok()
+    monkeypatch.setattr(export_LDO.time, "monotonic", klok.monotonic)
+    monkeypatch.setattr(export_LDO.time, "sleep", klok.sleep)
+    antwoorden = {export_id: iter(waarden) for export_id, waarden in statussen.items()}
+
+    def get(url, headers):
+        export_id = url.rsplit("/", 1)[-1]
+        klok.polls.append((export_id, klok.nu))
+        waarde = next(antwoorden[export_id])
+        if isinstance(waarde, Exception):
+            raise waarde
+        response = requests.Response()
+        response.status_code = 200 if waarde is not None else 503
+        response._content = f'{{"status": "{waarde}"}}'.encode()
+        return response
+
+    monkeypatch.setattr(export_LDO, "_session", mock.Mock(get=get))
+    poller = export_LDO.ExportPoller({}, **kwargs)
+    for export_id in statussen:
+        poller.add(export_id)
+    return poller, klok
+
+
+def test_poller_wacht_steeds_langer(monkeypatch):
+    poller, klok = poller_met_klok(
+        monkeypatch,
+        {"a": ["submitted"] * 5 + ["finished"]},
+        min_interval=2,
+        max_interval=10,
+        factor=2,
+    )
+    assert list(poller) == [("a", "finished")]
+    # 2, 4, 8 en daarna begrensd op 10
+    assert [tijd for _, tijd in klok.polls] == [2, 6, 14, 24, 34, 44]
+
+
+def test_poller_geeft_op_na_herhaald_mislukken(monkeypatch):
+    netwerkfout = requests.exceptions.ConnectionError("verbinding verbroken")
+    poller, klok = poller_met_klok(
+        monkeypatch,
+        {
+            "kapot": [netwerkfout, None, netwerkfout],
+            # een mislukte poll tussendoor telt niet door na een geslaagde
+            "herstelt": [
+                netwerkfout,
+                "submitted",
+                netwerkfout,
+                netwerkfout,
+                "finished",
+            ],
+        },
+        max_failures=3,
+    )
+    with pytest.warns(UserWarning):
+        resultaten = list(poller)
+    assert resultaten == [("kapot", "error"), ("herstelt", "finished")]
+    assert [export_id for export_id, _ in klok.polls].count("kapot") == 3
+
+
+def pagina_offsets(monkeypatch) -> list:
+    """houd de offsets van de opgevraagde scenario pagina's bij"""
+    offsets = []
+    get_scenario_page = export_LDO.get_scenario_page
+
+    def spy(mode, limit, offset, headers, **kwargs):
+        offsets.append(offset)
+        return get_scenario_page(mode, limit, offset, headers, **kwargs)
+
+    monkeypatch.setattr(export_LDO, "get_scenario_page", spy)
+    return offsets
+
+
+@pytest.mark.parametrize(
+    "scenarios, maximum, offsets",
+    [
+        (10, None, [0, 3, 6, 9]),  # laatste pagina half vol
+        (9, None, [0, 3, 6]),  # veelvoud van de paginagrootte: geen lege pagina
+        (10, 7, [0, 3, 6]),  # `maximum` midden in een pagina
+        (2, None, [0]),  # alles op de eerste pagina
+    ],
+)
+def test_paginering_met_totaal(standin, monkeypatch, scenarios, maximum, offsets):
+    standin(scenarios=scenarios)
+    headers = haal_token_op("key", 1)
+    opgevraagd = pagina_offsets(monkeypatch)
+
+    items = export_LDO.get_scenario_items(0, 3, maximum, headers)
+    assert [item["id"] for item in items] == list(range(1, (maximum or scenarios) + 1))
+    assert sorted(opgevraagd) == offsets
+
+
+def fout(status_code, body):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body.encode()
+    return response
+
+
+@pytest.mark.parametrize(
+    "response, te_groot",
+    [
+        (fout(413, ""), True),
+        (fout(400, '{"detail": "Too many scenarios, maximum is 100"}'), True),
+        (fout(422, '{"detail": "Request entity too large"}'), True),
+        # fouten die alleen woorden als "limit" of "maximum" bevatten
+        (
+            fout(400, '{"detail": "Rate limit exceeded, maximum is 10 per minute"}'),
+            False,
+        ),
+        (fout(400, '{"detail": "Invalid value for limit"}'), False),
+        (fout(400, "too many scenarios"), False),  # geen json
+        (fout(500, '{"detail": "Too many scenarios"}'), False),
+    ],
+)
+def test_herken_te_grote_bulk_export(response, te_groot):
+    assert export_LDO._is_size_error(response) is te_groot
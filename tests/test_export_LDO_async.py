@@ -0,0 +1,57 @@
+import asyncio
+from unittest import mock
+
+from LDO_API import export_LDO
+from LDO_API.export_LDO_async import AsyncLDOClient
+from LDO_API.token_LDO import haal_token_op
+
+
+def test_async_client_downloadt_en_sluit_thread_pool(standin, tmp_path):
+    standin(scenarios=6, layers_per_scenario=2, file_size=10_000, latency=0.01)
+    headers = haal_token_op("key", 1)
+
+    async def main():
+        async with AsyncLDOClient(headers, max_concurrency=4) as client:
+            ids = await client.get_scenario_list(limit_per_request=2)
+            layers = await asyncio.gather(*(client.get_layer_names(i) for i in ids))
+            results = await asyncio.gather(
+                *(
+                    client.download_layer(i, name, tmp_path)
+                    for i, names in zip(ids, layers)
+                    for name in names
+                )
+            )
+        return client, ids, results
+
+    client, ids, results = asyncio.run(main())
+    assert sorted(ids) == [1, 2, 3, 4, 5, 6]
+    assert [status for status, _ in results] == [200] * 12
+    assert len(list(tmp_path.glob("*/*"))) == 12
+    assert client._executor._shutdown
+
+
+def test_mislukte_export_wordt_niet_gedownload(monkeypatch):
+    statussen = iter(["submitted", "error"])
+
+    class Antwoord:
+        def json(self):
+            return {"status": next(statussen)}
+
+    monkeypatch.setattr(
+        export_LDO, "check_export_id", lambda export_id, headers: Antwoord()
+    )
+    niet_downloaden = mock.Mock(side_effect=AssertionError("download van een error"))
+    monkeypatch.setattr(export_LDO, "get_download_url", niet_downloaden)
+
+    async def main():
+        async with AsyncLDOClient({}, max_concurrency=1) as client:
+            return [
+                # al mislukt bij het aanmaken: niet pollen
+                await client.wait_for_export("1", "error", poll_interval=0),
+                await client.download_export("1", "error", {}, poll_interval=0),
+                # mislukt tijdens het wachten
+                await client.download_export("2", "submitted", {}, poll_interval=0),
+            ]
+
+    assert asyncio.run(main()) == [None, None, None]
+    assert next(statussen, "op") == "op"
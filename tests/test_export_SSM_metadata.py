@@ -0,0 +1,55 @@
+from LDO_API import export_SSM_metadata
+from LDO_API.catalog_LDO import LDOCatalog
+from LDO_API.token_LDO import haal_token_op
+
+
+def test_progress_file_only_resumes_interrupted_run(standin, tmp_path, monkeypatch):
+    standin(scenarios=5)
+    headers = haal_token_op("key", 1)
+    output_file = tmp_path / "voortgang.jsonl"
+    get_ssm = export_SSM_metadata.get_ssm
+    calls = []
+    onderbroken = [3]
+
+    def flaky(scenario_id, headers, raise_on_error=False):
+        calls.append(scenario_id)
+        if scenario_id in onderbroken:
+            raise UserWarning("onderbroken")
+        return get_ssm(scenario_id, headers, raise_on_error=raise_on_error)
+
+    monkeypatch.setattr(export_SSM_metadata, "get_ssm", flaky)
+    ids = [1, 2, 3, 4, 5]
+
+    records, mislukt = export_SSM_metadata.haal_ssm_op(
+        ids, headers, output_file=output_file
+    )
+    assert list(mislukt) == [3] and len(records) == 4
+    assert output_file.exists()
+
+    calls.clear()
+    onderbroken.clear()
+    records, mislukt = export_SSM_metadata.haal_ssm_op(
+        ids, headers, output_file=output_file
+    )
+    assert calls == [3] and len(records) == 5 and mislukt == {}
+    assert not output_file.exists()
+
+    # na een geslaagde run wordt alles opnieuw opgehaald
+    calls.clear()
+    export_SSM_metadata.haal_ssm_op(ids, headers, output_file=output_file)
+    assert sorted(calls) == ids
+
+
+def test_catalog_records_expire(standin, tmp_path):
+    standin(scenarios=3)
+    headers = haal_token_op("key", 1)
+    ids = [1, 2, 3]
+    with LDOCatalog(tmp_path / "catalog.sqlite") as catalog:
+        export_SSM_metadata.haal_ssm_op(ids, headers, catalog=catalog)
+        assert sorted(catalog.ssm_records(max_age=60)) == ids
+        # te oud: alles wordt opnieuw opgehaald
+        catalog._execute("UPDATE ssm SET updated = '2000-01-01T00:00:00'")
+        assert catalog.ssm_records(max_age=60) == {}
+        records, _ = export_SSM_metadata.haal_ssm_op(ids, headers, catalog=catalog)
+        assert len(records) == 3
+        assert sorted(catalog.ssm_records(max_age=60)) == ids
@@ -0,0 +1,69 @@
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from LDO_API import export_LDO
+from LDO_API.http_cache_LDO import HttpCache
+from LDO_API.token_LDO import haal_token_op
+
+URL = "http://ldo.test/api/v1/scenarios/1"
+
+
+def antwoord(status_code, body=b"", **headers):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = body
+    return response
+
+
+def test_verlopen_antwoord_wordt_gevalideerd(standin, tmp_path):
+    ldo = standin(scenarios=2, etags=True)
+    headers = haal_token_op("key", 1)
+    cache = export_LDO.enable_http_cache(tmp_path / "cache.sqlite", ttl=0)
+    try:
+        eerste = export_LDO.get_layer_names(1, headers)
+        requests_na_eerste = ldo.stats["requests"]
+        assert export_LDO.get_layer_names(1, headers) == eerste
+        # wel een request (ttl=0), maar de body komt met een 304 uit de cache
+        assert ldo.stats["requests"] == requests_na_eerste + 1
+        assert ldo.stats["not_modified"] == 1
+        assert cache.lookup(f"{export_LDO.server}/api/v1/scenarios/1") is not None
+    finally:
+        export_LDO.disable_http_cache()
+
+
+def test_304_vervangt_validators(tmp_path):
+    cache = HttpCache(tmp_path / "cache.sqlite", ttl=0)
+    cache.store(
+        URL,
+        antwoord(
+            200,
+            b'{"id": 1}',
+            ETag='"a"',
+            **{"Last-Modified": "Mon, 05 Oct 2026 10:00:00 GMT"},
+        ),
+    )
+    cache.revalidated(
+        URL,
+        antwoord(
+            304,
+            ETag='"b"',
+            **{
+                "Last-Modified": "Tue, 06 Oct 2026 10:00:00 GMT",
+                "Cache-Control": "max-age=60",
+            },
+        ),
+    )
+
+    entry = cache.lookup(URL)
+    assert entry.validators() == {
+        "If-None-Match": '"b"',
+        "If-Modified-Since": "Tue, 06 Oct 2026 10:00:00 GMT",
+    }
+    assert entry.fresh
+    assert entry.headers["ETag"] == '"b"'
+    assert entry.body == b'{"id": 1}'
+
+    cache.forget(URL)
+    assert cache.size() == 0 and cache.lookup(URL) is None
+    cache.close()
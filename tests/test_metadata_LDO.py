@@ -0,0 +1,27 @@
+import pandas as pd
+
+from LDO_API.metadata_LDO import (
+    lees_metadata,
+    maak_metadata_sidecar,
+    voeg_metadata_toe,
+)
+
+
+def test_gemengde_kolom_houdt_getallen(tmp_path):
+    sidecar = tmp_path / "LDO.metadata"
+    df = pd.DataFrame(
+        {
+            "Bres": pd.array([12, "onbekend", 2.5, None], dtype=object),
+            "Naam": ["a", "b", "c", "d"],
+        },
+        index=pd.Index([1, 2, 3, 4], name="Scenario ID"),
+    )
+    maak_metadata_sidecar(df, sidecar)
+    voeg_metadata_toe(sidecar, df.loc[[4]].assign(Bres=[7]), [])
+
+    df_sidecar = lees_metadata(sidecar).sort_index()
+    waarden = df_sidecar["Bres"].tolist()
+    assert waarden == [12, "onbekend", 2.5, 7]
+    assert [type(waarde) for waarde in waarden] == [int, str, float, int]
+    assert df_sidecar["Naam"].tolist() == ["a", "b", "c", "d"]
+    assert df_sidecar.index.name == "Scenario ID"
@@ -0,0 +1,35 @@
+import json
+
+from LDO_API import export_LDO
+from LDO_API.metrics_LDO import endpoint_name, metrics
+from LDO_API.token_LDO import haal_token_op
+
+
+def test_rapport_telt_retries(standin, tmp_path):
+    ldo = standin(scenarios=20, retry_after=0, seed=3)
+    headers = haal_token_op("key", 1)
+    # fouten pas na de token: een POST wordt bij een 500 niet herhaald
+    ldo.config.throttle_rate = 0.2
+    ldo.config.failure_rate = 0.1
+    metrics.reset()
+    for scenario_id in range(1, 21):
+        assert export_LDO.get_layer_names(scenario_id, headers) is not None
+
+    report = metrics.write_report(tmp_path / "report.json", tmp_path / "report.prom")
+    assert ldo.stats["throttled"] > 0 and ldo.stats["failed"] > 0
+    # elke 429 (RateLimitedAdapter) en 500 (urllib3) is een keer herhaald
+    assert report["totals"]["retries"] == ldo.stats["throttled"] + ldo.stats["failed"]
+    endpoint = report["endpoints"][
+        endpoint_name("GET", f"{ldo.url}/api/v1/scenarios/1")
+    ]
+    # een 429 is een eigen poging, de 500's zitten in de geschiedenis van de response van urllib3
+    assert endpoint["requests"] == 20 + endpoint["status"].get("429", 0)
+    assert endpoint["status"]["200"] == 20
+
+    assert json.loads((tmp_path / "report.json").read_text()) == report
+    prom = (tmp_path / "report.prom").read_text()
+    assert (
+        f'ldo_http_retries_total{{endpoint="GET /api/v1/scenarios/{{id}}"}} '
+        f"{endpoint['retries']}" in prom
+    )
+    assert "ldo_run_duration_seconds " in prom
@@ -0,0 +1,68 @@
+import io
+import time
+from unittest import mock
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from LDO_API.metrics_LDO import HttpMetrics
+from LDO_API.rate_limit_LDO import AdaptiveLimiter, RateLimitedAdapter
+
+
+def test_retry_after_verlengt_pauze_binnen_venster():
+    limiter = AdaptiveLimiter(initial=8)
+    tickets = [limiter.acquire() for _ in range(3)]
+
+    limiter.release(tickets[0], overloaded=True)
+    assert limiter.limit == 4
+
+    # zelfde venster: geen nieuwe halvering, maar de Retry-After telt wel
+    start = time.monotonic()
+    limiter.release(tickets[1], overloaded=True, retry_after=30)
+    assert limiter.limit == 4
+    assert limiter._paused_until >= start + 30
+
+    limiter.release(tickets[2], overloaded=True, retry_after=5)
+    assert limiter._paused_until >= start + 30  # een kortere pauze verkort niet
+
+
+def test_limiet_halveert_een_keer_per_venster():
+    limiter = AdaptiveLimiter(initial=8)
+    oud = [limiter.acquire() for _ in range(2)]
+    for ticket in oud:
+        limiter.release(ticket, overloaded=True)
+    assert limiter.limit == 4
+
+    nieuw = limiter.acquire()
+    limiter.release(nieuw, overloaded=True)
+    assert limiter.limit == 2
+
+
+def antwoord(status_code, **headers):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers = CaseInsensitiveDict(headers)
+    response.raw = io.BytesIO()
+    return response
+
+
+@pytest.mark.parametrize(
+    "method, eerste, herhaald",
+    [
+        ("GET", antwoord(503), True),
+        ("POST", antwoord(503), False),  # kan al zijn uitgevoerd: geen dubbele export
+        ("POST", antwoord(429), False),
+        ("POST", antwoord(429, **{"Retry-After": "0"}), True),
+    ],
+)
+def test_alleen_veilige_requests_worden_herhaald(method, eerste, herhaald):
+    adapter = RateLimitedAdapter(backoff_factor=0, metrics=HttpMetrics())
+    request = requests.Request(method, "http://ldo.test/api/v1/bulk-exports").prepare()
+    with mock.patch.object(
+        HTTPAdapter, "send", side_effect=[eerste, antwoord(201)]
+    ) as send:
+        response = adapter.send(request)
+    assert send.call_count == (2 if herhaald else 1)
+    assert response.status_code == (201 if herhaald else eerste.status_code)
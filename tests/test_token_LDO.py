@@ -0,0 +1,33 @@
+from LDO_API import export_LDO
+from LDO_API.token_LDO import haal_token_op
+
+
+def get_scenario(headers) -> int:
+    return export_LDO._session.get(
+        f"{export_LDO.server}/api/v1/scenarios/1", headers=headers
+    ).status_code
+
+
+def test_refresh_on_401(standin):
+    ldo = standin(scenarios=2)
+    headers = haal_token_op("key", 1)
+    old = headers["Authorization"]
+    ldo._tokens.clear()  # de server trekt alle tokens in
+    assert get_scenario(headers) == 200
+    assert headers["Authorization"] != old
+
+
+def test_retired_token_is_resent_with_current_token(standin):
+    ldo = standin(scenarios=2)
+    headers = haal_token_op("key", 1)
+    old = {"Authorization": headers["Authorization"]}
+    headers.invalidate(old["Authorization"])
+    current = headers["Authorization"]
+    assert current != old["Authorization"]
+    # een request dat nog met de oude token onderweg was
+    ldo._tokens.pop(old["Authorization"].removeprefix("Bearer "))
+    response = export_LDO._session.get(
+        f"{export_LDO.server}/api/v1/scenarios/1", headers=old
+    )
+    assert response.status_code == 200
+    assert response.request.headers["Authorization"] == current
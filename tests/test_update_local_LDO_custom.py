@@ -0,0 +1,416 @@
+from datetime import timedelta
+import json
+import logging
+import threading
+import time
+import zipfile
+
+import pandas as pd
+import pytest
+import requests
+
+from LDO_API import update_local_LDO_custom
+from LDO_API.catalog_LDO import LDOCatalog
+from LDO_API.export_LDO import local_file_name
+from LDO_API.token_LDO import haal_token_op
+from LDO_API.tracing_LDO import JsonLinesSink, tracer
+from LDO_API.update_local_LDO_custom import (
+    export_uit_LDO_custom,
+    get_layer_names_from_scenario,
+    haal_gewijzigde_scenarios_op,
+    iter_layer_names_from_scenario,
+    rond_delta_sync_af,
+)
+
+
+def test_manifest_skips_only_unchanged_layers(standin, tmp_path):
+    ldo = standin(scenarios=3, layers_per_scenario=2, file_size=4096)
+    headers = haal_token_op("key", 1)
+    files = [
+        tmp_path / "downloaded_tiffs" / str(i) / local_file_name(name)
+        for i in (1, 2, 3)
+        for name in ldo.layer_names(i)
+    ]
+
+    def export() -> int:
+        """aantal 304's van de run"""
+        before = ldo.stats["not_modified"]
+        layers = [(i, ldo.layer_names(i)) for i in (1, 2, 3)]
+        export_uit_LDO_custom(layers, tmp_path, headers, max_workers=2)
+        return ldo.stats["not_modified"] - before
+
+    assert export() == 0
+    mtimes = [f.stat().st_mtime_ns for f in files]
+    # niets gewijzigd: alleen conditionele requests
+    assert export() == 6
+    assert [f.stat().st_mtime_ns for f in files] == mtimes
+
+    # zelfde grootte, andere inhoud
+    ldo.touch(2)
+    assert export() == 4
+    assert files[2].read_bytes() == files[3].read_bytes() == ldo.layer_payload(2)[0]
+    assert [f.stat().st_mtime_ns for f in files[:2] + files[4:]] == mtimes[:2] + mtimes[
+        4:
+    ]
+
+
+def sync(headers, catalog, work_dir, **kwargs) -> list:
+    """delta sync zoals `download_LDO_custom.py`, geeft de openstaande ids na afloop terug"""
+    ids = haal_gewijzigde_scenarios_op(headers, catalog, **kwargs)
+    layers = iter_layer_names_from_scenario(ids, headers, catalog=catalog)
+    export_uit_LDO_custom(layers, work_dir, headers, max_workers=2, catalog=catalog)
+    return rond_delta_sync_af(catalog, ids)
+
+
+def test_delta_sync(standin, tmp_path, monkeypatch):
+    ldo = standin(scenarios=5)
+    headers = haal_token_op("key", 1)
+    with LDOCatalog(tmp_path / "catalog.sqlite") as catalog:
+        # zonder watermerk: alles
+        assert haal_gewijzigde_scenarios_op(headers, catalog) == [1, 2, 3, 4, 5]
+        # nog niets gedownload: niets afgerond
+        assert rond_delta_sync_af(catalog, [1, 2, 3, 4, 5]) == [1, 2, 3, 4, 5]
+        assert sync(headers, catalog, tmp_path) == []
+        assert haal_gewijzigde_scenarios_op(headers, catalog) == []
+
+        ldo.touch(2)
+        assert haal_gewijzigde_scenarios_op(headers, catalog) == [2]
+        assert rond_delta_sync_af(catalog, [2]) == [2]  # lagen vergeten
+        assert sync(headers, catalog, tmp_path) == []
+
+        # de server negeert het filter: lokaal filteren in plaats van alles opnieuw
+        monkeypatch.setattr(
+            update_local_LDO_custom, "delta_filter", lambda since: f"&genegeerd={since}"
+        )
+        ldo.touch(4)
+        assert haal_gewijzigde_scenarios_op(headers, catalog) == [2, 4]
+        assert sync(headers, catalog, tmp_path) == []
+
+        # verwijderde scenarios worden met de volledige lijst gevonden
+        ldo.config.scenarios = 4
+        haal_gewijzigde_scenarios_op(headers, catalog, reconcile_every=timedelta(0))
+        assert catalog.removed_scenario_ids() == [5]
+
+
+def test_delta_sync_houdt_scenarios_open_als_lagen_ophalen_mislukt(
+    standin, tmp_path, monkeypatch
+):
+    standin(scenarios=3)
+    headers = haal_token_op("key", 1)
+    get_layer_names = update_local_LDO_custom.get_layer_names
+
+    def zonder_2(scenario_id, headers):
+        return None if scenario_id == 2 else get_layer_names(scenario_id, headers)
+
+    with LDOCatalog(tmp_path / "catalog.sqlite") as catalog:
+        monkeypatch.setattr(update_local_LDO_custom, "get_layer_names", zonder_2)
+        assert sync(headers, catalog, tmp_path) == [2]
+        assert not (tmp_path / "downloaded_tiffs" / "2").exists()
+
+        # de wijziging van scenario 2 is niet verloren: de volgende run haalt het opnieuw op
+        monkeypatch.setattr(update_local_LDO_custom, "get_layer_names", get_layer_names)
+        assert haal_gewijzigde_scenarios_op(headers, catalog) == [2]
+        assert sync(headers, catalog, tmp_path) == []
+
+
+def test_delta_sync_houdt_scenarios_open_na_afgebroken_export(
+    standin, tmp_path, monkeypatch
+):
+    ldo = standin(scenarios=4, layers_per_scenario=2)
+    headers = haal_token_op("key", 1)
+    download_tif = update_local_LDO_custom.download_tif
+
+    def breekt_af(url, name, scenario_id, work_dir):
+        if scenario_id == 3:
+            raise RuntimeError("schijf vol")
+        return download_tif(url, name, scenario_id, work_dir)
+
+    with LDOCatalog(tmp_path / "catalog.sqlite") as catalog:
+        monkeypatch.setattr(update_local_LDO_custom, "download_tif", breekt_af)
+        openstaand = sync(headers, catalog, tmp_path)
+        assert 3 in openstaand
+        for scenario_id in {1, 2, 3, 4} - set(openstaand):
+            for name in ldo.layer_names(scenario_id):
+                fname = tmp_path / "downloaded_tiffs" / str(scenario_id)
+                assert (fname / local_file_name(name)).exists()
+
+        monkeypatch.setattr(update_local_LDO_custom, "download_tif", download_tif)
+        assert haal_gewijzigde_scenarios_op(headers, catalog) == openstaand
+        assert sync(headers, catalog, tmp_path) == []
+
+
+def test_stream_to_zip_legt_downloads_vast_en_hervat(standin, tmp_path):
+    ldo = standin(scenarios=3, layers_per_scenario=2, file_size=4096, etags=True)
+    headers = haal_token_op("key", 1)
+    zip_path = tmp_path / "downloaded_tiffs.zip"
+
+    def export(catalog, ids) -> int:
+        """aantal 304's van de run"""
+        before = ldo.stats["not_modified"]
+        layers = iter_layer_names_from_scenario(ids, headers, catalog=catalog)
+        export_uit_LDO_custom(
+            layers,
+            tmp_path,
+            headers,
+            max_workers=2,
+            stream_to_zip=True,
+            catalog=catalog,
+        )
+        return ldo.stats["not_modified"] - before
+
+    def tifs() -> dict:
+        with zipfile.ZipFile(zip_path) as zf:
+            assert zf.testzip() is None
+            return {
+                name: zf.read(name) for name in zf.namelist() if name.endswith(".tif")
+            }
+
+    with LDOCatalog(tmp_path / "catalog.sqlite") as catalog:
+        assert export(catalog, [1, 2, 3]) == 0
+        assert rond_delta_sync_af(catalog, [1, 2, 3]) == []
+        eerste = tifs()
+        assert len(eerste) == 6
+
+        # alleen scenario 2 opnieuw: ongewijzigd, de overige scenarios komen uit het vorige archief
+        assert export(catalog, [2]) == 2
+        assert tifs() == eerste
+
+        ldo.touch(3)
+        assert export(catalog, [3]) == 0
+        tweede = tifs()
+        assert tweede.keys() == eerste.keys()
+        assert (
+            tweede[f"3/{local_file_name(ldo.layer_names(3)[0])}"]
+            == ldo.layer_payload(3)[0]
+        )
+    assert not zip_path.with_name("downloaded_tiffs.vorige.zip").exists()
+
+
+def test_stream_to_zip_schrijft_grote_bestanden_direct(standin, tmp_path, monkeypatch):
+    ldo = standin(scenarios=2, layers_per_scenario=2, file_size=50_000)
+    headers = haal_token_op("key", 1)
+    monkeypatch.setattr(update_local_LDO_custom, "SPOOL_SIZE", 10_000)
+    direct = []
+    add_direct = update_local_LDO_custom.ZipStreamWriter.add_direct
+
+    def spy(writer, arcname, write, size=None):
+        direct.append(arcname)
+        return add_direct(writer, arcname, write, size)
+
+    monkeypatch.setattr(update_local_LDO_custom.ZipStreamWriter, "add_direct", spy)
+
+    layers = [(i, ldo.layer_names(i)) for i in (1, 2)]
+    export_uit_LDO_custom(layers, tmp_path, headers, max_workers=2, stream_to_zip=True)
+
+    with zipfile.ZipFile(tmp_path / "downloaded_tiffs.zip") as zf:
+        assert zf.testzip() is None
+        tifs = sorted(name for name in zf.namelist() if name.endswith(".tif"))
+        # alle lagen zijn groter dan `SPOOL_SIZE`: geen buffer of tijdelijk bestand
+        assert tifs == sorted(direct)
+        assert len(tifs) == 4
+        for name in tifs:
+            assert zf.read(name) == ldo.layer_payload(int(name.split("/")[0]))[0]
+
+
+def test_bestandsnamen_uit_catalogus_verlopen(standin, tmp_path):
+    ldo = standin(scenarios=2)
+    headers = haal_token_op("key", 1)
+    with LDOCatalog(tmp_path / "catalog.sqlite") as catalog:
+        catalog.record_layers(1, ["oud.tif"])
+        catalog.record_layers(2, ["oud.tif"])
+        # scenario 1 is lang geleden opgehaald
+        catalog._execute(
+            "UPDATE layers SET updated = '2020-01-01T00:00:00' WHERE scenario_id = 1"
+        )
+
+        assert dict(
+            iter_layer_names_from_scenario([1, 2], headers, catalog=catalog)
+        ) == {
+            1: ldo.layer_names(1),
+            2: ["oud.tif"],
+        }
+        assert catalog.layer_names(1) == sorted(ldo.layer_names(1))
+
+        # zonder `max_age` blijven de namen geldig
+        catalog.record_layers(2, ["oud.tif"])
+        catalog._execute("UPDATE layers SET updated = '2020-01-01T00:00:00'")
+        names = iter_layer_names_from_scenario(
+            [2], headers, catalog=catalog, max_age=None
+        )
+        assert dict(names) == {2: ["oud.tif"]}
+
+
+def test_zip_zonder_onvolledige_bestanden(standin, tmp_path):
+    ldo = standin(scenarios=1, layers_per_scenario=1, file_size=1000)
+    headers = haal_token_op("key", 1)
+    export_dir = tmp_path / "downloaded_tiffs"
+    # resten van een afgebroken run
+    (export_dir / "metadata.xlsx.parts-0123456789ab").mkdir(parents=True)
+    (export_dir / "metadata.xlsx.parts-0123456789ab" / "batch-0.xlsx").write_bytes(b"")
+    (export_dir / "metadata.xlsx.part").write_bytes(b"onvolledig")
+    (export_dir / "1").mkdir()
+    (export_dir / "1" / "oud.tif.part").write_bytes(b"onvolledig")
+
+    export_uit_LDO_custom([(1, ldo.layer_names(1))], tmp_path, headers, max_workers=1)
+
+    with zipfile.ZipFile(tmp_path / "downloaded_tiffs.zip") as zf:
+        assert sorted(zf.namelist()) == sorted(
+            ["1/", f"1/{local_file_name(ldo.layer_names(1)[0])}"]
+            + ["metadata.xlsx", "missing_values.csv"]
+        )
+
+
+def test_verlopen_urls_worden_opnieuw_opgevraagd(standin, tmp_path, monkeypatch):
+    # korter geldig dan `URL_EXPIRY_MARGIN`: elke url wordt voor de download een keer vernieuwd
+    ldo = standin(scenarios=2, layers_per_scenario=2, file_size=1000, presign_ttl=10)
+    headers = haal_token_op("key", 1)
+    opgevraagd = []
+    get_file_url = update_local_LDO_custom.get_file_url
+
+    def spy(scenario_id, layer_name, headers):
+        opgevraagd.append((scenario_id, layer_name))
+        return get_file_url(scenario_id, layer_name, headers)
+
+    monkeypatch.setattr(update_local_LDO_custom, "get_file_url", spy)
+    layers = [(i, ldo.layer_names(i)) for i in (1, 2)]
+    files = [(i, name) for i, names in layers for name in names]
+    (tmp_path / "kort").mkdir()
+    (tmp_path / "verlopen").mkdir()
+
+    export_uit_LDO_custom(layers, tmp_path / "kort", headers, max_workers=2)
+    assert sorted(opgevraagd) == sorted(files * 2)
+    assert len(list((tmp_path / "kort" / "downloaded_tiffs").glob("*/*.tif"))) == 4
+
+    # direct verlopen: na `MAX_URL_RESOLVES` nieuwe urls ontbreekt het bestand
+    ldo.config.presign_ttl = 0
+    opgevraagd.clear()
+    export_uit_LDO_custom(layers, tmp_path / "verlopen", headers, max_workers=2)
+    resolves = update_local_LDO_custom.MAX_URL_RESOLVES
+    assert sorted(opgevraagd) == sorted(files * (1 + resolves))
+    missing = pd.read_csv(
+        tmp_path / "verlopen" / "downloaded_tiffs" / "missing_values.csv", index_col=0
+    )
+    assert missing.notna().sum().sum() == 4
+
+
+def test_spans_vormen_een_boom(standin, tmp_path):
+    standin(scenarios=2, layers_per_scenario=2, file_size=1000)
+    headers = haal_token_op("key", 1)
+    trace_file = tmp_path / "trace.jsonl"
+    tracer.add_sink(JsonLinesSink(trace_file))
+    try:
+        layers = iter_layer_names_from_scenario([1, 2], headers)
+        export_uit_LDO_custom(layers, tmp_path, headers, max_workers=2)
+    finally:
+        tracer.close()
+
+    spans = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    by_id = {span["spanId"]: span for span in spans}
+    [root] = [span for span in spans if span["parentSpanId"] is None]
+    assert root["name"] == "export_uit_LDO_custom"
+    assert {span["traceId"] for span in spans} == {root["traceId"]}
+
+    def path(span) -> list:
+        """namen van de span tot aan de root"""
+        names = [span["name"]]
+        while span["parentSpanId"] is not None:
+            span = by_id[span["parentSpanId"]]
+            names.append(span["name"])
+        return names[::-1]
+
+    downloads = [path(span) for span in spans if span["name"] == "download_tif"]
+    assert downloads == [["export_uit_LDO_custom", "downloads", "download_tif"]] * 4
+    assert sum(span["attributes"].get("bytes") or 0 for span in spans) == 4 * 1000
+    assert all(span["status"]["code"] == "OK" for span in spans)
+
+
+class Gelijktijdig:
+    """roept `func` aan en houdt bij hoeveel aanroepen maximaal tegelijk liepen"""
+
+    def __init__(self, func, wacht=0.05):
+        self.func = func
+        self.wacht = wacht
+        self.actief = 0
+        self.maximum = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.actief += 1
+            self.maximum = max(self.maximum, self.actief)
+        try:
+            time.sleep(self.wacht)
+            return self.func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.actief -= 1
+
+
+def test_downloads_parallel_met_missing_values(standin, tmp_path, monkeypatch, caplog):
+    ldo = standin(scenarios=4, layers_per_scenario=2, file_size=1000)
+    headers = haal_token_op("key", 1)
+    download_tif = Gelijktijdig(update_local_LDO_custom.download_tif)
+    monkeypatch.setattr(update_local_LDO_custom, "download_tif", download_tif)
+    # zoals `get_layer_names_from_scenario`: aangevuld met None
+    df_layer_names = pd.DataFrame({i: ldo.layer_names(i) for i in (1, 2, 3, 4)}).T
+    df_layer_names.loc[2, 1] = "bestaat_niet.tif"
+    df_layer_names.loc[4, 1] = None
+    caplog.set_level(logging.INFO)
+
+    export_uit_LDO_custom(
+        df_layer_names, tmp_path, headers, max_workers=3, use_manifest=False
+    )
+
+    assert 1 < download_tif.maximum <= 3
+    verwacht = [
+        f"{i}/{local_file_name(name)}"
+        for i in (1, 2, 3, 4)
+        for name in df_layer_names.loc[i]
+        if isinstance(name, str) and name != "bestaat_niet.tif"
+    ]
+    with zipfile.ZipFile(tmp_path / "downloaded_tiffs.zip") as zf:
+        assert sorted(n for n in zf.namelist() if n.endswith(".tif")) == verwacht
+        missing = pd.read_csv(zf.open("missing_values.csv"), index_col=0)
+    assert missing.loc[2].dropna().tolist() == ["bestaat_niet.tif"]
+    assert list(missing.index) == [2]
+    assert "Failed to download bestaat_niet.tif for scenario 2" in caplog.text
+
+
+def test_bestandsnamen_komen_binnen_zodra_ze_klaar_zijn(standin, monkeypatch):
+    standin(scenarios=4, layers_per_scenario=2)
+    headers = haal_token_op("key", 1)
+    get_layer_names = update_local_LDO_custom.get_layer_names
+    doorgegeven = threading.Event()
+
+    def traag_of_kapot(scenario_id, headers):
+        if scenario_id == 1:
+            # pas klaar als een ander scenario al is doorgegeven
+            assert doorgegeven.wait(5)
+        if scenario_id == 3:
+            raise requests.exceptions.ConnectionError("verbinding verbroken")
+        return get_layer_names(scenario_id, headers)
+
+    monkeypatch.setattr(update_local_LDO_custom, "get_layer_names", traag_of_kapot)
+    binnen = []
+    with pytest.warns(UserWarning, match="404"):
+        for scenario_id, _ in iter_layer_names_from_scenario(
+            [1, 2, 3, 4, 99], headers, max_workers=2
+        ):
+            binnen.append(scenario_id)
+            doorgegeven.set()
+    # 3 (netwerkfout) en 99 (bestaat niet) worden overgeslagen, de rest gaat door
+    assert sorted(binnen) == [1, 2, 4]
+    assert binnen[0] != 1
+
+
+def test_bestandsnamen_parallel_in_volgorde(standin, monkeypatch):
+    ldo = standin(scenarios=6, layers_per_scenario=2)
+    headers = haal_token_op("key", 1)
+    get_layer_names = Gelijktijdig(update_local_LDO_custom.get_layer_names)
+    monkeypatch.setattr(update_local_LDO_custom, "get_layer_names", get_layer_names)
+
+    df = get_layer_names_from_scenario([6, 5, 4, 3, 2, 1], headers, max_workers=3)
+
+    assert 1 < get_layer_names.maximum <= 3
+    assert list(df.index) == [6, 5, 4, 3, 2, 1]
+    assert df.loc[3].tolist() == ldo.layer_names(3)
@@ -0,0 +1,34 @@
+import zipfile
+
+from LDO_API.archive_LDO import lees_metadata_nieuwe_export
+from LDO_API.token_LDO import haal_token_op
+from LDO_API.update_local_bulk_LDO import export_uit_LDO_bulk
+
+
+def test_te_grote_batches_worden_gesplitst(standin, tmp_path):
+    ldo = standin(
+        scenarios=10,
+        layers_per_scenario=1,
+        file_size=1000,
+        max_bulk_size=3,
+        export_seconds=0.05,
+    )
+    headers = haal_token_op("key", 1)
+
+    zips = export_uit_LDO_bulk(
+        list(range(1, 11)), headers, current_dir=tmp_path, poll_interval=0.05
+    )
+
+    scenarios = []
+    for fname in zips:
+        with zipfile.ZipFile(fname) as archive:
+            batch = {
+                int(name.split("/")[0].removeprefix("scenario_"))
+                for name in archive.namelist()
+                if "/" in name
+            }
+        assert len(batch) <= ldo.config.max_bulk_size
+        # de metadata van de batch, zoals de archief functies deze lezen
+        assert set(lees_metadata_nieuwe_export([fname]).index) == batch
+        scenarios += batch
+    assert sorted(scenarios) == list(range(1, 11))